@@ -1,17 +1,16 @@
-from helpers import WhooshHelper, FlaskAppHelper
-from whoosh_flask_crawler import Crawler
+import os
+from helpers import ShardedWhooshHelper, WhooshHelper, FlaskAppHelper
 
-prefix = 'https://vm009.rz.uos.de/crawl/'
-start_url = prefix + 'index.html'
+# The index is built offline by build_index.py; workers only open it for searching.
+index_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "indexdir")
 
 # Create Whoosh helper
-whoosh_helper = WhooshHelper(store_content=True)
-
-# Initialize Crawler
-crawler = Crawler(start_url, prefix, whoosh_helper)
-crawler.crawl()
+if ShardedWhooshHelper.count_shards(index_dir):
+    whoosh_helper = ShardedWhooshHelper(index_dir, readonly=True)
+else:
+    whoosh_helper = WhooshHelper(index_dir, readonly=True)
 
 # Create Flask app
 flask_app = FlaskAppHelper(whoosh_helper)
 
-app = flask_app.app
\ No newline at end of file
+app = flask_app.app
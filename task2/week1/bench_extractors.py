@@ -0,0 +1,121 @@
+"""Benchmark of the HTML extractors against the BeautifulSoup baseline.
+
+    python bench_extractors.py                       # synthetic pages
+    python bench_extractors.py --dir saved_pages/    # every *.html file in a directory
+    python bench_extractors.py --url https://vm009.rz.uos.de/crawl/index.html
+    python bench_extractors.py --main-content        # with boilerplate stripping
+
+Prints pages per second, throughput and speed-up over BeautifulSoup for every
+extractor that can be loaded. With `--main-content`, it also prints how much
+of the text the main-content stage keeps.
+"""
+import argparse
+import glob
+import os
+import random
+import time
+from extractors import EXTRACTORS, get_extractor
+from http_client import get_client
+
+WORDS = ("platypus duck billed mammal water river australia venom egg fur swim "
+         "animal night burrow food shrimp worm tail webbed feet electric").split()
+
+
+def synthetic_pages(count: int, seed: int = 0) -> list:
+    """Generates pages that look roughly like the crawled site.
+
+    Besides the article text, scripts and styles, every page carries the usual
+    boilerplate: a site menu, breadcrumbs, a sidebar of related pages, a cookie
+    notice and a footer, so `--main-content` has something to strip.
+
+    Args:
+        count (int): Number of pages.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: `(url, content)` pairs.
+    """
+    rng = random.Random(seed)
+    menu = "".join(f"<li><a href='{word}.html'>{word.title()}</a></li>" for word in WORDS[:8])
+    pages = []
+    for i in range(count):
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))} "
+            f"<a href='page{rng.randrange(count)}.html'>{rng.choice(WORDS)}</a></p>\n"
+            for _ in range(rng.randint(5, 30))
+        )
+        related = "".join(
+            f"<li><a href='page{j}.html'>{' '.join(rng.choice(WORDS) for _ in range(4)).title()}</a></li>"
+            for j in rng.sample(range(count), min(count, 6))
+        )
+        html = (f"<!DOCTYPE html><html><head><title>Page {i}</title>"
+                f"<style>body {{ font-family: sans-serif; }}</style>"
+                f"<script>var tracking = {{ page: {i} }};</script></head>"
+                f"<body><header><div class='logo'>Platypus facts</div><ul class='menu'>{menu}</ul></header>"
+                f"<nav><a href='index.html'>Home</a> &gt; <a href='animals.html'>Animals</a> &gt; Page {i}</nav>"
+                f"<div class='content'><h1>Page {i}</h1>{paragraphs}</div>"
+                f"<div class='sidebar'><h3>Related pages</h3><ul>{related}</ul></div>"
+                f"<div class='cookies'>This site uses cookies. <a href='privacy.html'>Accept</a></div>"
+                f"<footer><a href='about.html'>About us</a> <a href='contact.html'>Contact</a> "
+                f"<a href='privacy.html'>Privacy policy</a> &copy; 2024 Platypus facts</footer></body></html>")
+        pages.append((f"https://example.org/crawl/page{i}.html", html.encode("utf-8")))
+    return pages
+
+
+def run(extractor, pages: list, repeat: int) -> float:
+    """Returns the best time of `repeat` passes of an extractor over all pages."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for url, content in pages:
+            extractor.extract(content, url)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None) -> None:
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="directory of saved .html pages")
+    parser.add_argument("--url", action="append", default=[], help="page to download and parse (repeatable)")
+    parser.add_argument("--pages", type=int, default=200, help="number of synthetic pages")
+    parser.add_argument("--repeat", type=int, default=5, help="passes per extractor; the best is reported")
+    parser.add_argument("--main-content", action="store_true", help="keep only the main content of the pages")
+    args = parser.parse_args(argv)
+
+    pages = []
+    if args.dir:
+        for path in sorted(glob.glob(os.path.join(args.dir, "*.html"))):
+            with open(path, "rb") as f:
+                pages.append(("file://" + os.path.abspath(path), f.read()))
+    for url in args.url:
+        pages.append((url, get_client().get(url).content))
+    if not pages:
+        pages = synthetic_pages(args.pages)
+    total_mb = sum(len(content) for _, content in pages) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB, best of {args.repeat}")
+
+    timings = {}
+    for name in EXTRACTORS:
+        try:
+            extractor = get_extractor(name, main_content=args.main_content)
+        except ImportError as e:
+            print(f"{name:>14}: skipped ({e})")
+            continue
+        timings[name] = run(extractor, pages, args.repeat)
+
+    baseline = timings["beautifulsoup"]
+    for name, seconds in timings.items():
+        print(f"{name:>14}: {len(pages) / seconds:8.0f} pages/s {total_mb / seconds:7.1f} MB/s"
+              f" {baseline / seconds:5.1f}x")
+
+    if args.main_content:
+        full = get_extractor(main_content=False)
+        stripped = get_extractor(main_content=True)
+        before = sum(len(full.extract(content, url).text.split()) for url, content in pages)
+        after = sum(len(stripped.extract(content, url).text.split()) for url, content in pages)
+        print(f"main content: {after} of {before} words kept ({after / max(before, 1):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Offline index builder for the Flask search app.
+
+Crawls the site and writes the Whoosh index that `app.py` serves read-only.
+
+    python build_index.py              # update the live index incrementally
+    python build_index.py --rebuild    # build a fresh index and swap it in atomically
+
+Every build records its size in `build_stats.json` inside the index and
+prints it next to the size of the index it replaces.
+"""
+import argparse
+import os
+import time
+from helpers import ShardedWhooshHelper, WhooshHelper, publish_index, read_build_stats, write_build_stats
+from whoosh_flask_crawler import Crawler
+from crawl_state import PageMetadataStore, SQLiteFrontier, VisitedSet
+from http_client import HttpClient, MAX_PAGE_SIZE
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREFIX = 'https://vm009.rz.uos.de/crawl/'
+INDEX_DIR = os.path.join(BASE_DIR, "indexdir")
+STATE_PATH = os.path.join(BASE_DIR, "crawl_state.sqlite")
+
+
+def index_size(index_dir: str) -> int:
+    """Returns the size of an index on disk, with its shards and content store, in bytes.
+
+    Args:
+        index_dir (str): The index directory, or a symlink to it.
+
+    Returns:
+        int: The total size of its files.
+    """
+    total = 0
+    for root, _, files in os.walk(os.path.realpath(index_dir)):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def build_index(index_dir: str = INDEX_DIR, prefix: str = PREFIX, start_url: str = None,
+                rebuild: bool = False, workers: int = 8, store_content: bool = True,
+                term_offsets: bool = False, state_path: str = STATE_PATH,
+                timeout: float = 30.0, retries: int = 3, max_page_size: int = MAX_PAGE_SIZE,
+                rate_per_host: float = 4.0, respect_robots: bool = True,
+                parse_workers: int = 0, index_procs: int = 1, shards: int = 1,
+                skip_near_duplicates: bool = True, main_content: bool = True) -> None:
+    """Crawls the site and writes the index.
+
+    An incremental build updates the live index in place, re-indexing only
+    changed pages and resuming an interrupted crawl. A rebuild crawls into a new
+    directory next to `index_dir` and publishes it with `publish_index` once the
+    crawl has finished.
+
+    Args:
+        index_dir (str, optional): Path under which the index is served. Defaults to INDEX_DIR.
+        prefix (str, optional): The base URL prefix to restrict crawling to. Defaults to PREFIX.
+        start_url (str, optional): The URL to begin crawling from. Defaults to the prefix's index.html.
+        rebuild (bool, optional): Build a fresh index instead of updating the live one. Defaults to False.
+        workers (int, optional): Number of concurrent fetch workers. Defaults to 8.
+        store_content (bool, optional): Whether to store full content in the index. Defaults to True.
+        term_offsets (bool, optional): Store character offsets for fast highlighting. Defaults to False.
+        state_path (str, optional): SQLite file holding the crawl state. Defaults to STATE_PATH.
+        timeout (float, optional): Read timeout of a single request in seconds. Defaults to 30.0.
+        retries (int, optional): Retries of a failed request, with exponential backoff. Defaults to 3.
+        max_page_size (int, optional): Pages larger than this many bytes are not downloaded.
+            Defaults to MAX_PAGE_SIZE.
+        rate_per_host (float, optional): Maximum requests per second per host. Defaults to 4.0.
+        respect_robots (bool, optional): Honor robots.txt rules and crawl delays. Defaults to True.
+        parse_workers (int, optional): Number of processes to parse pages in. Defaults to 0
+            (pages are parsed on the fetch workers).
+        index_procs (int, optional): Number of processes of the index writer. Defaults to 1.
+        shards (int, optional): Number of index shards, written and searched in parallel. Defaults
+            to 1, a single index. An incremental build of a sharded index keeps its number of shards.
+        skip_near_duplicates (bool, optional): Do not index near-duplicates of pages indexed before.
+            Defaults to True.
+        main_content (bool, optional): Index only the main content of pages, without boilerplate.
+            Defaults to True. Unchanged pages are not re-extracted, so a change of this setting
+            only fully applies after a rebuild.
+
+    Returns:
+        None
+    """
+    start_url = start_url or prefix + 'index.html'
+    metadata = PageMetadataStore(state_path)
+    rebuild = rebuild or not os.path.exists(index_dir)
+    http_client = HttpClient(timeout=(5.0, timeout), retries=retries, pool_maxsize=max(workers, 1),
+                             max_page_size=max_page_size)
+
+    def open_index(path):
+        if shards > 1 or ShardedWhooshHelper.count_shards(path):
+            return ShardedWhooshHelper(path, shards if shards > 1 else None, store_content=store_content,
+                                       term_offsets=term_offsets)
+        return WhooshHelper(path, store_content=store_content, term_offsets=term_offsets)
+
+    if rebuild:
+        build_dir = f"{index_dir}.{time.strftime('%Y%m%d%H%M%S')}"
+        whoosh_helper = open_index(build_dir)
+        crawler = Crawler(start_url, prefix, whoosh_helper, workers=workers, metadata=metadata,
+                          http_client=http_client, rate_per_host=rate_per_host, respect_robots=respect_robots,
+                          parse_workers=parse_workers, index_procs=index_procs,
+                          skip_near_duplicates=skip_near_duplicates, main_content=main_content)
+    else:
+        whoosh_helper = open_index(index_dir)
+        crawler = Crawler(start_url, prefix, whoosh_helper, workers=workers, metadata=metadata,
+                          agenda=SQLiteFrontier(state_path), visited_urls=VisitedSet(state_path),
+                          http_client=http_client, rate_per_host=rate_per_host, respect_robots=respect_robots,
+                          parse_workers=parse_workers, index_procs=index_procs,
+                          skip_near_duplicates=skip_near_duplicates, main_content=main_content)
+
+    previous = read_build_stats(index_dir)
+    started = time.monotonic()
+    with http_client:
+        crawler.crawl()
+    print(f"Indexed {whoosh_helper.doc_count()} documents in {time.monotonic() - started:.1f}s")
+
+    built_dir = build_dir if rebuild else index_dir
+    stats = {
+        "documents": whoosh_helper.doc_count(),
+        "bytes": index_size(built_dir),
+        "main_content": main_content,
+        "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    write_build_stats(built_dir, **stats)
+    summary = f"Index size: {stats['bytes'] / 1e6:.2f} MB"
+    if previous is not None and "bytes" in previous:
+        change = (stats["bytes"] - previous["bytes"]) / previous["bytes"] * 100 if previous["bytes"] else 0.0
+        summary += (f", previous build {previous['bytes'] / 1e6:.2f} MB ({change:+.1f}%,"
+                    f" main content only: {previous.get('main_content', False)})")
+    print(summary)
+
+    if rebuild:
+        publish_index(build_dir, index_dir)
+        print(f"Published {build_dir} as {index_dir}")
+
+
+def main(argv=None) -> None:
+    """Parses the command line and builds the index."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="path under which the index is served")
+    parser.add_argument("--prefix", default=PREFIX, help="only crawl URLs starting with this prefix")
+    parser.add_argument("--start-url", help="URL to start crawling from (default: PREFIX + index.html)")
+    parser.add_argument("--rebuild", action="store_true", help="build a fresh index and swap it in")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent fetch workers")
+    parser.add_argument("--no-store-content", dest="store_content", action="store_false",
+                        help="do not store page content in the index")
+    parser.add_argument("--term-offsets", action="store_true",
+                        help="store term character offsets for fast highlighting")
+    parser.add_argument("--state", default=STATE_PATH, help="SQLite file holding the crawl state")
+    parser.add_argument("--timeout", type=float, default=30.0, help="read timeout per request in seconds")
+    parser.add_argument("--retries", type=int, default=3, help="retries per failed request")
+    parser.add_argument("--max-page-size", type=int, default=MAX_PAGE_SIZE,
+                        help="skip pages larger than this many bytes")
+    parser.add_argument("--rate", type=float, default=4.0, help="maximum requests per second per host")
+    parser.add_argument("--ignore-robots", dest="respect_robots", action="store_false",
+                        help="do not honor robots.txt")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="number of processes to parse pages in (0: parse on the fetch workers)")
+    parser.add_argument("--index-procs", type=int, default=1, help="number of index writer processes")
+    parser.add_argument("--shards", type=int, default=1, help="number of index shards")
+    parser.add_argument("--keep-boilerplate", dest="main_content", action="store_false",
+                        help="index all text of a page, not only its main content")
+    parser.add_argument("--keep-near-duplicates", dest="skip_near_duplicates", action="store_false",
+                        help="also index pages that are near-duplicates of indexed pages")
+    args = parser.parse_args(argv)
+    build_index(index_dir=args.index_dir, prefix=args.prefix, start_url=args.start_url,
+                rebuild=args.rebuild, workers=args.workers, store_content=args.store_content,
+                term_offsets=args.term_offsets, state_path=args.state,
+                timeout=args.timeout, retries=args.retries, max_page_size=args.max_page_size,
+                rate_per_host=args.rate, respect_robots=args.respect_robots,
+                parse_workers=args.parse_workers, index_procs=args.index_procs, shards=args.shards,
+                skip_near_duplicates=args.skip_near_duplicates, main_content=args.main_content)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import zlib
+
+
+class ContentStore:
+    """Compressed page text keyed by URL, stored next to the Whoosh index.
+
+    Used when the index is built with `store_content=False`: the text of each
+    page is kept here, zlib-compressed in an SQLite blob table, so highlights
+    can be built from local disk instead of downloading every hit again. Reads
+    go through SQLite's memory-mapped I/O.
+
+    Writes are not committed until `commit` is called, so a batch of pages
+    can be written in one transaction.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        readonly (bool): Whether the store was opened for reading only.
+    """
+
+    def __init__(self, path: str, readonly: bool = False, level: int = 6):
+        """Opens or creates the content store.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            readonly (bool, optional): Open an existing store for reading only. Defaults to False.
+            level (int, optional): zlib compression level. Defaults to 6.
+        """
+        self.path = path
+        self.readonly = readonly
+        self.level = level
+        self._lock = threading.Lock()
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS content (url TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            self._conn.commit()
+        self._conn.execute("PRAGMA mmap_size=268435456")
+
+    def put(self, url: str, text: str) -> None:
+        """Stores the text of a page, replacing any previous version.
+
+        Args:
+            url (str): The URL of the page.
+            text (str): The text content of the page.
+
+        Returns:
+            None
+        """
+        data = zlib.compress(text.encode("utf-8"), self.level)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO content VALUES (?, ?)", (url, data))
+
+    def get(self, url: str):
+        """Returns the text of a page.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            str: The stored text, or None if the page is not in the store.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM content WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def commit(self) -> None:
+        """Commits the pages written since the last commit.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        """Discards the pages written since the last commit.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._conn.rollback()
+
+    def close(self) -> None:
+        """Closes the underlying database connection.
+
+        Returns:
+            None
+        """
+        self._conn.close()
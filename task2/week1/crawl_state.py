@@ -0,0 +1,409 @@
+import hashlib
+import heapq
+import json
+import math
+import sqlite3
+import threading
+import time
+
+
+class PageMetadataStore:
+    """Persistent per-URL crawl metadata used for incremental recrawls.
+
+    For every crawled page the store keeps the validators needed for a
+    conditional GET (ETag and Last-Modified), a hash of the downloaded body,
+    the time of the last crawl and the outgoing links, so an unchanged page can
+    still feed the frontier without being parsed again.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str = "crawl_state.sqlite"):
+        """Opens or creates the metadata store.
+
+        Args:
+            path (str, optional): Path of the SQLite database file. Defaults to "crawl_state.sqlite".
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "content_hash TEXT, last_crawled REAL, links TEXT)"
+            )
+
+    def get(self, url: str):
+        """Looks up the metadata of a page.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            dict: The stored metadata, or None if the page has not been crawled before.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, last_crawled, links FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, last_crawled, links = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": content_hash,
+            "last_crawled": last_crawled,
+            "links": json.loads(links) if links else [],
+        }
+
+    def put(self, url: str, etag: str, last_modified: str, content_hash: str, links: list) -> None:
+        """Stores the metadata of a page and marks it as crawled now.
+
+        Args:
+            url (str): The URL of the page.
+            etag (str): The ETag response header, if any.
+            last_modified (str): The Last-Modified response header, if any.
+            content_hash (str): Hash of the response body.
+            links (list): The crawlable links found on the page.
+
+        Returns:
+            None
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, time.time(), json.dumps(links)),
+            )
+
+    def clear(self) -> None:
+        """Forgets all stored metadata, forcing a full recrawl.
+
+        Returns:
+            None
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+
+    def close(self) -> None:
+        """Closes the underlying database connection.
+
+        Returns:
+            None
+        """
+        self._conn.close()
+
+
+class Frontier:
+    """In-memory priority frontier with the same interface as `SQLiteFrontier`.
+
+    URLs are popped best first: URLs with a higher sitemap hint, then URLs
+    closer to the start page, then URLs with more in-links, and finally in the
+    order they were first added. Adding a URL that is already queued does not
+    queue it again; it counts as one more in-link and keeps the smaller depth
+    and the larger hint.
+    """
+
+    def __init__(self, urls=()):
+        """Initializes the frontier.
+
+        Args:
+            urls (iterable, optional): URLs to start with, at depth 0. Defaults to none.
+        """
+        self._heap = []
+        # url -> [hint, depth, inlinks, seq, taken]
+        self._entries = {}
+        self._queued = 0
+        self._seq = 0
+        self.extend(urls)
+
+    def __len__(self) -> int:
+        return self._queued
+
+    @staticmethod
+    def _key(entry) -> tuple:
+        hint, depth, inlinks, seq, _ = entry
+        return (-hint, depth, -inlinks, seq)
+
+    def append(self, url: str, depth: int = 0, hint: float = 0.0) -> None:
+        """Adds a URL to the frontier, or updates its priority if it is already there.
+
+        Args:
+            url (str): The URL to add.
+            depth (int, optional): Number of links between the start page and the URL. Defaults to 0.
+            hint (float, optional): Priority hint from a sitemap, between 0 and 1. Defaults to 0.0.
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            entry = self._entries[url] = [hint, depth, 0, self._seq, False]
+            self._seq += 1
+            self._queued += 1
+        else:
+            entry[0] = max(entry[0], hint)
+            entry[1] = min(entry[1], depth)
+            entry[2] += 1
+            if entry[4]:
+                return
+        # The old heap item of an updated URL is left behind and skipped by `pop`
+        heapq.heappush(self._heap, (self._key(entry), url))
+        if len(self._heap) > 2 * self._queued + 1024:
+            self._heap = [(self._key(e), u) for u, e in self._entries.items() if not e[4]]
+            heapq.heapify(self._heap)
+
+    def extend(self, urls, depth: int = 0, hint: float = 0.0) -> None:
+        """Adds several URLs at the same depth to the frontier."""
+        for url in urls:
+            self.append(url, depth, hint)
+
+    def pop(self) -> str:
+        """Removes and returns the best queued URL.
+
+        Raises:
+            IndexError: If the frontier is empty.
+        """
+        while self._heap:
+            key, url = heapq.heappop(self._heap)
+            entry = self._entries.get(url)
+            if entry is not None and not entry[4] and key == self._key(entry):
+                entry[4] = True
+                self._queued -= 1
+                return url
+        raise IndexError("pop from empty frontier")
+
+    def depth(self, url: str) -> int:
+        """Returns the depth of a queued or popped URL, or 0 if it is unknown."""
+        entry = self._entries.get(url)
+        return entry[1] if entry is not None else 0
+
+    def task_done(self, url: str) -> None:
+        """Forgets a popped URL once it has been processed."""
+        self._entries.pop(url, None)
+
+    def restore(self) -> list:
+        """Returns URLs that were popped but never finished. Always empty in memory."""
+        return []
+
+
+class SQLiteFrontier:
+    """Disk-backed priority frontier that survives crashes and restarts.
+
+    URLs are popped in the same order as from `Frontier`, and a URL that is
+    already in the frontier is not added again, only its in-link count, depth
+    and hint are updated.
+
+    Popped URLs stay in the database, marked as taken, until `task_done` is
+    called for them. After a crash, `restore` puts the unfinished URLs back into
+    the queue, so a crawl resumes without losing the pages that were in flight.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str = "crawl_state.sqlite"):
+        """Opens or creates the frontier.
+
+        A frontier written by an older version, without priorities, is migrated
+        in place.
+
+        Args:
+            path (str, optional): Path of the SQLite database file. Defaults to "crawl_state.sqlite".
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(frontier)")]
+            if columns and "depth" not in columns:
+                self._conn.execute("DROP INDEX IF EXISTS frontier_taken")
+                self._conn.execute("ALTER TABLE frontier RENAME TO frontier_old")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS frontier ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE, "
+                "depth INTEGER NOT NULL DEFAULT 0, inlinks INTEGER NOT NULL DEFAULT 0, "
+                "hint REAL NOT NULL DEFAULT 0, taken INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS frontier_order ON frontier (taken, hint DESC, depth, inlinks DESC, id)"
+            )
+            if columns and "depth" not in columns:
+                self._conn.execute(
+                    "INSERT INTO frontier (url, taken) SELECT url, MAX(taken) FROM frontier_old GROUP BY url"
+                )
+                self._conn.execute("DROP TABLE frontier_old")
+        # The queue length is counted once here and then kept up to date in memory,
+        # so `len` and `bool` do not scan the table on every pop
+        self._queued = self._conn.execute("SELECT COUNT(*) FROM frontier WHERE taken = 0").fetchone()[0]
+        self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM frontier").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def append(self, url: str, depth: int = 0, hint: float = 0.0) -> None:
+        """Adds a URL to the frontier, or updates its priority if it is already there.
+
+        Args:
+            url (str): The URL to add.
+            depth (int, optional): Number of links between the start page and the URL. Defaults to 0.
+            hint (float, optional): Priority hint from a sitemap, between 0 and 1. Defaults to 0.0.
+        """
+        self.extend([url], depth, hint)
+
+    def extend(self, urls, depth: int = 0, hint: float = 0.0) -> None:
+        """Adds several URLs at the same depth to the frontier in a single transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO frontier (url, depth, hint) VALUES (?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET inlinks = inlinks + 1, "
+                "depth = MIN(depth, excluded.depth), hint = MAX(hint, excluded.hint)",
+                ((url, depth, hint) for url in urls),
+            )
+            # Ids only grow, so the rows added by this call are the ones above the previous maximum
+            added, last_id = self._conn.execute(
+                "SELECT COUNT(*), MAX(id) FROM frontier WHERE id > ?", (self._last_id,)
+            ).fetchone()
+            if added:
+                self._queued += added
+                self._last_id = last_id
+
+    def pop(self) -> str:
+        """Marks the best queued URL as taken and returns it.
+
+        Raises:
+            IndexError: If the frontier is empty.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, url FROM frontier WHERE taken = 0 "
+                "ORDER BY hint DESC, depth, inlinks DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                raise IndexError("pop from empty frontier")
+            self._conn.execute("UPDATE frontier SET taken = 1 WHERE id = ?", (row[0],))
+            self._queued -= 1
+        return row[1]
+
+    def depth(self, url: str) -> int:
+        """Returns the depth of a queued or popped URL, or 0 if it is unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT depth FROM frontier WHERE url = ?", (url,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def task_done(self, url: str) -> None:
+        """Removes a popped URL for good once it has been processed."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM frontier WHERE url = ? AND taken = 1", (url,))
+
+    def restore(self) -> list:
+        """Puts URLs that were taken but never finished back into the queue.
+
+        Returns:
+            list: The restored URLs.
+        """
+        with self._lock, self._conn:
+            urls = [row[0] for row in self._conn.execute("SELECT url FROM frontier WHERE taken = 1")]
+            self._conn.execute("UPDATE frontier SET taken = 0 WHERE taken = 1")
+            self._queued += len(urls)
+        return urls
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        self._conn.close()
+
+
+class VisitedSet:
+    """Compact, disk-backed set of visited URLs.
+
+    Each URL is reduced to a 64-bit fingerprint. The fingerprints live in an
+    SQLite table, and a fixed-size Bloom filter in memory answers most lookups
+    for unseen URLs without touching the disk. Memory use is bounded by the
+    filter size no matter how many URLs are visited.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        num_bits (int): Size of the Bloom filter in bits.
+        num_hashes (int): Number of Bloom filter hash functions.
+    """
+
+    def __init__(self, path: str = "crawl_state.sqlite", capacity: int = 1_000_000, error_rate: float = 0.01):
+        """Opens or creates the visited set and loads the Bloom filter.
+
+        Args:
+            path (str, optional): Path of the SQLite database file. Defaults to "crawl_state.sqlite".
+            capacity (int, optional): Expected number of URLs. Defaults to 1,000,000.
+            error_rate (float, optional): Target false-positive rate of the Bloom filter. Defaults to 0.01.
+        """
+        self.path = path
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS visited (fingerprint INTEGER PRIMARY KEY)")
+        for (fingerprint,) in self._conn.execute("SELECT fingerprint FROM visited"):
+            self._set_bits(fingerprint & 0xFFFFFFFFFFFFFFFF)
+
+    @staticmethod
+    def fingerprint(url: str) -> int:
+        """Returns the unsigned 64-bit fingerprint of a URL."""
+        return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+    @staticmethod
+    def _to_signed(fingerprint: int) -> int:
+        """Maps an unsigned fingerprint onto SQLite's signed 64-bit integers."""
+        return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+    def _positions(self, fingerprint: int):
+        """Yields the Bloom filter bit positions of a fingerprint (double hashing)."""
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def _set_bits(self, fingerprint: int) -> None:
+        for pos in self._positions(fingerprint):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, url: str) -> bool:
+        fingerprint = self.fingerprint(url)
+        if not all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint)):
+            return False
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM visited WHERE fingerprint = ?", (self._to_signed(fingerprint),)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM visited").fetchone()[0]
+
+    def add(self, url: str) -> None:
+        """Marks a URL as visited."""
+        fingerprint = self.fingerprint(url)
+        self._set_bits(fingerprint)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO visited VALUES (?)", (self._to_signed(fingerprint),))
+
+    def discard(self, url: str) -> None:
+        """Unmarks a URL. Its Bloom bits stay set, so later lookups fall through to disk."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM visited WHERE fingerprint = ?", (self._to_signed(self.fingerprint(url)),))
+
+    def clear(self) -> None:
+        """Forgets all visited URLs."""
+        self._bits = bytearray(len(self._bits))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM visited")
+
+    def close(self) -> None:
+        """Closes the underlying database connection."""
+        self._conn.close()
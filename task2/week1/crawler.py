@@ -1,7 +1,13 @@
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
+from array import array
 from collections import defaultdict
+import os
+from postings import intersect_all, filter_phrase, encode_deltas
+from index_snapshot import write_snapshot, IndexSnapshot
+from ranking import as_uint32, bm25_top_k
+from http_client import PageSkipped, get_client
+from extractors import get_extractor
 
 class Crawler:
     """Web crawler that retrieves and indexes HTML pages starting from a given URL.
@@ -11,7 +17,15 @@ class Crawler:
         prefix (str): Base URL prefix to restrict crawling to a specific domain.
         agenda (list): List of URLs to visit.
         visited_urls (set): Set of already visited URLs.
-        index (defaultdict): In-memory index mapping words to lists of URLs.
+        urls (list): Document table mapping integer doc IDs to URLs.
+        index (dict): In-memory inverted index mapping words to sorted, duplicate-free
+            `array('I')` posting lists of doc IDs.
+        tfs (dict): Term frequencies, parallel to the posting lists in `index`.
+        doc_lengths (array): Number of words of every document, indexed by doc ID.
+        positions (dict): Word positions per term as a bytearray of varint-coded gap runs,
+            one run per posting.
+        position_offsets (dict): Start of each posting's run in `positions`, parallel to `index`.
+        extractor (object): Extracts text and links from downloaded pages (see `extractors.py`).
     """
 
     def __init__(self, start_url: str, prefix: str):
@@ -25,7 +39,13 @@ class Crawler:
         self.prefix = prefix
         self.agenda = [start_url]
         self.visited_urls = set()
-        self.index = defaultdict(list)
+        self.urls = []
+        self.index = {}
+        self.tfs = {}
+        self.doc_lengths = array('I')
+        self.positions = {}
+        self.position_offsets = {}
+        self.extractor = get_extractor()
 
     def crawl(self) -> None:
         """Crawls HTML pages starting from the start URL and updates the in-memory index.
@@ -47,16 +67,17 @@ class Crawler:
                 if not url.startswith(('http://', 'https://')):
                     print(f"Skipping {url} - Invalid URL format.")
                     continue
-                r = requests.get(url)
+                r = get_client().fetch_html(url)
                 print(r, r.encoding)
-                if r.status_code != 200 or "text/html" not in r.headers.get("Content-Type", ""):
-                    print(f"Skipping {url} - Not an HTML page or bad response.")
-                    continue
 
-                soup = BeautifulSoup(r.content, 'html.parser')
-                self.index_page(url, soup.get_text())
-                self.extract_links(soup, url)
+                # Only a charset the server declared overrides the one in the page
+                encoding = r.encoding if "charset" in r.headers.get("Content-Type", "").lower() else None
+                page = self.extractor.extract(r.content, url, encoding)
+                self.index_page(url, page.text)
+                self.extract_links(page.links)
 
+            except PageSkipped as e:
+                print(f"Skipping {url} - {e}")
             except requests.exceptions.RequestException as e:
                 print(f"Network error while processing {url}: {e}")
             except Exception as e:
@@ -68,6 +89,11 @@ class Crawler:
     def index_page(self, url: str, text: str) -> None:
         """Indexes the text content of a page.
 
+        The page gets the next doc ID, and that ID is appended once to the posting
+        list of every distinct word on the page, together with the number of
+        times the word occurs and its delta-encoded positions. Doc IDs only grow,
+        so posting lists stay sorted without further work.
+
         Args:
             url (str): The URL of the page.
             text (str): The text content of the page.
@@ -75,42 +101,85 @@ class Crawler:
         Returns:
             None
         """
-        words = text.split()
-        for word in words:
-            word = word.lower().strip(".,!?\"'()[]")
-            self.index[word].append(url)
-
-    def extract_links(self, soup: BeautifulSoup, base_url: str) -> None:
-        """Extracts internal links from a page and adds them to the agenda for crawling.
+        doc_id = len(self.urls)
+        self.urls.append(url)
+        words = [word.lower().strip(".,!?\"'()[]") for word in text.split()]
+        self.doc_lengths.append(len(words))
+        word_positions = defaultdict(list)
+        for position, word in enumerate(words):
+            word_positions[word].append(position)
+        for word, positions in word_positions.items():
+            postings = self.index.get(word)
+            if postings is None:
+                postings = self.index[word] = array('I')
+                self.tfs[word] = array('I')
+                self.positions[word] = bytearray()
+                self.position_offsets[word] = array('I')
+            postings.append(doc_id)
+            self.tfs[word].append(len(positions))
+            self.position_offsets[word].append(len(self.positions[word]))
+            self.positions[word] += encode_deltas(positions)
+
+    def extract_links(self, links: list) -> None:
+        """Adds the internal links of a page to the agenda for crawling.
 
         Args:
-            soup (BeautifulSoup): BeautifulSoup object of the page's HTML content.
-            base_url (str): The base URL of the current page.
+            links (list): Absolute URLs of the page's links.
 
         Returns:
             None
         """
-        for link in soup.find_all("a", href=True):
-            full_url = urljoin(base_url, link["href"])
+        for full_url in links:
             if full_url.startswith(self.prefix) and full_url not in self.visited_urls:
                 self.agenda.append(full_url)
 
-    def search(self, query: list) -> list:
+    def search(self, query: list, slop: int = 0) -> list:
         """Searches for a query in the index.
 
+        An element of the query that contains several words, such as
+        "duck billed platypus", is a phrase: its words must occur in this order,
+        with at most `slop` other words between consecutive ones.
+
+        Args:
+            query (list): A list of words and phrases to search for.
+            slop (int, optional): Number of other words allowed between the words of a phrase.
+                Defaults to 0 (exact phrases).
+
+        Returns:
+            list: The URLs that contain all the query words and phrases, in crawl order.
+        """
+        phrases = [element.lower().split() for element in query]
+        phrases = [phrase for phrase in phrases if phrase]
+        if not phrases:
+            return []
+        query_words = {word for phrase in phrases for word in phrase}
+        if any(word not in self.index for word in query_words):
+            return []
+        doc_ids = intersect_all([self.index[word] for word in query_words])
+        for phrase in phrases:
+            if len(phrase) > 1 and doc_ids:
+                terms = [(self.index[word], self.position_offsets[word], self.positions[word]) for word in phrase]
+                doc_ids = filter_phrase(doc_ids, terms, slop)
+        return [self.urls[doc_id] for doc_id in doc_ids]
+
+    def search_ranked(self, query: list, k: int = 10) -> list:
+        """Searches for a query and ranks the matching pages with BM25.
+
+        Unlike `search`, a page only needs to contain one of the query words.
+
         Args:
             query (list): A list of words to search for.
+            k (int, optional): Maximum number of results. Defaults to 10.
 
         Returns:
-            set: A set of URLs that contain all the query words.
+            list: Up to k `(url, score)` tuples, best match first.
         """
-        query_words = [word.lower() for word in query]
-        if not query_words:
-            return set()
-        results = set(self.index[query_words[0]])
-        for word in query_words[1:]:
-            results.intersection_update(self.index[word])
-        return list(results)
+        term_postings = []
+        for word in {word for element in query for word in element.lower().split()}:
+            if word in self.index:
+                term_postings.append((as_uint32(self.index[word]), as_uint32(self.tfs[word])))
+        doc_ids, scores = bm25_top_k(term_postings, as_uint32(self.doc_lengths), k)
+        return [(self.urls[doc_id], float(score)) for doc_id, score in zip(doc_ids, scores)]
 
     def save_index_to_file(self, file_name: str = "index_debug.txt") -> None:
         """Saves the in-memory index to a file for debugging or inspection.
@@ -122,17 +191,47 @@ class Crawler:
             None
         """
         with open(file_name, "w") as f:
-            for word, urls in self.index.items():
-                f.write(f"{word}: {', '.join(urls)}\n")
+            for word, postings in self.index.items():
+                f.write(f"{word}: {', '.join(self.urls[doc_id] for doc_id in postings)}\n")
+
+    def save_snapshot(self, file_name: str = "index.snap") -> None:
+        """Saves the index in the binary snapshot format of `index_snapshot.py`.
+
+        The snapshot can be opened with `IndexSnapshot` and searched without
+        crawling again.
+
+        Args:
+            file_name (str): The name of the snapshot file. Defaults to "index.snap".
+
+        Returns:
+            None
+        """
+        write_snapshot(file_name, self.urls, self.index, self.tfs, self.doc_lengths,
+                       self.positions, self.position_offsets)
 
 if __name__ == "__main__":
     prefix = 'https://vm009.rz.uos.de/crawl/'
     start_url = prefix + 'index.html'
+    snapshot = "index.snap"
 
-    crawler = Crawler(start_url, prefix)
-    crawler.crawl()
+    if os.path.exists(snapshot):
+        # Reuse the index of a previous crawl
+        index = IndexSnapshot(snapshot)
+    else:
+        crawler = Crawler(start_url, prefix)
+        crawler.crawl()
+        crawler.save_snapshot(snapshot)
+        index = crawler
 
     # Example search
     print("Search results for 'platypus':")
-    for i, url in enumerate(crawler.search(["platypus"]), 1):
+    for i, url in enumerate(index.search(["platypus"]), 1):
+        print(f"{i}. {url}")
+
+    print("Ranked results for 'duck billed platypus':")
+    for i, (url, score) in enumerate(index.search_ranked(["duck", "billed", "platypus"]), 1):
+        print(f"{i}. {url} ({score:.2f})")
+
+    print("Search results for the phrase 'duck billed platypus':")
+    for i, url in enumerate(index.search(["duck billed platypus"]), 1):
         print(f"{i}. {url}")
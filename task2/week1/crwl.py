@@ -1,4 +1,4 @@
-import requests
+from http_client import get_client
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 from collections import defaultdict
@@ -12,7 +12,7 @@ agenda = [start_url]
 while agenda:
     url = agenda.pop()
     print("Get ",url)
-    r = requests.get(url)
+    r = get_client().get(url)
     print(r, r.encoding)
     if r.status_code == 200:
         print(r.headers)
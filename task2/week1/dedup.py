@@ -0,0 +1,236 @@
+"""URL canonicalization and near-duplicate detection for the crawler.
+
+Many URLs of a site lead to the same page: tracking parameters, session IDs,
+printer-friendly views, or the same query parameters in another order.
+`canonicalize_url` maps them to one URL before they enter the frontier, so the
+copies are never fetched at all.
+
+Pages that differ only slightly, like paginated archives or pages that were
+changed a little, have different URLs and are still fetched. They are caught
+by `NearDuplicateDetector` before they are indexed. It compares 64-bit SimHash
+fingerprints of the page text, which differ in only a few bits for
+near-identical texts.
+
+    detector = NearDuplicateDetector()
+    original = detector.check(url, text)   # None, or the URL of an earlier near-duplicate
+"""
+import hashlib
+import re
+from collections import Counter
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+import numpy as np
+
+# Query parameters that do not change what a page shows
+IGNORED_PARAMS = frozenset({
+    "fbclid", "gclid", "msclkid", "ref", "sessionid", "sid", "phpsessid", "jsessionid",
+    "print", "printable", "printview", "share",
+})
+IGNORED_PARAM_PREFIXES = ("utm_",)
+# Session IDs embedded in the path, e.g. "page.html;jsessionid=..."
+PATH_SESSION_ID = re.compile(r";(jsessionid|phpsessid|sid)=[^/?#]*", re.IGNORECASE)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TOKEN = re.compile(r"\w+")
+FINGERPRINT_BITS = 64
+
+
+def canonicalize_url(url: str) -> str:
+    """Returns the canonical form of a URL.
+
+    The scheme and host are lowercased and the default port is dropped, as is
+    the fragment. Session IDs are removed from the path. The query keeps only
+    the parameters that are not in `IGNORED_PARAMS`, sorted. An empty path
+    becomes "/". IPv6 hosts keep their brackets. Applying it twice gives the
+    same URL.
+
+    Args:
+        url (str): An absolute URL.
+
+    Returns:
+        str: The canonical URL.
+
+    Raises:
+        ValueError: If the URL is malformed, e.g. has a non-numeric port.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    userinfo, _, host = parts.netloc.rpartition("@")
+    port = ""
+    colon = host.rfind(":")
+    if colon > host.rfind("]"):
+        host, port = host[:colon], host[colon + 1:]
+    if port and not (port.isascii() and port.isdigit()):
+        raise ValueError(f"Invalid port {port!r} in {url!r}")
+    host = host.lower().rstrip(".")
+    if port and int(port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{int(port)}"
+    if userinfo:
+        host = f"{userinfo}@{host}"
+    path = PATH_SESSION_ID.sub("", parts.path) or "/"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in IGNORED_PARAMS and not key.lower().startswith(IGNORED_PARAM_PREFIXES)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query, quote_via=quote), ""))
+
+
+def canonicalize_urls(urls) -> list:
+    """Canonicalizes URLs, leaving out the malformed ones.
+
+    Args:
+        urls (iterable): Absolute URLs.
+
+    Returns:
+        list: The canonical URLs, in the same order.
+    """
+    canonical = []
+    for url in urls:
+        try:
+            canonical.append(canonicalize_url(url))
+        except ValueError as e:
+            print(f"Skipping malformed URL {url}: {e}")
+    return canonical
+
+
+def simhash(text: str, shingle: int = 3):
+    """Computes the 64-bit SimHash fingerprint of a text.
+
+    The features are the overlapping runs of `shingle` words, weighted by how
+    often they occur. Every feature is hashed, and bit i of the fingerprint is
+    set if the features with bit i set outweigh the others. Texts that share
+    most of their features get fingerprints that differ in few bits.
+
+    Args:
+        text (str): The page text.
+        shingle (int, optional): Number of words per feature. Defaults to 3.
+
+    Returns:
+        int: The fingerprint, or None if the text has no words.
+    """
+    words = TOKEN.findall(text.lower())
+    if len(words) > shingle:
+        words = [" ".join(run) for run in zip(*(words[i:] for i in range(shingle)))]
+    counts = Counter(words)
+    if not counts:
+        return None
+    digests = b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in counts)
+    # One row of 64 bits per feature, bit i in column i
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    votes = weights @ (2 * bits.astype(np.int64) - 1)
+    return int.from_bytes(np.packbits(votes > 0, bitorder="little").tobytes(), "little")
+
+
+class NearDuplicateDetector:
+    """Finds pages whose SimHash fingerprints are within a Hamming distance of each other.
+
+    The fingerprints are split into `max_distance + 1` bands, and every band
+    has a lookup table from the band's bits to the pages that have them. Two
+    fingerprints that differ in at most `max_distance` bits cannot differ in
+    every band, so they share at least one band exactly. Only the pages in
+    the matching buckets are compared, never the whole table.
+
+    The table only knows the pages checked in this crawl. Pages that are not
+    parsed again, like pages that are unchanged in an incremental crawl, are
+    not in it.
+
+    Attributes:
+        max_distance (int): Largest number of differing bits for two pages to be near-duplicates.
+        shingle (int): Number of words per SimHash feature.
+        suppressed (int): Number of pages found to be near-duplicates.
+    """
+
+    def __init__(self, max_distance: int = 3, shingle: int = 3):
+        """Initializes an empty table.
+
+        Args:
+            max_distance (int, optional): Largest number of differing bits for two pages to be
+                near-duplicates. Defaults to 3.
+            shingle (int, optional): Number of words per SimHash feature. Defaults to 3.
+        """
+        self.max_distance = max_distance
+        self.shingle = shingle
+        self.suppressed = 0
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        # (shift, mask) of every band; the last band takes the remaining bits
+        self._bands = [(i * width, (1 << (width if i < bands - 1 else FINGERPRINT_BITS - i * width)) - 1)
+                       for i in range(bands)]
+        self._tables = [{} for _ in range(bands)]
+        self._fingerprints = {}
+
+    def __len__(self) -> int:
+        """Returns the number of pages in the table."""
+        return len(self._fingerprints)
+
+    def _keys(self, fingerprint: int):
+        return [(fingerprint >> shift) & mask for shift, mask in self._bands]
+
+    def find(self, fingerprint: int, url: str = None):
+        """Looks up a page whose fingerprint is within `max_distance` bits of a fingerprint.
+
+        Args:
+            fingerprint (int): The fingerprint to look up.
+            url (str, optional): URL to ignore, usually the page's own. Defaults to None.
+
+        Returns:
+            str: The URL of a near-duplicate page, or None.
+        """
+        for table, key in zip(self._tables, self._keys(fingerprint)):
+            for other in table.get(key, ()):
+                if other != url and (self._fingerprints[other] ^ fingerprint).bit_count() <= self.max_distance:
+                    return other
+        return None
+
+    def add(self, url: str, fingerprint: int) -> None:
+        """Adds a page to the table, replacing an earlier fingerprint of the same URL.
+
+        Args:
+            url (str): The URL of the page.
+            fingerprint (int): Its fingerprint.
+
+        Returns:
+            None
+        """
+        self.discard(url)
+        self._fingerprints[url] = fingerprint
+        for table, key in zip(self._tables, self._keys(fingerprint)):
+            table.setdefault(key, []).append(url)
+
+    def discard(self, url: str) -> None:
+        """Removes a page from the table, if it is in it.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            None
+        """
+        fingerprint = self._fingerprints.pop(url, None)
+        if fingerprint is None:
+            return
+        for table, key in zip(self._tables, self._keys(fingerprint)):
+            bucket = table[key]
+            bucket.remove(url)
+            if not bucket:
+                del table[key]
+
+    def check(self, url: str, text: str):
+        """Checks whether a page is a near-duplicate of a page seen before, and remembers it if not.
+
+        Args:
+            url (str): The URL of the page.
+            text (str): The page text.
+
+        Returns:
+            str: The URL of the earlier near-duplicate, or None if the page is new. Pages
+                without any words are never near-duplicates.
+        """
+        fingerprint = simhash(text, self.shingle)
+        if fingerprint is None:
+            return None
+        original = self.find(fingerprint, url)
+        if original is not None:
+            self.suppressed += 1
+            return original
+        self.add(url, fingerprint)
+        return None
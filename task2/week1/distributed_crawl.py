@@ -0,0 +1,454 @@
+"""Distributed crawl, partitioned by host across worker processes or machines.
+
+Every URL belongs to exactly one of N workers, chosen by a hash of its host
+(`shard_of` with `by_host=True`). A worker keeps its own frontier, visited set
+and politeness scheduler for the hosts it owns, writes its own index shard
+(`<index_dir>/shard-<i>`, recorded as routed by host), and
+forwards links to other workers' hosts to their owners. Since a host is only
+ever crawled by one worker, per-host rate limits and robots.txt still hold.
+
+Links travel through a coordinator: a `multiprocessing` manager server that
+holds one inbox per worker and detects when the crawl is over, i.e. when every
+worker is idle and no forwarded links are in transit. Workers talk to it over
+a socket, so they can run on one machine or on several.
+
+    python distributed_crawl.py --workers 4
+    python distributed_crawl.py --workers 4 --serve 0.0.0.0:5050
+    python distributed_crawl.py --workers 4 --connect coordinator:5050 --authkey <key> --ids 2 3
+
+The first command runs the coordinator and all workers on this machine. The
+second runs only the coordinator and prints the key workers need to connect
+(or uses `--authkey`); the third runs workers 2 and 3 against it, with the
+shards written under this machine's `--index-dir`. Once collected in one
+directory, the shards are searched together with `ShardedWhooshHelper`.
+
+The manager protocol unpickles what it receives, so anyone who knows the key
+can run code on the coordinator: keep the key secret and the port private.
+
+Workers send a heartbeat to the coordinator. A worker that is silent for too
+long is taken for dead and the crawl is aborted, since its hosts would never
+be crawled and the others would wait for them forever.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.managers import BaseManager
+from helpers import WhooshHelper, shard_of, shard_path, write_build_stats, write_shard_layout
+from dedup import canonicalize_urls
+from whoosh_flask_crawler import Crawler
+from crawl_state import PageMetadataStore, SQLiteFrontier, VisitedSet
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREFIX = 'https://vm009.rz.uos.de/crawl/'
+INDEX_DIR = os.path.join(BASE_DIR, "indexdir.shards")
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 60.0
+
+
+class Coordinator:
+    """Worker inboxes and termination detection, served by the coordinator process.
+
+    Every forwarded batch of links counts as in transit from `send` until the
+    receiving worker has taken it with `receive`, and a worker that takes a
+    batch is marked busy before the batch stops counting. So the crawl is only
+    declared finished when all workers are idle and nothing is in transit.
+
+    Workers also send heartbeats, so the coordinator can tell a worker that is
+    busy crawling from one that died.
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self._inboxes = [queue.Queue() for _ in range(num_workers)]
+        self._lock = threading.Lock()
+        self._in_transit = 0
+        self._idle = [False] * num_workers
+        self._done = False
+        self._reports = {}
+        # Workers that never connect count as silent since the coordinator started
+        self._seen = [time.monotonic()] * num_workers
+
+    def send(self, worker: int, batch) -> None:
+        """Puts a batch of links into a worker's inbox."""
+        with self._lock:
+            self._in_transit += 1
+        self._inboxes[worker].put(batch)
+
+    def receive(self, worker: int, timeout: float = 0.0) -> list:
+        """Takes all batches from a worker's inbox, waiting up to `timeout` seconds for the first."""
+        batches = []
+        try:
+            batches.append(self._inboxes[worker].get(timeout=timeout) if timeout > 0
+                           else self._inboxes[worker].get_nowait())
+            while True:
+                batches.append(self._inboxes[worker].get_nowait())
+        except queue.Empty:
+            pass
+        if batches:
+            with self._lock:
+                self._idle[worker] = False
+                self._in_transit -= len(batches)
+        return batches
+
+    def idle(self, worker: int) -> bool:
+        """Marks a worker as out of work and returns whether the whole crawl is finished."""
+        with self._lock:
+            self._idle[worker] = True
+            if all(self._idle) and self._in_transit == 0:
+                self._done = True
+            return self._done
+
+    def heartbeat(self, worker: int) -> None:
+        """Records that a worker is alive."""
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+
+    def silent(self, timeout: float) -> list:
+        """Returns the workers that have neither reported nor sent a heartbeat for `timeout` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            return [worker for worker, seen in enumerate(self._seen)
+                    if worker not in self._reports and now - seen > timeout]
+
+    def finished(self) -> bool:
+        """Returns whether the crawl is over, without marking any worker as idle."""
+        with self._lock:
+            return self._done
+
+    def abort(self) -> None:
+        """Ends the crawl for all workers, e.g. after one of them died."""
+        with self._lock:
+            self._done = True
+
+    def report(self, worker: int, stats: dict) -> None:
+        """Records the final statistics of a worker."""
+        with self._lock:
+            self._reports[worker] = stats
+
+    def reports(self) -> dict:
+        """Returns the statistics reported so far, by worker ID."""
+        with self._lock:
+            return dict(self._reports)
+
+
+_coordinator = None
+
+
+def _init_coordinator(num_workers: int) -> None:
+    global _coordinator
+    _coordinator = Coordinator(num_workers)
+
+
+def _get_coordinator() -> Coordinator:
+    return _coordinator
+
+
+class CoordinatorManager(BaseManager):
+    """Manager that serves the `Coordinator` to the workers over a socket."""
+
+
+CoordinatorManager.register("coordinator", callable=_get_coordinator)
+
+
+class PartitionedCrawler(Crawler):
+    """Crawler for one partition of a distributed crawl.
+
+    Discovered URLs owned by other workers are forwarded to them through the
+    coordinator instead of being queued locally; links forwarded to this worker
+    are taken from its inbox whenever the scheduler is refilled. `crawl` only
+    returns when the whole distributed crawl is finished.
+
+    Attributes:
+        worker_id (int): ID of this worker.
+        num_workers (int): Number of workers in the crawl.
+        coordinator: Proxy of the `Coordinator`.
+        forwarded (int): Number of URLs sent to other workers.
+    """
+
+    def __init__(self, worker_id: int, num_workers: int, coordinator, start_url: str, prefix: str,
+                 whoosh_helper: WhooshHelper, **kwargs):
+        """Initializes the worker's crawler.
+
+        Only the owner of the start URL seeds the crawl and reads the sitemaps.
+
+        Args:
+            worker_id (int): ID of this worker.
+            num_workers (int): Number of workers in the crawl.
+            coordinator: Proxy of the `Coordinator`.
+            start_url (str): The URL to begin crawling from.
+            prefix (str): The base URL prefix to restrict crawling to.
+            whoosh_helper (WhooshHelper): Helper for this worker's index shard.
+            **kwargs: Passed on to `Crawler`.
+        """
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.coordinator = coordinator
+        self.forwarded = 0
+        self._forwarded = set()
+        owns_start = shard_of(start_url, num_workers, by_host=True) == worker_id
+        kwargs["use_sitemaps"] = kwargs.get("use_sitemaps", True) and owns_start
+        super().__init__(start_url, prefix, whoosh_helper, **kwargs)
+
+    def enqueue(self, urls: list, depth: int = 0, hint: float = 0.0) -> None:
+        """Queues the URLs this worker owns and forwards the others to their owners.
+
+        Args:
+            urls (list): The discovered URLs.
+            depth (int, optional): Number of links between the start page and the URLs. Defaults to 0.
+            hint (float, optional): Priority hint from a sitemap. Defaults to 0.0.
+
+        Returns:
+            None
+        """
+        local = []
+        remote = defaultdict(list)
+        for url in canonicalize_urls(urls):
+            owner = shard_of(url, self.num_workers, by_host=True)
+            if owner == self.worker_id:
+                local.append(url)
+            elif url not in self._forwarded:
+                self._forwarded.add(url)
+                remote[owner].append(url)
+        if local:
+            super().enqueue(local, depth, hint)
+        for owner, batch in remote.items():
+            self.coordinator.send(owner, (batch, depth, hint))
+            self.forwarded += len(batch)
+
+    def _receive(self, timeout: float = 0.0) -> bool:
+        """Moves links forwarded to this worker into its frontier.
+
+        Returns:
+            bool: True if any links arrived.
+        """
+        batches = self.coordinator.receive(self.worker_id, timeout)
+        for urls, depth, hint in batches:
+            super().enqueue(urls, depth, hint)
+        return bool(batches)
+
+    def _fill_scheduler(self, max_pending: int = 10000) -> None:
+        # Checked on every pass of the fetch loop, so a busy worker stops soon after an abort
+        if self.coordinator.finished():
+            self.stop()
+            return
+        self._receive()
+        super()._fill_scheduler(max_pending)
+
+    def crawl(self) -> None:
+        """Crawls this worker's partition until the distributed crawl is finished or aborted.
+
+        Returns:
+            None
+        """
+        while True:
+            super().crawl()
+            if self._stopped:
+                return
+            while not self._receive(timeout=0.5):
+                if self.coordinator.idle(self.worker_id):
+                    return
+
+
+def run_worker(worker_id: int, num_workers: int, address, authkey: bytes, start_url: str, prefix: str,
+               index_dir: str, state_dir: str = None, crawler_kwargs: dict = None) -> None:
+    """Runs one worker of a distributed crawl until the crawl is finished.
+
+    Args:
+        worker_id (int): ID of this worker.
+        num_workers (int): Number of workers in the crawl.
+        address (tuple): `(host, port)` of the coordinator.
+        authkey (bytes): Shared secret of the coordinator.
+        start_url (str): The URL to begin crawling from.
+        prefix (str): The base URL prefix to restrict crawling to.
+        index_dir (str): Directory holding the index shards.
+        state_dir (str, optional): Directory for a persistent, resumable crawl state per worker.
+            Defaults to None (in-memory state).
+        crawler_kwargs (dict, optional): More `Crawler` options. Defaults to None.
+
+    Returns:
+        None
+    """
+    manager = CoordinatorManager(address=address, authkey=authkey)
+    manager.connect()
+    coordinator = manager.coordinator()
+    stop = threading.Event()
+    threading.Thread(target=_send_heartbeats, args=(manager, worker_id, stop), daemon=True).start()
+
+    kwargs = dict(crawler_kwargs or {})
+    if state_dir is not None:
+        state_path = os.path.join(state_dir, f"worker-{worker_id}.sqlite")
+        kwargs.update(metadata=PageMetadataStore(state_path), agenda=SQLiteFrontier(state_path),
+                      visited_urls=VisitedSet(state_path))
+    # The shard holds the pages of this worker's hosts, so later writers must route by host as well
+    write_shard_layout(index_dir, num_workers, by_host=True)
+    whoosh_helper = WhooshHelper(shard_path(index_dir, worker_id), store_content=False)
+    crawler = PartitionedCrawler(worker_id, num_workers, coordinator, start_url, prefix, whoosh_helper, **kwargs)
+    # Searches extract fetched pages the way they were indexed
+    write_build_stats(index_dir, main_content=getattr(crawler.extractor, "main_content", False))
+    started = time.monotonic()
+    try:
+        crawler.crawl()
+        coordinator.report(worker_id, {"documents": whoosh_helper.doc_count(), "forwarded": crawler.forwarded,
+                                       "duplicates": crawler.dedup.suppressed if crawler.dedup is not None else 0,
+                                       "seconds": round(time.monotonic() - started, 1)})
+    finally:
+        stop.set()
+
+
+def _send_heartbeats(manager: CoordinatorManager, worker_id: int, stop: threading.Event) -> None:
+    """Tells the coordinator every HEARTBEAT_INTERVAL seconds that a worker is alive, until `stop` is set."""
+    # A proxy of its own, as the crawl thread's proxy is not shared between threads
+    coordinator = manager.coordinator()
+    while not stop.is_set():
+        try:
+            coordinator.heartbeat(worker_id)
+        except (OSError, EOFError) as e:
+            print(f"Lost the coordinator: {e}")
+            return
+        stop.wait(HEARTBEAT_INTERVAL)
+
+
+def _print_reports(reports: dict) -> None:
+    for worker, stats in sorted(reports.items()):
+        print(f"worker {worker}: {stats['documents']} documents, {stats['duplicates']} near-duplicates skipped, "
+              f"{stats['forwarded']} links forwarded, {stats['seconds']}s")
+    print(f"Indexed {sum(stats['documents'] for stats in reports.values())} documents in {len(reports)} shards")
+
+
+def crawl_distributed(num_workers: int, start_url: str, prefix: str = PREFIX, index_dir: str = INDEX_DIR,
+                      state_dir: str = None, crawler_kwargs: dict = None) -> dict:
+    """Runs a distributed crawl with all workers as processes on this machine.
+
+    Args:
+        num_workers (int): Number of worker processes.
+        start_url (str): The URL to begin crawling from.
+        prefix (str, optional): The base URL prefix to restrict crawling to. Defaults to PREFIX.
+        index_dir (str, optional): Directory for the index shards. Defaults to INDEX_DIR.
+        state_dir (str, optional): Directory for a persistent crawl state per worker. Defaults to None.
+        crawler_kwargs (dict, optional): More `Crawler` options. Defaults to None.
+
+    Returns:
+        dict: Statistics reported by each worker, by worker ID.
+    """
+    # Spawned, not forked: the workers start their own fetch threads and process pools.
+    ctx = multiprocessing.get_context("spawn")
+    authkey = os.urandom(16)
+    manager = CoordinatorManager(address=("127.0.0.1", 0), authkey=authkey, ctx=ctx)
+    manager.start(_init_coordinator, (num_workers,))
+    try:
+        coordinator = manager.coordinator()
+        workers = [ctx.Process(target=run_worker, name=f"crawl-worker-{i}",
+                               args=(i, num_workers, manager.address, authkey, start_url, prefix,
+                                     index_dir, state_dir, crawler_kwargs))
+                   for i in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=0.5)
+                if worker.exitcode not in (None, 0):
+                    # The others would wait forever for the links this worker owned.
+                    print(f"{worker.name} failed with exit code {worker.exitcode}, stopping the crawl")
+                    coordinator.abort()
+        return coordinator.reports()
+    finally:
+        manager.shutdown()
+
+
+def serve(num_workers: int, address, authkey: bytes, timeout: float = HEARTBEAT_TIMEOUT) -> dict:
+    """Runs only the coordinator, for workers started elsewhere with `run_worker`.
+
+    Returns once every worker has reported or is taken for dead. A worker is
+    taken for dead when it has not sent a heartbeat for `timeout` seconds, or
+    has not connected within `timeout` seconds of the coordinator starting.
+    The crawl is then aborted, and the other workers report what they have.
+
+    Args:
+        num_workers (int): Number of workers in the crawl.
+        address (tuple): `(host, port)` to listen on.
+        authkey (bytes): Shared secret of the workers.
+        timeout (float, optional): Seconds without a heartbeat after which a worker is taken for dead.
+            Defaults to HEARTBEAT_TIMEOUT.
+
+    Returns:
+        dict: Statistics reported by each worker, by worker ID.
+    """
+    if not authkey:
+        raise ValueError("The coordinator needs an authkey")
+    _init_coordinator(num_workers)
+    manager = CoordinatorManager(address=address, authkey=authkey)
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Coordinator for {num_workers} workers listening on {server.address}")
+    dead = set()
+    while len(_coordinator.reports()) + len(dead) < num_workers:
+        time.sleep(min(1.0, timeout / 4))
+        silent = set(_coordinator.silent(timeout)) - dead
+        if silent:
+            print(f"No heartbeat from workers {sorted(silent)} for {timeout:.0f}s, stopping the crawl")
+            dead |= silent
+            _coordinator.abort()
+    return _coordinator.reports()
+
+
+def _address(value: str) -> tuple:
+    host, _, port = value.rpartition(":")
+    return host, int(port)
+
+
+def main(argv=None) -> None:
+    """Parses the command line and runs the coordinator, the workers, or both."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="total number of crawl workers")
+    parser.add_argument("--serve", type=_address, metavar="HOST:PORT", help="only run the coordinator")
+    parser.add_argument("--connect", type=_address, metavar="HOST:PORT",
+                        help="only run workers, against this coordinator")
+    parser.add_argument("--ids", type=int, nargs="+", help="IDs of the workers to run with --connect")
+    parser.add_argument("--authkey", help="shared secret of the coordinator, required with --connect "
+                                          "(default with --serve: a random key that is printed)")
+    parser.add_argument("--heartbeat-timeout", type=float, default=HEARTBEAT_TIMEOUT,
+                        help="seconds without a heartbeat after which --serve takes a worker for dead")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="directory for the index shards")
+    parser.add_argument("--state-dir", help="directory for a resumable crawl state per worker")
+    parser.add_argument("--prefix", default=PREFIX, help="only crawl URLs starting with this prefix")
+    parser.add_argument("--start-url", help="URL to start crawling from (default: PREFIX + index.html)")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="concurrent fetches per worker")
+    parser.add_argument("--rate", type=float, default=4.0, help="maximum requests per second per host")
+    args = parser.parse_args(argv)
+    if args.connect and not args.authkey:
+        parser.error("--connect needs the --authkey of the coordinator")
+
+    start_url = args.start_url or args.prefix + "index.html"
+    crawler_kwargs = {"workers": args.fetch_workers, "rate_per_host": args.rate}
+    for path in (args.index_dir, args.state_dir):
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    if args.serve:
+        authkey = args.authkey
+        if not authkey:
+            authkey = secrets.token_urlsafe(16)
+            print(f"Connect workers with --authkey {authkey}")
+        _print_reports(serve(args.workers, args.serve, authkey.encode(), args.heartbeat_timeout))
+    elif args.connect:
+        ctx = multiprocessing.get_context("spawn")
+        workers = [ctx.Process(target=run_worker, args=(i, args.workers, args.connect, args.authkey.encode(),
+                                                        start_url, args.prefix, args.index_dir,
+                                                        args.state_dir, crawler_kwargs))
+                   for i in (args.ids if args.ids is not None else range(args.workers))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        _print_reports(crawl_distributed(args.workers, start_url, args.prefix, args.index_dir,
+                                         args.state_dir, crawler_kwargs))
+
+
+if __name__ == "__main__":
+    main()
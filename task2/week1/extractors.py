@@ -0,0 +1,381 @@
+"""Single-pass HTML extractors for the crawler.
+
+An extractor turns a downloaded page into the three things the crawler needs:
+the title, the visible text (without `<script>` and `<style>` content) and the
+absolute URLs of its links. The fast extractors get all three from one pass
+over the page instead of building a BeautifulSoup tree and walking it twice.
+
+    extractor = get_extractor()          # lxml if installed, else htmlparser
+    page = extractor.extract(r.content, url)
+
+With `main_content=True`, the text is cut into blocks at block-level tags
+while it is extracted, and only the blocks that `extract_main_content` scores
+as content are kept. Navigation, footers and link lists never reach the index.
+
+`bench_extractors.py` compares them with the BeautifulSoup path.
+"""
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Result of an extraction. `title` is None if the page has no title.
+ParsedPage = namedtuple("ParsedPage", ["title", "text", "links"])
+
+SKIP_TAGS = frozenset({"script", "style"})
+# Tags that separate words, so text on both sides of them is not run together
+BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul",
+})
+# Block tags that hold page furniture rather than content; dropped with main_content
+BOILERPLATE_TAGS = frozenset({"aside", "footer", "form", "nav"})
+# A block needs this many words to count as content on its own
+MIN_BLOCK_WORDS = 10
+# Largest share of a content block's characters that may be link text
+MAX_LINK_DENSITY = 0.33
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
+def decode_html(content: bytes, encoding: str = None) -> str:
+    """Decodes a page using the declared, the `<meta>` or the default (UTF-8) encoding.
+
+    Args:
+        content (bytes): The raw page.
+        encoding (str, optional): Encoding from the Content-Type header, if any. Defaults to None.
+
+    Returns:
+        str: The decoded page; undecodable bytes are replaced.
+    """
+    if encoding is None:
+        match = META_CHARSET.search(content[:2048])
+        encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return content.decode(encoding, errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+
+def extract_main_content(blocks: list, min_words: int = MIN_BLOCK_WORDS,
+                         max_link_density: float = MAX_LINK_DENSITY) -> str:
+    """Keeps the blocks of a page that look like content rather than boilerplate.
+
+    Every block is scored on two cheap features: its number of words and its
+    link density, the share of its characters inside links. Content is
+    running text with few links; menus, link lists, breadcrumbs and footers
+    are short or mostly links. A short block with few links right before a
+    content block, typically a heading, is kept as well. If no block counts
+    as content, all blocks are kept, so short pages are never emptied.
+
+    Args:
+        blocks (list): `(text, link_chars)` pairs in document order, with whitespace-normalized text.
+        min_words (int, optional): Words a block needs to count as content. Defaults to MIN_BLOCK_WORDS.
+        max_link_density (float, optional): Largest link density of a content block.
+            Defaults to MAX_LINK_DENSITY.
+
+    Returns:
+        str: The text of the kept blocks, one block per line.
+    """
+    few_links = [link_chars <= max_link_density * len(text) for text, link_chars in blocks]
+    content = [ok and len(text.split()) >= min_words for (text, _), ok in zip(blocks, few_links)]
+    if not any(content):
+        return "\n".join(text for text, _ in blocks)
+    return "\n".join(
+        text for i, (text, _) in enumerate(blocks)
+        if content[i] or (few_links[i] and i + 1 < len(blocks) and content[i + 1])
+    )
+
+
+class _Blocks:
+    """Collects text into blocks and counts the characters inside links of each block."""
+
+    def __init__(self):
+        self.blocks = []
+        self._parts = []
+        self._link_chars = 0
+
+    def add(self, data: str, link: bool) -> None:
+        self._parts.append(data)
+        if link:
+            self._link_chars += len(data)
+
+    def end(self) -> None:
+        text = " ".join("".join(self._parts).split())
+        if text:
+            self.blocks.append((text, min(self._link_chars, len(text))))
+        self._parts = []
+        self._link_chars = 0
+
+
+class _SinglePassParser(HTMLParser):
+    """Collects title, visible text and link targets while the page is fed through.
+
+    With `main_content`, the text is collected as blocks instead and the
+    content of `BOILERPLATE_TAGS` is left out.
+    """
+
+    def __init__(self, base_url: str, main_content: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.title = None
+        self.text = []
+        self.links = []
+        self.blocks = _Blocks() if main_content else None
+        self._in_title = False
+        self._skip = False
+        self._in_link = 0
+        self._boilerplate = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip = True
+        elif tag == "title" and self.title is None:
+            self._in_title = True
+            self.title = ""
+        elif tag == "a":
+            self._in_link += 1
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(urljoin(self.base_url, href.strip()))
+        elif tag == "base":
+            href = dict(attrs).get("href")
+            if href:
+                self.base_url = urljoin(self.base_url, href.strip())
+        elif tag in BLOCK_TAGS:
+            if self.blocks is None:
+                self.text.append("\n")
+            else:
+                self.blocks.end()
+                if tag in BOILERPLATE_TAGS:
+                    self._boilerplate += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = False
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "a":
+            self._in_link = max(0, self._in_link - 1)
+        elif tag in BLOCK_TAGS:
+            if self.blocks is None:
+                self.text.append("\n")
+            else:
+                self.blocks.end()
+                if tag in BOILERPLATE_TAGS:
+                    self._boilerplate = max(0, self._boilerplate - 1)
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+        elif self.blocks is None:
+            self.text.append(data)
+        elif not self._boilerplate:
+            self.blocks.add(data, self._in_link > 0)
+
+
+class HTMLParserExtractor:
+    """Streaming extractor on top of the standard library's `HTMLParser`.
+
+    Needs no extra dependency. The page is tokenized once and no tree is built.
+
+    Attributes:
+        main_content (bool): Keep only the main content of a page, see `extract_main_content`.
+    """
+
+    name = "htmlparser"
+
+    def __init__(self, main_content: bool = False):
+        self.main_content = main_content
+
+    def extract(self, content: bytes, base_url: str, encoding: str = None) -> ParsedPage:
+        """Extracts title, visible text and links from a page.
+
+        Args:
+            content (bytes): The raw page.
+            base_url (str): URL of the page, against which relative links are resolved.
+            encoding (str, optional): Encoding from the Content-Type header, if any. Defaults to None.
+
+        Returns:
+            ParsedPage: The title (or None), the visible text and the absolute link URLs.
+        """
+        parser = _SinglePassParser(base_url, self.main_content)
+        parser.feed(decode_html(content, encoding))
+        parser.close()
+        title = parser.title.strip() if parser.title is not None else None
+        if self.main_content:
+            parser.blocks.end()
+            return ParsedPage(title, extract_main_content(parser.blocks.blocks), parser.links)
+        return ParsedPage(title, "".join(parser.text), parser.links)
+
+
+def _lxml_blocks(root) -> list:
+    """Walks an lxml tree once and returns its text as `(text, link_chars)` blocks."""
+    blocks = _Blocks()
+    in_link = 0
+    for event, element in lxml.etree.iterwalk(root, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            if tag in BLOCK_TAGS:
+                blocks.end()
+            elif tag == "a":
+                in_link += 1
+            # Comments and processing instructions have a non-string tag and no visible text
+            if element.text and isinstance(tag, str):
+                blocks.add(element.text, in_link > 0)
+        else:
+            if tag in BLOCK_TAGS:
+                blocks.end()
+            elif tag == "a":
+                in_link -= 1
+            if element.tail and element is not root:
+                blocks.add(element.tail, in_link > 0)
+    blocks.end()
+    return blocks.blocks
+
+
+class LxmlExtractor:
+    """Extractor built on lxml's C HTML parser. Requires the optional `lxml` package.
+
+    Attributes:
+        main_content (bool): Keep only the main content of a page, see `extract_main_content`.
+    """
+
+    name = "lxml"
+
+    def __init__(self, main_content: bool = False):
+        if lxml is None:
+            raise ImportError("LxmlExtractor requires the lxml package")
+        self.main_content = main_content
+
+    def extract(self, content: bytes, base_url: str, encoding: str = None) -> ParsedPage:
+        """Extracts title, visible text and links from a page.
+
+        Args:
+            content (bytes): The raw page.
+            base_url (str): URL of the page, against which relative links are resolved.
+            encoding (str, optional): Encoding from the Content-Type header, if any. Defaults to None.
+
+        Returns:
+            ParsedPage: The title (or None), the visible text and the absolute link URLs.
+        """
+        # lxml rejects str input with an encoding declaration, as XHTML pages may have
+        html = XML_DECLARATION.sub("", decode_html(content, encoding), count=1)
+        if not html.strip():
+            return ParsedPage(None, "", [])
+        # libxml2 would fall back to Latin-1 for pages without a <meta> charset
+        root = lxml.html.document_fromstring(html, base_url=base_url)
+        title = root.findtext(".//title")
+        base = root.find(".//base[@href]")
+        if base is not None:
+            base_url = urljoin(base_url, base.get("href").strip())
+        links = [urljoin(base_url, a.get("href").strip()) for a in root.iter("a") if a.get("href")]
+        if self.main_content:
+            lxml.etree.strip_elements(root, *SKIP_TAGS, *BOILERPLATE_TAGS, "title", with_tail=False)
+            return ParsedPage(title.strip() if title is not None else None,
+                              extract_main_content(_lxml_blocks(root)), links)
+        lxml.etree.strip_elements(root, *SKIP_TAGS, "title", with_tail=False)
+        for element in root.iter(*BLOCK_TAGS):
+            element.text = "\n" + (element.text or "")
+            element.tail = "\n" + (element.tail or "")
+        return ParsedPage(title.strip() if title is not None else None, root.text_content(), links)
+
+
+class BeautifulSoupExtractor:
+    """The original BeautifulSoup path: one tree, walked for the text and again for the links.
+
+    Kept as a baseline for `bench_extractors.py`. Like `soup.get_text()` it
+    keeps the content of `<script>` and `<style>` tags. Its main content is
+    found with the original heuristic: drop scripts, styles, navigation and
+    footers, then keep the `<p>` and `<div>` texts longer than 30 characters.
+
+    Attributes:
+        main_content (bool): Keep only the main content of a page.
+    """
+
+    name = "beautifulsoup"
+
+    def __init__(self, main_content: bool = False):
+        self.main_content = main_content
+
+    def extract(self, content: bytes, base_url: str, encoding: str = None) -> ParsedPage:
+        """Extracts title, text and links from a page.
+
+        Args:
+            content (bytes): The raw page.
+            base_url (str): URL of the page, against which relative links are resolved.
+            encoding (str, optional): Encoding from the Content-Type header, if any. Defaults to None.
+
+        Returns:
+            ParsedPage: The title (or None), the text and the absolute link URLs.
+        """
+        soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+        title = soup.title.string if soup.title else None
+        links = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True)]
+        if not self.main_content:
+            return ParsedPage(title, soup.get_text(), links)
+        for tag in soup(["script", "style", "nav", "footer"]):
+            tag.decompose()
+        blocks = []
+        for tag in soup.find_all(["p", "div"]):
+            text = tag.get_text(strip=True)
+            # Ignore very short or non-alphanumeric-heavy blocks
+            if len(text) > 30 and sum(c.isalnum() for c in text) / len(text) > 0.5:
+                blocks.append(text)
+        return ParsedPage(title, " ".join(blocks), links)
+
+
+def extract_page(extractor, url: str, content: bytes, encoding: str = None, prefix: str = "") -> tuple:
+    """Extracts a page into a compact tuple, keeping only the links under a prefix.
+
+    A plain module-level function, so the crawl can run it in a worker process
+    and only send the small result back.
+
+    Args:
+        extractor (object): The extractor to use.
+        url (str): URL of the page.
+        content (bytes): The raw page.
+        encoding (str, optional): Encoding from the Content-Type header, if any. Defaults to None.
+        prefix (str, optional): Only links starting with this prefix are kept. Defaults to "" (all links).
+
+    Returns:
+        tuple: `(url, title, text, links)`.
+    """
+    page = extractor.extract(content, url, encoding)
+    return url, page.title, page.text, [link for link in page.links if link.startswith(prefix)]
+
+
+EXTRACTORS = {cls.name: cls for cls in (LxmlExtractor, HTMLParserExtractor, BeautifulSoupExtractor)}
+
+
+def get_extractor(name: str = None, main_content: bool = False):
+    """Returns an extractor by name.
+
+    Args:
+        name (str, optional): "lxml", "htmlparser" or "beautifulsoup". Defaults to None, which
+            picks lxml if it is installed and the `HTMLParser` extractor otherwise.
+        main_content (bool, optional): Keep only the main content of a page instead of all
+            visible text. Defaults to False.
+
+    Returns:
+        object: The extractor.
+
+    Raises:
+        ValueError: If there is no extractor with that name.
+        ImportError: If lxml is requested but not installed.
+    """
+    if name is None:
+        name = "lxml" if lxml is not None else "htmlparser"
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor {name!r}, expected one of {', '.join(EXTRACTORS)}")
+    return EXTRACTORS[name](main_content=main_content)
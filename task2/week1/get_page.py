@@ -1,6 +1,6 @@
-import requests
+from http_client import get_client
 
-r = requests.get('https://spiegel.de')
+r = get_client().get('https://spiegel.de')
                  
 print(r.status_code)
 print(r.headers)
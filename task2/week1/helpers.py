@@ -1,16 +1,29 @@
-from whoosh.index import create_in, open_dir
+from whoosh.index import create_in, open_dir, exists_in, EmptyIndexError, IndexVersionError
 from whoosh.fields import Schema, TEXT, ID
-from whoosh.qparser import QueryParser, MultifieldParser
+from whoosh.qparser import QueryParser, MultifieldParser, QueryParserError
 from whoosh.analysis import StemmingAnalyzer, SimpleAnalyzer
-from whoosh import highlight
-from flask import Flask, request, render_template
+from whoosh import highlight, scoring, sorting
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context
 import re
+import json
 import shutil
 import os
-import requests
-from bs4 import BeautifulSoup
 import traceback
+import time
+import threading
+import hashlib
+import heapq
+import itertools
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil, log
 from urllib.parse import urlparse
+from content_store import ContentStore
+from http_client import HttpClient, get_client
+from extractors import get_extractor
+
+STATS_FILE = "build_stats.json"
 
 
 class WhooshHelper:
@@ -21,36 +34,117 @@ class WhooshHelper:
         store_content (bool): Store full page contents in memory or load on the fly.
         schema (Schema): Schema defining the structure of the index.
         index (whoosh.index.Index): Whoosh index instance.
+        readonly (bool): Whether the index is only opened for searching.
+        term_offsets (bool): Whether character offsets of the `content` terms are stored in the index.
+        parser (QueryParser): Query parser shared by all searches.
+        cache (ResultCache): Cache of rendered search results, or None if disabled.
+        content_store (ContentStore): Local page text for highlighting when content is not
+            stored in the index, or None.
+        http (HttpClient): Pooled HTTP client used to fetch pages missing from the content store.
+        main_content (bool): Whether the index holds only the main content of pages, which is
+            then also all that is extracted from fetched pages.
     """
-    def __init__(self, index_dir: str = "indexdir", store_content: bool = True):
+    def __init__(self, index_dir: str = "indexdir", store_content: bool = True, readonly: bool = False,
+                 cache_size: int = 512, cache_ttl: float = 300.0, term_offsets: bool = False,
+                 http_client: HttpClient = None, main_content: bool = None):
         """Initializes the WhooshHelper with an index directory and configuration.
 
         Args:
             index_dir (str, optional): Directory where the Whoosh index is stored. Defaults to "indexdir".
             store_content (bool, optional): Whether to store full content in the index. Defaults to True.
+                Ignored in read-only mode, where the setting of the existing index is used.
+            readonly (bool, optional): Open an existing index for searching only, without ever creating
+                or resetting it. Defaults to False.
+            cache_size (int, optional): Maximum number of cached result pages, 0 to disable. Defaults to 512.
+            cache_ttl (float, optional): Seconds a cached result page stays valid. Defaults to 300.0.
+            term_offsets (bool, optional): Store term positions and character offsets for `content`, so
+                highlights are built from the match locations without re-tokenizing the page. Defaults
+                to False. Ignored in read-only mode, where the setting of the existing index is used.
+            http_client (HttpClient, optional): Client to fetch page content with. Defaults to the
+                shared client from `get_client`.
+            main_content (bool, optional): Whether the index holds only the main content of pages.
+                Defaults to None, which takes the setting from the index's build statistics. Without
+                one, a new index holds the main content, like the crawler's default, and an index
+                that already has documents holds whole pages, as it predates the setting.
         """
         self.index_dir = index_dir
         self.store_content = store_content
+        self.readonly = readonly
+        self.term_offsets = term_offsets
         self.schema = Schema(
-            url=ID(stored=True),
+            url=ID(stored=True, unique=True, sortable=True),
             title=TEXT(stored=True, analyzer=SimpleAnalyzer()),
-            content=TEXT(stored=store_content, analyzer=SimpleAnalyzer()),
+            content=TEXT(stored=store_content, analyzer=SimpleAnalyzer(), chars=term_offsets),
         )
+        self._index_lock = threading.Lock()
+        self._searchers = SearcherPool()
         self.index = self._get_or_create_index()
+        self.content_store = self._open_content_store()
+        self._main_content = main_content
+        self.main_content = self._read_main_content()
+        self.parser = QueryParser("content", self.schema)
+        self.cache = ResultCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.http = http_client if http_client is not None else get_client()
 
     def _get_or_create_index(self):
-        """Creates or opens the Whoosh index, resetting if schema mismatch is detected."""
-        if os.path.exists(self.index_dir):
+        """Creates or opens the Whoosh index, resetting if schema mismatch is detected.
+
+        Only an index directory of its own is reset. An index reached through a
+        symlink, like one published by `publish_index`, may be served right now,
+        so it is never deleted; build a new one with `build_index.py --rebuild`.
+
+        Raises:
+            FileNotFoundError: In read-only mode, if there is no index to open.
+            ValueError: If an index reached through a symlink does not match the schema or cannot be read.
+        """
+        if self.readonly:
+            if not os.path.exists(self.index_dir):
+                raise FileNotFoundError(f"No index at {self.index_dir}, run build_index.py first.")
+            self._index_path = os.path.realpath(self.index_dir)
+            ix = open_dir(self._index_path)
+            self.schema = ix.schema
+            self.store_content = "content" in ix.schema and ix.schema["content"].stored
+            self.term_offsets = "content" in ix.schema and ix.schema["content"].supports("characters")
+            return ix
+
+        path = self._index_path = os.path.realpath(self.index_dir)
+        if os.path.exists(path):
             try:
-                ix = open_dir(self.index_dir)
+                ix = open_dir(path)
                 self._check_schema(ix)
                 return ix
-            except Exception as e:
+            except (ValueError, EmptyIndexError, IndexVersionError) as e:
+                if path != os.path.abspath(self.index_dir):
+                    raise ValueError(f"Cannot reset {self.index_dir}, it links to the build at {path}: {e}. "
+                                     f"Build a new index with build_index.py --rebuild.") from e
                 print(f"Schema mismatch or corrupted index: {e}")
                 print("Resetting the index directory...")
-                shutil.rmtree(self.index_dir)
-        os.mkdir(self.index_dir)
-        return create_in(self.index_dir, self.schema)
+                shutil.rmtree(path)
+        os.mkdir(path)
+        return create_in(path, self.schema)
+
+    def _open_content_store(self):
+        """Opens the content store kept inside the index directory.
+
+        Returns:
+            ContentStore: The store, or None if content is stored in the index itself or a
+                read-only index was built without one.
+        """
+        if self.store_content:
+            return None
+        path = os.path.join(self._index_path, "content.sqlite")
+        if self.readonly and not os.path.exists(path):
+            return None
+        return ContentStore(path, readonly=self.readonly)
+
+    def _read_main_content(self) -> bool:
+        """Returns the main-content setting given to the constructor, or else the one the index was built with."""
+        if self._main_content is not None:
+            return self._main_content
+        stats = read_build_stats(self._index_path)
+        if stats is not None and "main_content" in stats:
+            return bool(stats["main_content"])
+        return self.index.doc_count() == 0
 
     def _check_schema(self, index):
         """Checks whether the existing index schema matches the current configuration.
@@ -62,16 +156,22 @@ class WhooshHelper:
             ValueError: If the schema does not match the current configuration.
         """
         existing_schema = index.schema
+        if "url" not in existing_schema or not existing_schema["url"].unique:
+            raise ValueError("Schema mismatch: 'url' field is not a unique key.")
+        if existing_schema["url"].column_type is None:
+            raise ValueError("Schema mismatch: 'url' field is not sortable.")
         if "content" in existing_schema:
             if existing_schema["content"].stored != self.schema["content"].stored:
                 raise ValueError("Schema mismatch: 'content' field storage differs.")
+            if existing_schema["content"].supports("characters") != self.term_offsets:
+                raise ValueError("Schema mismatch: 'content' field term offsets differ.")
         else:
             if self.store_content:
                 raise ValueError("Schema mismatch: 'content' field missing in existing schema.")
             
             
     def add_document(self, url: str, title: str, content: str) -> None:
-        """Adds a document to the Whoosh index.
+        """Adds a document to the Whoosh index, replacing any document with the same URL.
 
         Args:
             url (str): URL of the document.
@@ -82,12 +182,49 @@ class WhooshHelper:
             None
         """
         writer = self.index.writer()
-        if self.store_content:
-            writer.add_document(url=url, title=title, content=content)
-        else:
-            writer.add_document(url=url, title=title, content=content)
+        writer.update_document(url=url, title=title, content=content)
+        if self.content_store is not None:
+            self.content_store.put(url, content)
+            self.content_store.commit()
         writer.commit()
 
+    def batch_writer(self, batch_size: int = 500, commit_interval: float = 10.0, procs: int = 1,
+                     on_commit=None) -> "BatchWriter":
+        """Creates a batch writer for bulk ingestion into the index.
+
+        Args:
+            batch_size (int, optional): Commit after this many documents. Defaults to 500.
+            commit_interval (float, optional): Commit after this many seconds. Defaults to 10.0.
+            procs (int, optional): Number of indexing processes per writer. Defaults to 1.
+            on_commit (callable, optional): Called without arguments after every successful commit. Defaults to None.
+
+        Returns:
+            BatchWriter: A writer to be used as a context manager.
+        """
+        return BatchWriter(self.index, batch_size=batch_size, commit_interval=commit_interval, procs=procs,
+                           on_commit=on_commit, content_store=self.content_store)
+
+    def doc_count(self) -> int:
+        """Returns the number of documents in the index."""
+        return self.index.doc_count()
+
+    def add_documents(self, documents, **kwargs) -> int:
+        """Adds a stream of documents to the index, committing in batches.
+
+        Args:
+            documents (iterable): Iterable of `(url, title, content)` tuples.
+            **kwargs: Batching options passed on to `batch_writer`.
+
+        Returns:
+            int: The number of documents added.
+        """
+        count = 0
+        with self.batch_writer(**kwargs) as writer:
+            for url, title, content in documents:
+                writer.add_document(url=url, title=title, content=content)
+                count += 1
+        return count
+
     def fetch_page_content(self, url: str) -> str:
         """Fetches the content of a page by its URL.
 
@@ -98,67 +235,194 @@ class WhooshHelper:
             str: The cleaned text content of the page.
         """
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            # Remove unwanted tags and get text
-            for tag in soup(['script', 'style']):
-                tag.decompose()
-            return soup.get_text(strip=True)
+            response = self.http.fetch_html(url)
+            encoding = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else None
+            # Extracted with the main-content setting the index was built with, so the text matches what was indexed
+            return get_extractor(main_content=self.main_content).extract(response.content, url, encoding).text
         except Exception as e:
             print(f"Failed to fetch content for {url}: {e}")
             return ""
         
 
-    def search(self, query_str: str) -> list:
+    def acquire_searcher(self):
+        """Takes an up-to-date searcher from the pool, for the calling thread's use only.
+
+        A read-only index that has been swapped for a new build by
+        `publish_index` is reopened first. Give the searcher back with
+        `release_searcher` once its results are no longer needed.
+
+        Returns:
+            whoosh.searching.Searcher: A searcher of the current index generation.
+        """
+        if self.readonly:
+            with self._index_lock:
+                if os.path.realpath(self.index_dir) != self._index_path:
+                    self.index = self._get_or_create_index()
+                    self.content_store = self._open_content_store()
+                    self.main_content = self._read_main_content()
+        return self._searchers.acquire(self.index)
+
+    def release_searcher(self, searcher) -> None:
+        """Gives a searcher taken with `acquire_searcher` back to the pool.
+
+        Args:
+            searcher (whoosh.searching.Searcher): The searcher, which must not be used afterwards.
+
+        Returns:
+            None
+        """
+        self._searchers.release(searcher)
+
+    def close(self) -> None:
+        """Closes the idle searchers. Searchers still in use are closed when they are released.
+
+        Returns:
+            None
+        """
+        self._searchers.close()
+
+    def search_results(self, query_str: str, page: int = 1, pagelen: int = 10):
+        """Runs a search and returns its summary and a lazy iterator over the hits.
+
+        Only the top `page * pagelen` documents are scored, and hits are
+        collapsed on `url`, so each page appears at most once. Each hit is
+        highlighted only when the iterator reaches it, so a caller streaming the
+        hits can send the first one before later highlights are built; with term
+        offsets in the index they are cut straight from the stored match
+        locations. Fully consumed result pages are cached per normalized query
+        and page until the index generation changes or the cache entry expires.
+        The searcher goes back to the pool once the iterator is exhausted,
+        closed or garbage collected.
+
+        Args:
+            query_str (str): The search query string.
+            page (int, optional): The page of results to return, starting at 1. Defaults to 1.
+            pagelen (int, optional): Number of results per page. Defaults to 10.
+
+        Returns:
+            tuple: A dictionary with the query, page, page length, page count and total number of
+                hits, and an iterator of dictionaries containing URLs, titles, and descriptions. A
+                page past the last one has no hits.
+
+        Raises:
+            QueryParserError: If the query string is malformed.
+        """
+        searcher = self.acquire_searcher()
+        try:
+            generation = (self._index_path, searcher.ixreader.generation())
+            key = (" ".join(query_str.split()), page, pagelen)
+            if self.cache is not None:
+                cached = self.cache.get(key, generation)
+                if cached is not None:
+                    self.release_searcher(searcher)
+                    info, found = cached
+                    return dict(info), iter(found)
+
+            #parser = MultifieldParser(["title", "content"], self.schema)
+            query = _parse_query(self.parser, query_str)
+
+            results_page = searcher.search_page(query, page, pagelen=pagelen, terms=self.term_offsets,
+                                                collapse=sorting.FieldFacet("url"))
+            self._configure_highlights(results_page.results)
+        except BaseException:
+            self.release_searcher(searcher)
+            raise
+
+        info = {
+            "query": query_str,
+            "page": page,
+            "pagelen": pagelen,
+            "pagecount": results_page.pagecount,
+            "total": results_page.total,
+        }
+        # `search_page` turns a page past the end into the last page; that page has no hits
+        page_hits = results_page if page <= results_page.pagecount else ()
+
+        def hits():
+            try:
+                found = []
+                for result in page_hits:
+                    hit = self._render_hit(result)
+                    found.append(hit)
+                    yield hit
+                if self.cache is not None:
+                    self.cache.put(key, generation, (info, found))
+            finally:
+                release()
+
+        iterator = hits()
+        # Also releases the searcher if the iterator is dropped before it was started
+        release = weakref.finalize(iterator, self.release_searcher, searcher)
+        return dict(info), iterator
+
+    def search(self, query_str: str, page: int = 1, pagelen: int = 10) -> list:
         """Searches the Whoosh index for the given query string.
 
         Args:
             query_str (str): The search query string.
+            page (int, optional): The page of results to return, starting at 1. Defaults to 1.
+            pagelen (int, optional): Number of results per page. Defaults to 10.
 
         Returns:
             list: A list of dictionaries containing URLs, titles, and relevant descriptions.
         """
-        with self.index.searcher() as searcher:
-            #parser = MultifieldParser(["title", "content"], self.schema)
-            parser = QueryParser("content", self.schema)
-            query = parser.parse(query_str)
-            
-            results = searcher.search(query)
+        _, hits = self.search_results(query_str, page, pagelen)
+        return list(hits)
+
 
-            # Configure highlighter
+    def _configure_highlights(self, results) -> None:
+        """Sets the fragmenter and formatter used to highlight a set of results.
+
+        Args:
+            results (whoosh.searching.Results): The results to configure.
+
+        Returns:
+            None
+        """
+        if self.term_offsets:
+            results.fragmenter = highlight.PinpointFragmenter(maxchars=300, surround=40, autotrim=True)
+        else:
             results.fragmenter = highlight.ContextFragmenter(surround=40)
-            results.formatter = highlight.HtmlFormatter(tagname="b")
-
-            unique_results = {}
-            for result in results:
-                #url = urlparse(result["url"]).path # use relative path
-                url = result["url"]
-                if url not in unique_results:
-                    if self.store_content:
-                        # Use stored content for highlighting
-                        highlight_result = result.highlights("content")
-                    else:
-                        # Dynamically fetch content for highlighting
-                        content = self.fetch_page_content(url)
-                        if content:
-                            # Use dynamically fetched content to highlight
-                            highlight_result = results.highlighter.highlight_hit(result, "content", text=content)
-                        else:
-                            highlight_result = "No description available."
-                            
-                    # Clean up highlight formatting for better display
-                    if highlight_result:
-                        highlight_result = re.sub(r'<b class="match term\d+">', '<b>', highlight_result)
-                        highlight_result = highlight_result.replace('</b>', '</b>')
-
-                    unique_results[url] = {
-                        "url": url,
-                        "title": result["title"],
-                        "description": highlight_result or "No description available."
-                    }
-            return list(unique_results.values())
+        results.formatter = highlight.HtmlFormatter(tagname="b")
+
+    def _render_hit(self, result) -> dict:
+        """Builds the URL, title and highlighted description of a search hit.
+
+        Args:
+            result (whoosh.searching.Hit): The hit to render.
+
+        Returns:
+            dict: The URL, title and description of the hit.
+        """
+        url = result["url"]
+        #url = urlparse(result["url"]).path # use relative path
+        if self.store_content:
+            # Use stored content for highlighting
+            highlight_result = result.highlights("content")
+        else:
+            # Read the page text from the local content store, or fetch it as a fallback
+            content = self.content_store.get(url) if self.content_store is not None else None
+            highlighter = result.results.highlighter
+            if content is None:
+                content = self.fetch_page_content(url)
+                # The stored offsets do not match freshly fetched text
+                highlighter = highlight.Highlighter(fragmenter=highlight.ContextFragmenter(surround=40),
+                                                    formatter=result.results.formatter, always_retokenize=True)
+            if content:
+                # Use dynamically fetched content to highlight
+                highlight_result = highlighter.highlight_hit(result, "content", text=content)
+            else:
+                highlight_result = "No description available."
 
+        # Clean up highlight formatting for better display
+        if highlight_result:
+            highlight_result = re.sub(r'<b class="match term\d+">', '<b>', highlight_result)
+
+        return {
+            "url": url,
+            "title": result["title"],
+            "description": highlight_result or "No description available."
+        }
 
     def extract_description(self, content: str, query: str, max_length: int = 200) -> str:
         """Extracts a meaningful description from the content around the query.
@@ -189,22 +453,952 @@ class WhooshHelper:
 
 
 
+def read_build_stats(index_dir: str):
+    """Returns the statistics recorded by the build of an index.
+
+    Args:
+        index_dir (str): The index directory.
+
+    Returns:
+        dict: The statistics, or None if the index has none.
+    """
+    try:
+        with open(os.path.join(index_dir, STATS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_build_stats(index_dir: str, **stats) -> None:
+    """Records statistics of the build of an index, keeping the ones recorded before.
+
+    Args:
+        index_dir (str): The index directory.
+        **stats: The statistics, e.g. `main_content`, which `WhooshHelper` uses when fetching pages.
+
+    Returns:
+        None
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, STATS_FILE)
+    stats = {**(read_build_stats(index_dir) or {}), **stats}
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, path)
+
+
+def shard_path(index_dir: str, shard: int) -> str:
+    """Returns the directory of one index shard."""
+    return os.path.join(index_dir, f"shard-{shard}")
+
+
+SHARDS_FILE = "shards.json"
+
+
+def shard_of(url: str, num_shards: int, by_host: bool = False) -> int:
+    """Returns the shard that stores a URL, by a stable hash of the URL or of its host.
+
+    This is the only routing function, used both by the sharded index and by
+    the distributed crawl, whose workers each own the hosts of one shard.
+
+    Args:
+        url (str): The URL of the document.
+        num_shards (int): Number of shards.
+        by_host (bool, optional): Hash only the host, so all pages of a host are in one shard.
+            Defaults to False.
+
+    Returns:
+        int: The shard number, between 0 and `num_shards - 1`.
+    """
+    key = url.split("://", 1)[-1].split("/", 1)[0].lower() if by_host else url
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+def read_shard_layout(index_dir: str):
+    """Reads how the documents of a sharded index are routed to its shards.
+
+    Args:
+        index_dir (str): The index directory.
+
+    Returns:
+        dict: `{"shards": int, "by_host": bool}`, or None if the index has no layout file.
+    """
+    try:
+        with open(os.path.join(index_dir, SHARDS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_shard_layout(index_dir: str, num_shards: int, by_host: bool) -> None:
+    """Records how the documents of a sharded index are routed, so every later writer routes the same way.
+
+    Args:
+        index_dir (str): The index directory.
+        num_shards (int): Number of shards.
+        by_host (bool): Whether documents are routed by the hash of their host instead of their URL.
+
+    Returns:
+        None
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, SHARDS_FILE)
+    # Written through a temporary file, as several crawl workers may write it at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"shards": num_shards, "by_host": by_host}, f)
+    os.replace(tmp_path, path)
+
+
+def _parse_query(parser: QueryParser, query_str: str):
+    """Parses a query string, failing on syntax errors instead of dropping the broken part.
+
+    Whoosh does not raise for most malformed queries; it replaces the part it
+    could not parse with a query that carries an `error` attribute.
+
+    Raises:
+        QueryParserError: If any part of the query could not be parsed.
+    """
+    query = parser.parse(query_str)
+    stack = [query]
+    while stack:
+        node = stack.pop()
+        error = getattr(node, "error", None)
+        if error:
+            raise QueryParserError(error)
+        stack.extend(node.children())
+    return query
+
+
+def _tag_hits(shard: "WhooshHelper", results):
+    """Pairs every hit of a shard's results with that shard, which renders it."""
+    return ((shard, hit) for hit in results)
+
+
+class _GlobalStatsScorer(scoring.BM25FScorer):
+    """BM25F scorer with a given IDF and average field length instead of the searcher's own."""
+
+    def __init__(self, searcher, fieldname, text, B, K1, idf, avgfl, qf=1):
+        self.idf = idf
+        self.avgfl = avgfl
+        self.B = B
+        self.K1 = K1
+        self.qf = qf
+        self.setup(searcher, fieldname, text)
+
+
+class _GlobalBM25F(scoring.BM25F):
+    """BM25F scored with statistics summed over all shards.
+
+    Each shard only knows its own document frequencies and field lengths, so
+    the same document would score differently depending on its shard. With
+    the statistics of the whole index, the scores of all shards are on one
+    scale and can be merged. Terms without global statistics (e.g. expanded
+    from a wildcard) fall back to the shard's own.
+    """
+
+    def __init__(self, doc_count: int, field_lengths: dict, doc_frequencies: dict):
+        super().__init__()
+        self.doc_count = doc_count
+        self.field_lengths = field_lengths
+        self.doc_frequencies = doc_frequencies
+
+    @classmethod
+    def from_searchers(cls, searchers: list, terms) -> "_GlobalBM25F":
+        """Sums the statistics of the given `(fieldname, text)` terms over the shards' searchers."""
+        schema = searchers[0].schema
+        terms = {(fieldname, schema[fieldname].to_bytes(text)) for fieldname, text in terms
+                 if fieldname in schema and schema[fieldname].scorable}
+        return cls(
+            sum(searcher.doc_count_all() for searcher in searchers),
+            {fieldname: sum(searcher.field_length(fieldname) for searcher in searchers)
+             for fieldname, _ in terms},
+            {term: sum(searcher.doc_frequency(*term) for searcher in searchers) for term in terms},
+        )
+
+    def scorer(self, searcher, fieldname, text, qf=1):
+        n = self.doc_frequencies.get((fieldname, text))
+        if n is None:
+            return super().scorer(searcher, fieldname, text, qf=qf)
+        idf = log(self.doc_count / (n + 1)) + 1
+        avgfl = self.field_lengths[fieldname] / (self.doc_count or 1) or 1
+        return _GlobalStatsScorer(searcher, fieldname, text, self._field_B.get(fieldname, self.B), self.K1,
+                                  idf, avgfl, qf=qf)
+
+
+class ShardedWhooshHelper:
+    """Whoosh index split into shards, used like a single `WhooshHelper`.
+
+    Every shard is a complete index of its own in `<index_dir>/shard-<i>`,
+    with its own write lock and content store. A document is stored in the
+    shard picked by `shard_of`, from a hash of its URL, so a page is always
+    updated in the same shard and the shards grow evenly. Shards written by
+    `distributed_crawl.py` are routed by host instead; the routing is kept in
+    `<index_dir>/shards.json`, so later writers follow it. Batches are committed to all shards in
+    parallel, and a search runs on all shards at once in a thread pool; the
+    top hits of the shards are then merged by score. The shards score with
+    the document frequencies and field lengths of the whole index, so a
+    document gets the same score as it would in a single index.
+
+    Attributes:
+        index_dir (str): Directory holding the shards.
+        shards (list): The `WhooshHelper` of every shard.
+        readonly (bool): Whether the index is only opened for searching.
+        store_content (bool): Whether full page contents are stored in the index.
+        term_offsets (bool): Whether character offsets of the `content` terms are stored in the index.
+        by_host (bool): Whether documents are routed to the shards by their host instead of their URL.
+        parser (QueryParser): Query parser shared by all searches.
+        cache (ResultCache): Cache of rendered, merged search results, or None if disabled.
+    """
+
+    def __init__(self, index_dir: str = "indexdir", num_shards: int = None, store_content: bool = True,
+                 readonly: bool = False, cache_size: int = 512, cache_ttl: float = 300.0,
+                 term_offsets: bool = False, http_client: HttpClient = None, by_host: bool = None,
+                 main_content: bool = None):
+        """Opens or creates the shards.
+
+        Args:
+            index_dir (str, optional): Directory holding the shards. Defaults to "indexdir".
+            num_shards (int, optional): Number of shards. Defaults to None, which opens the shards
+                already in `index_dir`. Ignored in read-only mode.
+            store_content (bool, optional): Whether to store full content in the index. Defaults to True.
+            readonly (bool, optional): Open an existing index for searching only. Defaults to False.
+            cache_size (int, optional): Maximum number of cached result pages, 0 to disable. Defaults to 512.
+            cache_ttl (float, optional): Seconds a cached result page stays valid. Defaults to 300.0.
+            term_offsets (bool, optional): Store term positions and character offsets for `content`.
+                Defaults to False.
+            http_client (HttpClient, optional): Client to fetch page content with. Defaults to the
+                shared client from `get_client`.
+            by_host (bool, optional): Route documents by the hash of their host instead of their URL.
+                Defaults to None, which uses the routing of the existing index, or URLs for a new one.
+            main_content (bool, optional): Whether the index holds only the main content of pages.
+                Defaults to None, which takes the setting from the build statistics in `index_dir`,
+                or else decides as `WhooshHelper` does for all shards together.
+
+        Raises:
+            FileNotFoundError: In read-only mode, if there is no sharded index to open.
+            ValueError: If the number of shards is missing for a new index, the number of shards or
+                the routing differs from the existing index, or `index_dir` holds an unsharded index.
+        """
+        existing = self.count_shards(index_dir)
+        if readonly:
+            if not existing:
+                raise FileNotFoundError(f"No sharded index at {index_dir}, run build_index.py first.")
+            num_shards = existing
+        elif num_shards is None:
+            if not existing:
+                raise ValueError(f"No sharded index at {index_dir}, the number of shards is required.")
+            num_shards = existing
+        elif existing and existing != num_shards:
+            # Documents would be routed to other shards than the ones holding their old versions.
+            raise ValueError(f"{index_dir} has {existing} shards, not {num_shards}; rebuild to change it.")
+        elif os.path.isdir(index_dir) and exists_in(index_dir):
+            raise ValueError(f"{index_dir} holds an unsharded index; rebuild to shard it.")
+        else:
+            os.makedirs(index_dir, exist_ok=True)
+
+        layout = read_shard_layout(index_dir)
+        existing_by_host = layout["by_host"] if layout is not None else False
+        if by_host is None or readonly:
+            by_host = existing_by_host
+        elif existing and by_host != existing_by_host:
+            raise ValueError(f"{index_dir} is sharded by {'host' if existing_by_host else 'URL'}; "
+                             f"rebuild to change it.")
+        if not readonly and layout is None:
+            write_shard_layout(index_dir, num_shards, by_host)
+
+        self.index_dir = index_dir
+        self.readonly = readonly
+        self.by_host = by_host
+        if main_content is None:
+            stats = read_build_stats(index_dir)
+            if stats is not None and "main_content" in stats:
+                main_content = bool(stats["main_content"])
+        # Results are cached after merging, so the shards do not cache their own.
+        # The build statistics are kept next to the shards, not in them.
+        self.shards = [
+            WhooshHelper(shard_path(index_dir, i), store_content=store_content, readonly=readonly,
+                         cache_size=0, term_offsets=term_offsets, http_client=http_client,
+                         main_content=main_content)
+            for i in range(num_shards)
+        ]
+        if main_content is None:
+            main_content = sum(shard.doc_count() for shard in self.shards) == 0
+            for shard in self.shards:
+                shard.main_content = shard._main_content = main_content
+        self.store_content = self.shards[0].store_content
+        self.term_offsets = self.shards[0].term_offsets
+        self.parser = QueryParser("content", self.shards[0].schema)
+        self.cache = ResultCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._pool = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="shard-search")
+
+    @staticmethod
+    def count_shards(index_dir: str) -> int:
+        """Returns the number of shards in an index directory, 0 if it is not a sharded index.
+
+        Args:
+            index_dir (str): The index directory.
+
+        Returns:
+            int: The number of shards.
+        """
+        count = 0
+        while os.path.isdir(shard_path(index_dir, count)):
+            count += 1
+        return count
+
+    def doc_count(self) -> int:
+        """Returns the number of documents in all shards."""
+        return sum(shard.doc_count() for shard in self.shards)
+
+    def add_document(self, url: str, title: str, content: str) -> None:
+        """Adds a document to its shard, replacing any document with the same URL.
+
+        Args:
+            url (str): URL of the document.
+            title (str): Title of the document.
+            content (str): Full content of the document.
+
+        Returns:
+            None
+        """
+        self.shards[shard_of(url, len(self.shards), self.by_host)].add_document(url, title, content)
+
+    def batch_writer(self, batch_size: int = 500, commit_interval: float = 10.0, procs: int = 1,
+                     on_commit=None) -> "ShardedBatchWriter":
+        """Creates a batch writer that routes documents to the shards and commits them in parallel.
+
+        Args:
+            batch_size (int, optional): Commit after this many documents in all shards. Defaults to 500.
+            commit_interval (float, optional): Commit after this many seconds. Defaults to 10.0.
+            procs (int, optional): Number of indexing processes per shard writer. Defaults to 1.
+            on_commit (callable, optional): Called without arguments after every commit of all shards.
+                Defaults to None.
+
+        Returns:
+            ShardedBatchWriter: A writer to be used as a context manager.
+        """
+        # The shard writers only commit when the sharded writer tells them to.
+        writers = [
+            shard.batch_writer(batch_size=float("inf"), commit_interval=float("inf"), procs=procs)
+            for shard in self.shards
+        ]
+        return ShardedBatchWriter(writers, batch_size=batch_size, commit_interval=commit_interval,
+                                  on_commit=on_commit, by_host=self.by_host)
+
+    def add_documents(self, documents, **kwargs) -> int:
+        """Adds a stream of documents to the shards, committing in batches.
+
+        Args:
+            documents (iterable): Iterable of `(url, title, content)` tuples.
+            **kwargs: Batching options passed on to `batch_writer`.
+
+        Returns:
+            int: The number of documents added.
+        """
+        count = 0
+        with self.batch_writer(**kwargs) as writer:
+            for url, title, content in documents:
+                writer.add_document(url=url, title=title, content=content)
+                count += 1
+        return count
+
+    def search_results(self, query_str: str, page: int = 1, pagelen: int = 10):
+        """Searches all shards in parallel and returns the merged summary and a lazy iterator over the hits.
+
+        Each shard scores only its own top `page * pagelen` documents, using the
+        term statistics of all shards. The shards' hits come back sorted by
+        score, so a k-way merge of them gives
+        the overall ranking without sorting everything. The searches run on
+        searchers taken from the shards' pools, which the pool threads only use
+        while the caller waits for them; hits are highlighted on the calling
+        thread as the iterator reaches them, and the searchers go back to their
+        pools once the iterator is exhausted, closed or garbage collected.
+        Results are cached as in `WhooshHelper.search_results`.
+
+        Args:
+            query_str (str): The search query string.
+            page (int, optional): The page of results to return, starting at 1. Defaults to 1.
+            pagelen (int, optional): Number of results per page. Defaults to 10.
+
+        Returns:
+            tuple: A dictionary with the query, page, page length, page count and total number of
+                hits, and an iterator of dictionaries containing URLs, titles, and descriptions. A
+                page past the last one has no hits.
+
+        Raises:
+            QueryParserError: If the query string is malformed.
+        """
+        searchers = []
+        try:
+            for shard in self.shards:
+                searchers.append(shard.acquire_searcher())
+            generation = tuple((shard._index_path, searcher.ixreader.generation())
+                               for shard, searcher in zip(self.shards, searchers))
+            key = (" ".join(query_str.split()), page, pagelen)
+            if self.cache is not None:
+                cached = self.cache.get(key, generation)
+                if cached is not None:
+                    self._release_searchers(searchers)
+                    info, found = cached
+                    return dict(info), iter(found)
+
+            query = _parse_query(self.parser, query_str)
+            limit = page * pagelen
+            weighting = _GlobalBM25F.from_searchers(searchers, query.all_terms())
+
+            def search_shard(shard, searcher):
+                collector = searcher.collector(limit=limit, terms=shard.term_offsets,
+                                               collapse=sorting.FieldFacet("url"))
+                searcher.search_with_collector(query, collector, context=searcher.context(weighting=weighting))
+                results = collector.results()
+                shard._configure_highlights(results)
+                return results
+
+            shard_results = list(self._pool.map(search_shard, self.shards, searchers))
+        except BaseException:
+            self._release_searchers(searchers)
+            raise
+
+        # A page past the end has no hits, as in `WhooshHelper.search_results`
+        total = sum(len(results) for results in shard_results)
+        pagecount = ceil(total / pagelen)
+        offset = (page - 1) * pagelen
+        merged = heapq.merge(*(_tag_hits(shard, results) for shard, results in zip(self.shards, shard_results)),
+                             key=lambda entry: entry[1].score, reverse=True)
+        top = list(itertools.islice(merged, offset, offset + pagelen))
+
+        info = {
+            "query": query_str,
+            "page": page,
+            "pagelen": pagelen,
+            "pagecount": pagecount,
+            "total": total,
+        }
+
+        def hits():
+            try:
+                found = []
+                for shard, result in top:
+                    hit = shard._render_hit(result)
+                    found.append(hit)
+                    yield hit
+                if self.cache is not None:
+                    self.cache.put(key, generation, (info, found))
+            finally:
+                release()
+
+        iterator = hits()
+        release = weakref.finalize(iterator, self._release_searchers, searchers)
+        return dict(info), iterator
+
+    def _release_searchers(self, searchers: list) -> None:
+        """Gives the searchers of a search back to their shards' pools."""
+        for shard, searcher in zip(self.shards, searchers):
+            shard.release_searcher(searcher)
+
+    def close(self) -> None:
+        """Closes the idle searchers of all shards and stops the search threads.
+
+        Returns:
+            None
+        """
+        for shard in self.shards:
+            shard.close()
+        self._pool.shutdown()
+
+    def search(self, query_str: str, page: int = 1, pagelen: int = 10) -> list:
+        """Searches all shards for the given query string.
+
+        Args:
+            query_str (str): The search query string.
+            page (int, optional): The page of results to return, starting at 1. Defaults to 1.
+            pagelen (int, optional): Number of results per page. Defaults to 10.
+
+        Returns:
+            list: A list of dictionaries containing URLs, titles, and relevant descriptions.
+        """
+        _, hits = self.search_results(query_str, page, pagelen)
+        return list(hits)
+
+
+def publish_index(build_dir: str, index_dir: str, keep: int = 2) -> None:
+    """Atomically makes a freshly built index the live one.
+
+    `index_dir` becomes a symlink to `build_dir`, replaced in a single
+    `os.replace`, so a reader opening `index_dir` sees either the old or the new
+    index, never a half-written one. The previous builds are kept (up to `keep`
+    in total) so that searchers still holding them open are not broken.
+
+    Args:
+        build_dir (str): Directory containing the new index, next to `index_dir`.
+        index_dir (str): Path under which the index is served.
+        keep (int, optional): Number of builds to keep, including the new one. Defaults to 2.
+
+    Returns:
+        None
+    """
+    index_dir = os.path.abspath(index_dir)
+    build_dir = os.path.abspath(build_dir)
+    if os.path.isdir(index_dir) and not os.path.islink(index_dir):
+        # An index built in place by an older version: move it aside once.
+        os.rename(index_dir, f"{index_dir}.{time.strftime('%Y%m%d%H%M%S', time.localtime(0))}")
+
+    tmp_link = index_dir + ".tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(build_dir, os.path.dirname(index_dir)), tmp_link)
+    os.replace(tmp_link, index_dir)
+
+    parent = os.path.dirname(index_dir)
+    prefix = os.path.basename(index_dir) + "."
+    builds = sorted(
+        name for name in os.listdir(parent)
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    )
+    for name in builds[:-keep]:
+        if os.path.join(parent, name) != build_dir:
+            shutil.rmtree(os.path.join(parent, name))
+
+
+class SearcherPool:
+    """Thread-safe pool of Whoosh searchers, reused across searches.
+
+    A searcher is used by one thread at a time, from `acquire` until
+    `release`, since a refresh closes resources the old searcher still uses.
+    Released searchers are kept for the next search, up to `size` of them;
+    the rest are closed. A kept searcher is refreshed when it is taken again
+    and the index has changed, and closed if it belongs to an index that has
+    been replaced, e.g. by a newly published build.
+
+    Attributes:
+        size (int): Maximum number of idle searchers kept open.
+    """
+
+    def __init__(self, size: int = 8):
+        """Initializes an empty pool.
+
+        Args:
+            size (int, optional): Maximum number of idle searchers kept open. Defaults to 8.
+        """
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle = []
+        self._index = None
+        self._owners = {}
+
+    def __len__(self) -> int:
+        """Returns the number of idle searchers."""
+        with self._lock:
+            return len(self._idle)
+
+    def acquire(self, index):
+        """Takes an up-to-date searcher of an index, opening one if none is idle.
+
+        Args:
+            index (whoosh.index.Index): The current index.
+
+        Returns:
+            whoosh.searching.Searcher: The searcher.
+        """
+        stale = []
+        searcher = None
+        with self._lock:
+            if index is not self._index:
+                self._index = index
+                stale, self._idle = self._idle, []
+            elif self._idle:
+                searcher = self._idle.pop()
+        for old in stale:
+            old.close()
+        if searcher is None:
+            searcher = index.searcher()
+        elif not searcher.up_to_date():
+            searcher = searcher.refresh()
+        with self._lock:
+            self._owners[searcher] = index
+        return searcher
+
+    def release(self, searcher) -> None:
+        """Gives a searcher back, closing it if the pool is full or its index was replaced.
+
+        Args:
+            searcher (whoosh.searching.Searcher): A searcher taken with `acquire`.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            index = self._owners.pop(searcher, None)
+            if index is self._index and len(self._idle) < self.size:
+                self._idle.append(searcher)
+                return
+        searcher.close()
+
+    def close(self) -> None:
+        """Closes the idle searchers.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for searcher in idle:
+            searcher.close()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of search results with a time-to-live.
+
+    Entries belong to one index generation. As soon as a lookup or insert comes
+    in with a different generation (after a commit or an index swap), the whole
+    cache is dropped, so stale results are never served.
+
+    Attributes:
+        max_size (int): Maximum number of cached entries.
+        ttl (float): Seconds an entry stays valid.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that were not.
+        generation: Index generation the cached entries belong to.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300.0):
+        """Initializes an empty cache.
+
+        Args:
+            max_size (int, optional): Maximum number of cached entries. Defaults to 512.
+            ttl (float, optional): Seconds an entry stays valid. Defaults to 300.0.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation) -> None:
+        """Drops all entries if the index generation changed. Call with the lock held."""
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+
+    def get(self, key, generation):
+        """Looks up an entry.
+
+        Args:
+            key: The cache key.
+            generation: The current index generation.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generation, value) -> None:
+        """Stores an entry, evicting the least recently used one if the cache is full.
+
+        Args:
+            key: The cache key.
+            generation: The index generation the value was computed from.
+            value: The value to cache.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drops all entries.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, hit rate and current number of entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+
+class BatchWriter:
+    """Buffers documents and commits them to a Whoosh index in batches.
+
+    A single commit per batch replaces the per-document segment, lock and fsync
+    of `WhooshHelper.add_document`. Use it as a context manager: pending
+    documents are committed on exit, also when an exception is raised, so the
+    documents added before the error are not lost. If that commit fails too,
+    the batch is discarded and the original exception is raised.
+
+    Documents are keyed on their URL: each one replaces any indexed document
+    with the same URL, and adding a URL twice within a batch keeps only the
+    last version, so the index holds exactly one document per URL.
+
+    Attributes:
+        index (whoosh.index.Index): Whoosh index to write to.
+        batch_size (int): Commit after this many documents.
+        commit_interval (float): Commit after this many seconds since the last commit.
+        procs (int): Number of indexing processes per writer.
+        on_commit (callable): Called without arguments after every successful commit.
+        content_store (ContentStore): Store that receives the page text with each batch, or None.
+        pending (int): Number of documents added since the last commit.
+    """
+
+    def __init__(self, index, batch_size: int = 500, commit_interval: float = 10.0, procs: int = 1,
+                 on_commit=None, content_store: ContentStore = None):
+        """Initializes the BatchWriter.
+
+        Args:
+            index (whoosh.index.Index): Whoosh index to write to.
+            batch_size (int, optional): Commit after this many documents. Defaults to 500.
+            commit_interval (float, optional): Commit after this many seconds. Defaults to 10.0.
+            procs (int, optional): Number of indexing processes per writer. Defaults to 1.
+            on_commit (callable, optional): Called without arguments after every successful commit. Defaults to None.
+            content_store (ContentStore, optional): Store that receives the page text. Defaults to None.
+        """
+        self.index = index
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.procs = procs
+        self.on_commit = on_commit
+        self.content_store = content_store
+        self._docs = OrderedDict()
+        self._last_commit = time.monotonic()
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+            return
+        try:
+            self.commit()
+        except Exception:
+            self.cancel()
+
+    @property
+    def pending(self) -> int:
+        """Number of documents added since the last commit."""
+        return len(self._docs)
+
+    def add_document(self, url: str, title: str, content: str) -> None:
+        """Adds a document to the current batch, committing if the batch is full.
+
+        Any document already in the index with the same URL is replaced.
+
+        Args:
+            url (str): URL of the document.
+            title (str): Title of the document.
+            content (str): Full content of the document.
+
+        Returns:
+            None
+        """
+        self._docs.pop(url, None)
+        self._docs[url] = (title, content)
+        if self.pending >= self.batch_size or time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self) -> None:
+        """Commits the current batch, if any.
+
+        Returns:
+            None
+        """
+        if self._docs:
+            if self.procs > 1:
+                writer = self.index.writer(procs=self.procs, multisegment=True)
+            else:
+                writer = self.index.writer()
+            try:
+                for url, (title, content) in self._docs.items():
+                    writer.update_document(url=url, title=title, content=content)
+                    if self.content_store is not None:
+                        self.content_store.put(url, content)
+            except BaseException:
+                writer.cancel()
+                if self.content_store is not None:
+                    self.content_store.rollback()
+                raise
+            if self.content_store is not None:
+                self.content_store.commit()
+            writer.commit()
+            self._docs.clear()
+        self._last_commit = time.monotonic()
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def cancel(self) -> None:
+        """Discards the current batch, if any.
+
+        Returns:
+            None
+        """
+        self._docs.clear()
+
+
+class ShardedBatchWriter:
+    """Routes documents to the batch writers of the shards and commits all shards together.
+
+    Used like `BatchWriter`: a batch is committed once it holds `batch_size`
+    documents over all shards or `commit_interval` seconds have passed, and
+    `on_commit` is called once every shard has committed. The shards are
+    committed in parallel threads; each one takes only its own write lock.
+
+    Attributes:
+        writers (list): The `BatchWriter` of every shard, in shard order.
+        batch_size (int): Commit after this many documents.
+        commit_interval (float): Commit after this many seconds since the last commit.
+        on_commit (callable): Called without arguments after every successful commit.
+        by_host (bool): Whether documents are routed by the hash of their host instead of their URL.
+        pending (int): Number of documents added since the last commit.
+    """
+
+    def __init__(self, writers: list, batch_size: int = 500, commit_interval: float = 10.0, on_commit=None,
+                 by_host: bool = False):
+        """Initializes the ShardedBatchWriter.
+
+        Args:
+            writers (list): The `BatchWriter` of every shard. They should not commit on their own.
+            batch_size (int, optional): Commit after this many documents. Defaults to 500.
+            commit_interval (float, optional): Commit after this many seconds. Defaults to 10.0.
+            on_commit (callable, optional): Called without arguments after every successful commit. Defaults to None.
+            by_host (bool, optional): Route documents by the hash of their host, see `shard_of`.
+                Defaults to False.
+        """
+        self.writers = writers
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.on_commit = on_commit
+        self.by_host = by_host
+        self._pool = ThreadPoolExecutor(max_workers=len(writers), thread_name_prefix="shard-commit")
+        self._last_commit = time.monotonic()
+
+    def __enter__(self) -> "ShardedBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.commit()
+                return
+            try:
+                self.commit()
+            except Exception:
+                self.cancel()
+        finally:
+            self._pool.shutdown()
+
+    @property
+    def pending(self) -> int:
+        """Number of documents added since the last commit."""
+        return sum(writer.pending for writer in self.writers)
+
+    def add_document(self, url: str, title: str, content: str) -> None:
+        """Adds a document to the batch of its shard, committing if the batch is full.
+
+        Args:
+            url (str): URL of the document.
+            title (str): Title of the document.
+            content (str): Full content of the document.
+
+        Returns:
+            None
+        """
+        self.writers[shard_of(url, len(self.writers), self.by_host)].add_document(url, title, content)
+        if self.pending >= self.batch_size or time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self) -> None:
+        """Commits the current batch of every shard in parallel.
+
+        If a shard fails to commit, the other shards still finish their commits
+        before the error is raised, and `on_commit` is not called.
+
+        Returns:
+            None
+        """
+        futures = [self._pool.submit(writer.commit) for writer in self.writers if writer.pending]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        self._last_commit = time.monotonic()
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def cancel(self) -> None:
+        """Discards the current batch of every shard.
+
+        Returns:
+            None
+        """
+        for writer in self.writers:
+            writer.cancel()
+
+
+def _positive_int_arg(name: str, default: int):
+    """Reads a request argument that must be a positive integer.
+
+    Returns:
+        int: The argument, `default` if it is missing, or None if it is not a positive integer.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return default
+    if not (value.isascii() and value.isdigit()) or int(value) < 1:
+        return None
+    return int(value)
+
+
 class FlaskAppHelper:
     """Helper class for managing the Flask app.
 
     Attributes:
         app (Flask): Flask application instance.
-        whoosh_helper (WhooshHelper): Instance of the WhooshHelper for managing the index.
+        whoosh_helper (WhooshHelper): Instance of the WhooshHelper (or ShardedWhooshHelper) for managing the index.
+        max_pagelen (int): Largest page length accepted by the JSON API.
     """
 
-    def __init__(self, whoosh_helper: WhooshHelper):
+    def __init__(self, whoosh_helper: WhooshHelper, max_pagelen: int = 100):
         """Initializes the FlaskAppHelper with a WhooshHelper instance.
 
         Args:
-            whoosh_helper (WhooshHelper): Instance of the WhooshHelper for managing the index.
+            whoosh_helper (WhooshHelper): Instance of the WhooshHelper (or ShardedWhooshHelper) for managing the index.
+            max_pagelen (int, optional): Largest page length accepted by the JSON API. Defaults to 100.
         """
         self.app = Flask(__name__)
         self.whoosh_helper = whoosh_helper
+        self.max_pagelen = max_pagelen
 
         @self.app.route("/")
         def home():
@@ -223,9 +1417,55 @@ class FlaskAppHelper:
                 str: HTML content of the search results page.
             """
             query = request.args.get("q", "")
-            results = self.whoosh_helper.search(query)
+            page = max(request.args.get("page", 1, type=int), 1)
+            try:
+                results = self.whoosh_helper.search(query, page=page)
+            except QueryParserError as error:
+                return render_template("results.html", results=[], error=str(error)), 400
             return render_template("results.html", results=results)
-        
+
+        @self.app.route("/api/search")
+        def api_search():
+            """Streams a page of search results as newline-delimited JSON.
+
+            Query parameters are `q`, `page` (starting at 1) and `pagelen`. The
+            first line describes the result page (query, page, pagelen,
+            pagecount, total); every following line is one hit with its url,
+            title and description, sent as soon as its highlight is ready. A
+            page past the last one has no hit lines.
+
+            Returns:
+                Response: An `application/x-ndjson` streaming response, or a JSON error with
+                    status 400 for a bad `page` or `pagelen` or a malformed query.
+            """
+            query = request.args.get("q", "")
+            page = _positive_int_arg("page", 1)
+            pagelen = _positive_int_arg("pagelen", 10)
+            if page is None or pagelen is None or pagelen > self.max_pagelen:
+                return jsonify(error=f"page must be a positive integer and pagelen an integer "
+                                     f"between 1 and {self.max_pagelen}"), 400
+            try:
+                info, hits = self.whoosh_helper.search_results(query, page=page, pagelen=pagelen)
+            except QueryParserError as error:
+                return jsonify(error=f"malformed query: {error}"), 400
+
+            def generate():
+                yield json.dumps(info) + "\n"
+                for hit in hits:
+                    yield json.dumps(hit) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        @self.app.route("/stats")
+        def stats():
+            """Reports the search result cache counters.
+
+            Returns:
+                Response: JSON object with the cache counters.
+            """
+            cache = self.whoosh_helper.cache
+            return jsonify(cache.stats() if cache is not None else {})
+
         @self.app.errorhandler(500)
         def internal_error(exception):
             return "<pre>"+traceback.format_exc()+"</pre>"
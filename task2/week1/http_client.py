@@ -0,0 +1,205 @@
+"""Shared HTTP client for the crawlers and the snippet fetcher.
+
+Every fetch in task2 goes through an `HttpClient`, which keeps one
+`requests.Session` with per-host connection pools, so connections (and their
+TLS handshakes) are reused across requests instead of being set up again for
+every page. HTML pages are fetched with `fetch_html`, which streams the body
+and gives up on anything that is not an HTML page of a sensible size before
+downloading it.
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # urllib3 only decodes brotli responses when a brotli package is installed
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+USER_AGENT = "web_ai-crawler/1.0"
+RETRY_STATUSES = (500, 502, 504)
+# Throttling responses are never retried here; the crawler's scheduler slows the host down instead
+THROTTLE_STATUSES = (429, 503)
+MAX_PAGE_SIZE = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class PageSkipped(Exception):
+    """Raised by `HttpClient.fetch_html` when a response is not downloaded.
+
+    The message says why: a bad status, a non-HTML content type, or a body
+    larger than the page size limit.
+
+    Attributes:
+        status_code (int): HTTP status of the skipped response.
+    """
+
+    def __init__(self, reason: str, status_code: int):
+        super().__init__(reason)
+        self.status_code = status_code
+
+
+class _Retry(Retry):
+    """urllib3 retry policy that never retries throttling responses and caps `Retry-After` at `backoff_max`.
+
+    urllib3 retries a 429 or 503 with a `Retry-After` header even if its status
+    is not in `status_forcelist`, and sleeps as long as the header says.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if status_code in THROTTLE_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(super().parse_retry_after(retry_after), self.backoff_max)
+
+
+class HttpClient:
+    """Pooled, keep-alive HTTP client with timeouts and bounded retries.
+
+    Connection errors and the statuses in `RETRY_STATUSES` are retried with
+    exponential backoff, honouring `Retry-After` up to `backoff_max` seconds.
+    Throttling responses (`THROTTLE_STATUSES`) are returned at once, so that a
+    fetch worker does not sleep through them and the crawler's scheduler can
+    slow the host down. Once the retries are used up, the last response is
+    returned rather than raised, so callers handle the status themselves. The
+    client is safe to share between fetch threads.
+
+    Attributes:
+        timeout (tuple): Default `(connect, read)` timeout in seconds.
+        max_page_size (int): Default limit of `fetch_html` on the size of a page body in bytes.
+        session (requests.Session): The underlying session.
+    """
+
+    def __init__(self, timeout=(5.0, 30.0), retries: int = 3, backoff_factor: float = 0.5,
+                 backoff_max: float = 30.0, pool_connections: int = 10, pool_maxsize: int = 16,
+                 user_agent: str = USER_AGENT, max_page_size: int = MAX_PAGE_SIZE):
+        """Creates the session and mounts pooled adapters for HTTP and HTTPS.
+
+        Args:
+            timeout (float or tuple, optional): Default connect and read timeout in seconds.
+                Defaults to (5.0, 30.0).
+            retries (int, optional): Maximum number of retries per request. Defaults to 3.
+            backoff_factor (float, optional): Base of the exponential backoff in seconds. Defaults to 0.5.
+            backoff_max (float, optional): Upper bound of a single backoff sleep, also for a
+                `Retry-After` header. Defaults to 30.0.
+            pool_connections (int, optional): Number of hosts to keep connection pools for. Defaults to 10.
+            pool_maxsize (int, optional): Maximum number of kept-alive connections per host.
+                Should be at least the number of fetch workers. Defaults to 16.
+            user_agent (str, optional): Value of the User-Agent header. Defaults to USER_AGENT.
+            max_page_size (int, optional): Largest page body `fetch_html` downloads, in bytes.
+                Defaults to MAX_PAGE_SIZE.
+        """
+        self.timeout = timeout
+        self.max_page_size = max_page_size
+        retry = _Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, backoff_max=backoff_max,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=frozenset({"GET", "HEAD"}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"User-Agent": user_agent, "Accept-Encoding": ACCEPT_ENCODING})
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Sends a GET request through the pooled session.
+
+        Args:
+            url (str): The URL to fetch.
+            **kwargs: Passed on to `requests.Session.get`; `timeout` defaults to the client's.
+
+        Returns:
+            requests.Response: The response.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails after all retries.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def fetch_html(self, url: str, headers: dict = None, max_bytes: int = None) -> requests.Response:
+        """Downloads an HTML page, checking status, type and size before reading the body.
+
+        The response is streamed: once the headers are in, anything but a 200
+        HTML response is rejected without transferring the body, as is a
+        declared `Content-Length` above the limit. The body is then read in
+        chunks and the download is aborted as soon as it exceeds the limit,
+        which also covers responses without a `Content-Length`. The limit
+        applies to the decoded body.
+
+        A 304 response to a conditional request is returned as is.
+
+        Args:
+            url (str): The URL to fetch.
+            headers (dict, optional): Extra request headers, e.g. for a conditional request. Defaults to None.
+            max_bytes (int, optional): Largest body to download. Defaults to `max_page_size`.
+
+        Returns:
+            requests.Response: The response, with its body already read.
+
+        Raises:
+            PageSkipped: If the page is not a 200 HTML response or is too large.
+            requests.exceptions.RequestException: If the request fails after all retries.
+        """
+        limit = max_bytes if max_bytes is not None else self.max_page_size
+        r = self.get(url, headers=headers, stream=True)
+        try:
+            if r.status_code == 304:
+                r.content  # a 304 has no body; reading it keeps the connection alive
+                return r
+            if r.status_code != 200:
+                raise PageSkipped(f"status {r.status_code}", r.status_code)
+            content_type = r.headers.get("Content-Type", "")
+            if "text/html" not in content_type:
+                raise PageSkipped(f"content type {content_type or 'missing'}", r.status_code)
+            length = r.headers.get("Content-Length")
+            if length is not None and length.isdigit() and int(length) > limit:
+                raise PageSkipped(f"{length} bytes exceeds the {limit} byte limit", r.status_code)
+
+            body = bytearray()
+            for chunk in r.iter_content(CHUNK_SIZE):
+                body += chunk
+                if len(body) > limit:
+                    raise PageSkipped(f"body exceeds the {limit} byte limit", r.status_code)
+            r._content = bytes(body)
+            return r
+        finally:
+            # Returns a fully read connection to the pool; an aborted download drops
+            # its connection rather than reading the rest of the body.
+            r.close()
+
+    def close(self) -> None:
+        """Closes all pooled connections.
+
+        Returns:
+            None
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Returns the process-wide default client, creating it on first use.
+
+    Returns:
+        HttpClient: The shared client.
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,253 @@
+"""Binary, memory-mapped snapshots of the `crawler.py` in-memory index.
+
+File layout (little-endian, every section aligned to 8 bytes):
+
+    header      magic, version, document count, term count, reserved, section offsets
+    doc table   (n_docs + 1) uint64 offsets into the URL blob, then the UTF-8 URLs
+    lengths     n_docs uint32 document lengths in words
+    lexicon     (n_terms + 1) uint64 offsets into the term blob, then the UTF-8
+                terms in sorted order
+    postings    (n_terms + 1) uint64 offsets into the postings blob, then the
+                posting lists as varint-coded doc ID gaps
+    frequencies (n_terms + 1) uint64 offsets into the frequency blob, then the
+                varint-coded term frequencies parallel to each posting list
+    run starts  (n_terms + 1) uint64 offsets into the run-start blob, then, per
+                term, the varint-coded gaps between the starts of its position runs
+    positions   (n_terms + 1) uint64 offsets into the position blob, then, per
+                term, one run of varint-coded position gaps per posting
+
+A snapshot is opened with `mmap`, and the offset tables are read in place, so
+a lookup only touches the pages of the terms and postings it needs.
+"""
+import mmap
+import os
+import struct
+from array import array
+from postings import encode_deltas, decode_deltas, encode_varints, decode_varints, intersect_all, filter_phrase
+from ranking import as_uint32, bm25_top_k
+
+MAGIC = b"CRWLIDX\0"
+VERSION = 3
+HEADER = struct.Struct("<8sIIIIQQQQQQQ")
+
+
+def _pad(f) -> None:
+    """Pads the file with zero bytes up to the next multiple of 8."""
+    f.write(b"\0" * (-f.tell() % 8))
+
+
+def _write_table(f, blobs) -> None:
+    """Writes an offset table followed by the concatenated blobs."""
+    offsets = array('Q', [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    f.write(offsets.tobytes())
+    for blob in blobs:
+        f.write(blob)
+    _pad(f)
+
+
+def write_snapshot(path: str, urls: list, index: dict, tfs: dict, doc_lengths,
+                   positions: dict, position_offsets: dict) -> None:
+    """Writes an index snapshot.
+
+    The file is written under a temporary name and renamed into place, so a
+    reader never sees a partial snapshot.
+
+    Args:
+        path (str): Path of the snapshot file.
+        urls (list): Document table mapping doc IDs to URLs.
+        index (dict): Inverted index mapping words to sorted posting lists.
+        tfs (dict): Term frequencies, parallel to the posting lists in `index`.
+        doc_lengths (array): `array('I')` of document lengths in words.
+        positions (dict): Varint-coded position runs per term, one run per posting.
+        position_offsets (dict): Start of each posting's run in `positions`.
+
+    Returns:
+        None
+    """
+    terms = sorted(index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        _pad(f)
+        docs_offset = f.tell()
+        _write_table(f, [url.encode("utf-8") for url in urls])
+        lengths_offset = f.tell()
+        f.write(array('I', doc_lengths).tobytes())
+        _pad(f)
+        terms_offset = f.tell()
+        _write_table(f, [term.encode("utf-8") for term in terms])
+        postings_offset = f.tell()
+        _write_table(f, [encode_deltas(index[term]) for term in terms])
+        tfs_offset = f.tell()
+        _write_table(f, [encode_varints(tfs[term]) for term in terms])
+        runs_offset = f.tell()
+        _write_table(f, [encode_deltas(position_offsets[term]) for term in terms])
+        positions_offset = f.tell()
+        _write_table(f, [positions[term] for term in terms])
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(urls), len(terms), 0,
+                            docs_offset, lengths_offset, terms_offset, postings_offset, tfs_offset,
+                            runs_offset, positions_offset))
+    os.replace(tmp_path, path)
+
+
+class IndexSnapshot:
+    """Read-only view of an index snapshot, with the same searches as `Crawler`.
+
+    Attributes:
+        path (str): Path of the snapshot file.
+        num_docs (int): Number of documents in the snapshot.
+        num_terms (int): Number of distinct terms in the snapshot.
+    """
+
+    def __init__(self, path: str):
+        """Opens and memory-maps a snapshot.
+
+        Args:
+            path (str): Path of the snapshot file.
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.num_docs, self.num_terms, _,
+         docs_offset, lengths_offset, terms_offset, postings_offset, tfs_offset,
+         runs_offset, positions_offset) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {VERSION} index snapshot")
+        self._view = memoryview(self._mm)
+        self._docs = self._table(docs_offset, self.num_docs)
+        self._doc_lengths = self._view[lengths_offset:lengths_offset + 4 * self.num_docs].cast('I')
+        self._terms = self._table(terms_offset, self.num_terms)
+        self._postings = self._table(postings_offset, self.num_terms)
+        self._tfs = self._table(tfs_offset, self.num_terms)
+        self._runs = self._table(runs_offset, self.num_terms)
+        self._positions = self._table(positions_offset, self.num_terms)
+
+    def _table(self, offset: int, count: int):
+        """Returns an offset table as a zero-copy uint64 view and the start of its blob."""
+        end = offset + 8 * (count + 1)
+        return self._view[offset:end].cast('Q'), end
+
+    def _blob(self, table, i: int):
+        """Returns the i-th blob of a table as a zero-copy view."""
+        offsets, start = table
+        return self._view[start + offsets[i]:start + offsets[i + 1]]
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def url(self, doc_id: int) -> str:
+        """Returns the URL of a document.
+
+        Args:
+            doc_id (int): The doc ID.
+
+        Returns:
+            str: The URL of the document.
+        """
+        return str(self._blob(self._docs, doc_id), "utf-8")
+
+    def _find_term(self, word: str) -> int:
+        """Binary-searches the sorted lexicon for a word.
+
+        Returns:
+            int: The term number, or -1 if the word is not in the lexicon.
+        """
+        key = word.encode("utf-8")
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            term = bytes(self._blob(self._terms, mid))
+            if term < key:
+                lo = mid + 1
+            elif term > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def postings(self, word: str):
+        """Returns the posting list of a word.
+
+        Args:
+            word (str): The word to look up.
+
+        Returns:
+            array: Sorted doc IDs of the documents containing the word, or None if it is unknown.
+        """
+        term = self._find_term(word)
+        if term < 0:
+            return None
+        return decode_deltas(self._blob(self._postings, term))
+
+    def search_ranked(self, query: list, k: int = 10) -> list:
+        """Searches for a query and ranks the matching pages with BM25.
+
+        Args:
+            query (list): A list of words to search for.
+            k (int, optional): Maximum number of results. Defaults to 10.
+
+        Returns:
+            list: Up to k `(url, score)` tuples, best match first.
+        """
+        term_postings = []
+        for word in {word for element in query for word in element.lower().split()}:
+            term = self._find_term(word)
+            if term >= 0:
+                term_postings.append((as_uint32(decode_deltas(self._blob(self._postings, term))),
+                                      as_uint32(decode_varints(self._blob(self._tfs, term)))))
+        doc_ids, scores = bm25_top_k(term_postings, as_uint32(self._doc_lengths), k)
+        return [(self.url(doc_id), float(score)) for doc_id, score in zip(doc_ids, scores)]
+
+    def search(self, query: list, slop: int = 0) -> list:
+        """Searches for a query in the snapshot.
+
+        Elements of the query that contain several words are phrases, as in
+        `Crawler.search`.
+
+        Args:
+            query (list): A list of words and phrases to search for.
+            slop (int, optional): Number of other words allowed between the words of a phrase.
+                Defaults to 0 (exact phrases).
+
+        Returns:
+            list: The URLs that contain all the query words and phrases, in crawl order.
+        """
+        phrases = [element.lower().split() for element in query]
+        phrases = [phrase for phrase in phrases if phrase]
+        if not phrases:
+            return []
+        terms = {word: self._find_term(word) for phrase in phrases for word in phrase}
+        if any(term < 0 for term in terms.values()):
+            return []
+        posting_lists = {word: decode_deltas(self._blob(self._postings, term)) for word, term in terms.items()}
+        doc_ids = intersect_all(list(posting_lists.values()))
+        for phrase in phrases:
+            if len(phrase) > 1 and doc_ids:
+                doc_ids = filter_phrase(doc_ids, [(posting_lists[word],
+                                                   decode_deltas(self._blob(self._runs, terms[word])),
+                                                   self._blob(self._positions, terms[word]))
+                                                  for word in phrase], slop)
+        return [self.url(doc_id) for doc_id in doc_ids]
+
+    def close(self) -> None:
+        """Releases the memory map.
+
+        Returns:
+            None
+        """
+        self._docs[0].release()
+        self._doc_lengths.release()
+        self._terms[0].release()
+        self._postings[0].release()
+        self._tfs[0].release()
+        self._runs[0].release()
+        self._positions[0].release()
+        self._view.release()
+        self._mm.close()
@@ -0,0 +1,201 @@
+"""Posting-list helpers for the in-memory crawler index.
+
+Posting lists are sorted, duplicate-free `array('I')` sequences of document IDs. On disk
+they are stored as varint-coded gaps (see `index_snapshot.py`). Word positions are
+kept varint-coded in memory as well: one gap-coded run per posting.
+"""
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+
+def gallop(postings, target: int, lo: int = 0) -> int:
+    """Finds the first position at or after `lo` whose document ID is >= `target`.
+
+    Probes exponentially growing steps before a binary search, so skipping far
+    ahead in a long list costs O(log distance) rather than O(distance).
+
+    Args:
+        postings (array): Sorted document IDs.
+        target (int): The document ID to look for.
+        lo (int, optional): Position to start from. Defaults to 0.
+
+    Returns:
+        int: The position of `target`, or of the first larger ID, or `len(postings)`.
+    """
+    n = len(postings)
+    step = 1
+    hi = lo
+    while hi < n and postings[hi] < target:
+        lo = hi + 1
+        hi = lo + step
+        step <<= 1
+    return bisect_left(postings, target, lo, min(hi, n))
+
+
+def intersect(short, long) -> array:
+    """Intersects two sorted posting lists by galloping through the longer one.
+
+    Args:
+        short (array): The shorter posting list.
+        long (array): The longer posting list.
+
+    Returns:
+        array: The document IDs contained in both lists.
+    """
+    result = array('I')
+    j = 0
+    n = len(long)
+    for doc_id in short:
+        j = gallop(long, doc_id, j)
+        if j == n:
+            break
+        if long[j] == doc_id:
+            result.append(doc_id)
+    return result
+
+
+def intersect_all(posting_lists) -> array:
+    """Intersects several sorted posting lists, shortest first.
+
+    Args:
+        posting_lists (list): Posting lists to intersect.
+
+    Returns:
+        array: The document IDs contained in every list.
+    """
+    if not posting_lists:
+        return array('I')
+    ordered = sorted(posting_lists, key=len)
+    result = ordered[0]
+    for postings in ordered[1:]:
+        if not result:
+            break
+        result = intersect(result, postings)
+    return array('I', result)
+
+
+def encode_varints(values) -> bytes:
+    """Encodes non-negative integers in LEB128 form.
+
+    Seven bits are stored per byte, with the high bit set on all but the last
+    byte of each value.
+
+    Args:
+        values (iterable): Non-negative integers.
+
+    Returns:
+        bytes: The encoded sequence.
+    """
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data) -> array:
+    """Decodes a sequence written by `encode_varints`.
+
+    Args:
+        data (bytes): The encoded sequence (any bytes-like object).
+
+    Returns:
+        array: The decoded integers.
+    """
+    result = array('I')
+    value = 0
+    shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            result.append(value)
+            value = 0
+            shift = 0
+    return result
+
+
+def encode_deltas(values) -> bytes:
+    """Encodes a sorted sequence of integers as varint-coded gaps.
+
+    Args:
+        values (iterable): Sorted non-negative integers.
+
+    Returns:
+        bytes: The encoded sequence.
+    """
+    previous = 0
+    gaps = []
+    for value in values:
+        gaps.append(value - previous)
+        previous = value
+    return encode_varints(gaps)
+
+
+def decode_deltas(data) -> array:
+    """Decodes a sequence written by `encode_deltas`.
+
+    Args:
+        data (bytes): The encoded sequence (any bytes-like object).
+
+    Returns:
+        array: The decoded integers.
+    """
+    return array('I', accumulate(decode_varints(data)))
+
+
+def phrase_match(position_lists: list, slop: int = 0) -> bool:
+    """Checks whether words occur in order at nearby positions of one document.
+
+    Args:
+        position_lists (list): Sorted word positions, one list per phrase word in phrase order.
+        slop (int, optional): Number of other words allowed between consecutive phrase words.
+            Defaults to 0 (exact phrase).
+
+    Returns:
+        bool: True if some occurrence of the first word is followed by the others within `slop`.
+    """
+    for start in position_lists[0]:
+        current = start
+        for positions in position_lists[1:]:
+            # The earliest following occurrence leaves the most room for the rest
+            i = bisect_left(positions, current + 1)
+            if i == len(positions) or positions[i] - current - 1 > slop:
+                break
+            current = positions[i]
+        else:
+            return True
+    return False
+
+
+def filter_phrase(doc_ids, terms: list, slop: int = 0) -> array:
+    """Keeps the documents in which a phrase occurs.
+
+    Positions are stored per term as one blob of `encode_deltas` runs, one run
+    per posting, with `offsets` giving the start of each run. Only the runs of
+    the candidate documents are decoded.
+
+    Args:
+        doc_ids (array): Sorted candidate doc IDs, which contain every phrase word.
+        terms (list): One `(postings, offsets, positions)` triple per phrase word, in phrase order.
+        slop (int, optional): Number of other words allowed between consecutive phrase words.
+            Defaults to 0.
+
+    Returns:
+        array: The candidate doc IDs that contain the phrase.
+    """
+    result = array('I')
+    cursors = [0] * len(terms)
+    for doc_id in doc_ids:
+        position_lists = []
+        for t, (postings, offsets, positions) in enumerate(terms):
+            i = cursors[t] = gallop(postings, doc_id, cursors[t])
+            end = offsets[i + 1] if i + 1 < len(offsets) else len(positions)
+            position_lists.append(decode_deltas(positions[offsets[i]:end]))
+        if phrase_match(position_lists, slop):
+            result.append(doc_id)
+    return result
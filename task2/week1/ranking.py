@@ -0,0 +1,55 @@
+"""Vectorized BM25 ranking over the crawler's posting lists.
+
+Each term's posting list and its parallel term-frequency list are one column
+of a sparse doc-term matrix in compressed-column form, so a query is scored
+without materializing the matrix.
+"""
+import math
+import numpy as np
+
+
+def as_uint32(values) -> np.ndarray:
+    """Returns a zero-copy uint32 NumPy view of an `array('I')` or buffer."""
+    return np.frombuffer(values, dtype=np.uint32)
+
+
+def bm25_top_k(term_postings: list, doc_lengths, k: int = 10, k1: float = 1.2, b: float = 0.75):
+    """Scores documents for a query with BM25 and selects the top k.
+
+    The contributions of all query terms are concatenated and summed per
+    document with a single `np.bincount`, and the k best documents are picked
+    with `np.argpartition` before only those k are sorted.
+
+    Args:
+        term_postings (list): One `(doc_ids, tfs)` pair of uint32 arrays per query term.
+        doc_lengths (np.ndarray): Number of words of every document, indexed by doc ID.
+        k (int, optional): Number of documents to return. Defaults to 10.
+        k1 (float, optional): BM25 term-frequency saturation. Defaults to 1.2.
+        b (float, optional): BM25 length normalization. Defaults to 0.75.
+
+    Returns:
+        tuple: The doc IDs of the top k documents, best first, and their scores.
+    """
+    num_docs = len(doc_lengths)
+    if not term_postings or num_docs == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    lengths = doc_lengths.astype(np.float64)
+    norm = k1 * (1.0 - b + b * lengths / max(lengths.mean(), 1.0))
+
+    all_ids = []
+    all_weights = []
+    for doc_ids, tfs in term_postings:
+        df = len(doc_ids)
+        idf = math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+        tf = tfs.astype(np.float64)
+        all_ids.append(doc_ids)
+        all_weights.append(idf * tf * (k1 + 1.0) / (tf + norm[doc_ids]))
+
+    ids = np.concatenate(all_ids)
+    scores = np.bincount(ids, weights=np.concatenate(all_weights), minlength=num_docs)
+    candidates = np.flatnonzero(scores)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    top = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return top, scores[top]
@@ -0,0 +1,346 @@
+"""Per-host politeness for the concurrent crawler.
+
+`HostScheduler` keeps one queue per host and decides which URL may be fetched
+next: every host has a token bucket limiting its request rate and an in-flight
+limit that grows and shrinks AIMD-style with the observed response times and
+throttling responses. Hosts are served round-robin, so a slow or throttled host
+never holds up the others, and total throughput grows with the number of hosts.
+
+`RobotsCache` fetches, parses and caches each host's robots.txt.
+"""
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+from http_client import HttpClient, THROTTLE_STATUSES, USER_AGENT, get_client
+
+# Slowdowns smaller than this many seconds are jitter, not congestion
+MIN_SLOWDOWN = 0.05
+
+
+class RobotsCache:
+    """Cached robots.txt parsers, one per scheme and host.
+
+    A host's robots.txt is fetched the first time one of its URLs is checked,
+    and again once the cached copy is older than `ttl`. Only one thread fetches
+    a given robots.txt; other threads checking the same host wait for it.
+
+    As with `urllib.robotparser`, a 401 or 403 response disallows the whole
+    host and any other 4xx allows it. A robots.txt that cannot be fetched at
+    all (network error or 5xx) is treated as allowing everything rather than
+    dropping the host's URLs from the crawl.
+
+    Attributes:
+        user_agent (str): User agent the rules are matched against.
+        ttl (float): Seconds a fetched robots.txt stays valid.
+    """
+
+    def __init__(self, http_client: HttpClient = None, user_agent: str = USER_AGENT, ttl: float = 86400.0):
+        """Initializes an empty cache.
+
+        Args:
+            http_client (HttpClient, optional): Client to fetch robots.txt with. Defaults to the shared client.
+            user_agent (str, optional): User agent the rules are matched against. Defaults to USER_AGENT.
+            ttl (float, optional): Seconds a fetched robots.txt stays valid. Defaults to one day.
+        """
+        self.http = http_client if http_client is not None else get_client()
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self._parsers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, root: str) -> RobotFileParser:
+        """Downloads and parses the robots.txt of a site."""
+        parser = RobotFileParser(root + "/robots.txt")
+        try:
+            r = self.http.get(parser.url)
+            if r.status_code in (401, 403):
+                parser.disallow_all = True
+            elif r.status_code == 200:
+                parser.parse(r.text.splitlines())
+            else:
+                parser.allow_all = True
+        except Exception as e:
+            print(f"Could not fetch {parser.url}: {e}")
+            parser.allow_all = True
+        parser.modified()
+        return parser
+
+    def get(self, url: str) -> RobotFileParser:
+        """Returns the robots.txt parser for the site of a URL, fetching it if needed.
+
+        Args:
+            url (str): Any URL of the site.
+
+        Returns:
+            RobotFileParser: The parsed robots.txt.
+        """
+        parts = urlparse(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            parser = self._parsers.get(root)
+            if parser is not None and time.time() - parser.mtime() < self.ttl:
+                return parser
+            lock = self._locks.setdefault(root, threading.Lock())
+        with lock:
+            parser = self._parsers.get(root)
+            if parser is None or time.time() - parser.mtime() >= self.ttl:
+                parser = self._fetch(root)
+                with self._lock:
+                    self._parsers[root] = parser
+            return parser
+
+    def peek(self, url: str):
+        """Returns the cached parser for the site of a URL without fetching it.
+
+        Args:
+            url (str): Any URL of the site.
+
+        Returns:
+            RobotFileParser: The cached parser, or None if robots.txt has not been fetched yet.
+        """
+        parts = urlparse(url)
+        with self._lock:
+            return self._parsers.get(f"{parts.scheme}://{parts.netloc}")
+
+    def allowed(self, url: str) -> bool:
+        """Checks whether robots.txt allows fetching a URL.
+
+        Args:
+            url (str): The URL to check.
+
+        Returns:
+            bool: True if the URL may be fetched.
+        """
+        return self.get(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url: str):
+        """Returns the delay between requests that the site's robots.txt asks for.
+
+        Both `Crawl-delay` and `Request-rate` are taken into account. The cached
+        robots.txt is used; nothing is fetched.
+
+        Args:
+            url (str): Any URL of the site.
+
+        Returns:
+            float: Seconds between requests, or None if the site sets no delay or
+                its robots.txt has not been fetched yet.
+        """
+        parser = self.peek(url)
+        if parser is None:
+            return None
+        delays = []
+        delay = parser.crawl_delay(self.user_agent)
+        if delay is not None:
+            delays.append(float(delay))
+        rate = parser.request_rate(self.user_agent)
+        if rate is not None and rate.requests > 0:
+            delays.append(rate.seconds / rate.requests)
+        return max(delays) if delays else None
+
+
+class _Host:
+    """Queue, token bucket and AIMD state of a single host."""
+
+    def __init__(self, rate: float, burst: float):
+        self.queue = deque()
+        self.in_flight = 0
+        self.limit = 1.0
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled = time.monotonic()
+        self.latency = None
+        self.base_latency = None
+        self.last_decrease = 0.0
+        self.delay_checked = False
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def decrease(self, now: float, rate: bool) -> None:
+        # At most one decrease per round trip, so one burst of slow responses counts once
+        if now - self.last_decrease < (self.latency or 0.0):
+            return
+        self.last_decrease = now
+        self.limit = max(1.0, self.limit / 2)
+        if rate:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+
+
+class HostScheduler:
+    """Per-host queues with token-bucket rates and AIMD concurrency.
+
+    A host starts with one request in flight at a time. Every response that
+    arrives within `latency_factor` times the fastest average response time
+    seen from the host raises the limit additively (by about one per round
+    trip) up to `max_per_host`; a slower response halves it. A 429 or 503
+    response, or a failed request, also halves the host's request rate, which
+    then recovers step by step, and the throttled URL is queued again, up to
+    `max_requeues` times. A `Crawl-delay` or `Request-rate` in the host's
+    robots.txt caps its rate.
+
+    The scheduler is not thread-safe; the crawl loop owns it, and only the
+    robots cache is used from the fetch workers.
+
+    Attributes:
+        rate (float): Maximum requests per second per host.
+        burst (float): Number of requests a host may receive back to back.
+        max_per_host (int): Upper bound of the in-flight limit of a host.
+        latency_factor (float): Slowdown relative to the fastest responses that counts as congestion.
+        robots (RobotsCache): robots.txt cache, or None to ignore robots.txt.
+        max_requeues (int): Number of times a throttled URL is queued again before it is given up.
+    """
+
+    def __init__(self, rate: float = 4.0, burst: float = 4.0, max_per_host: int = 4,
+                 latency_factor: float = 2.0, robots: RobotsCache = None, max_requeues: int = 3):
+        """Initializes an empty scheduler.
+
+        Args:
+            rate (float, optional): Maximum requests per second per host. Defaults to 4.0.
+            burst (float, optional): Number of requests a host may receive back to back. Defaults to 4.0.
+            max_per_host (int, optional): Upper bound of the in-flight limit of a host. Defaults to 4.
+            latency_factor (float, optional): Slowdown relative to the fastest responses that counts
+                as congestion. Defaults to 2.0.
+            robots (RobotsCache, optional): robots.txt cache. Defaults to None (robots.txt is ignored).
+            max_requeues (int, optional): Number of times a throttled URL is queued again. Defaults to 3.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_per_host = max_per_host
+        self.latency_factor = latency_factor
+        self.robots = robots
+        self.max_requeues = max_requeues
+        self._requeues = {}
+        self._hosts = {}
+        self._active = deque()
+        self._pending = 0
+
+    def __len__(self) -> int:
+        """Returns the number of queued URLs."""
+        return self._pending
+
+    def _host(self, host: str) -> _Host:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(self.rate, self.burst)
+        return state
+
+    def push(self, url: str) -> None:
+        """Queues a URL behind the other URLs of its host.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            None
+        """
+        host = urlparse(url).netloc
+        state = self._host(host)
+        if not state.queue:
+            self._active.append(host)
+        state.queue.append(url)
+        self._pending += 1
+
+    def pop(self):
+        """Returns the next URL that may be fetched now, visiting hosts round-robin.
+
+        The URL's host is charged one token and one in-flight slot, which are
+        given back by `done`.
+
+        Returns:
+            str: The URL, or None if every host with queued URLs is at its rate or in-flight limit.
+        """
+        now = time.monotonic()
+        for _ in range(len(self._active)):
+            host = self._active[0]
+            self._active.rotate(-1)
+            state = self._hosts[host]
+            if state.in_flight >= int(state.limit):
+                continue
+            state.refill(now)
+            if state.tokens < 1.0:
+                continue
+            state.tokens -= 1.0
+            state.in_flight += 1
+            url = state.queue.popleft()
+            if not state.queue:
+                self._active.remove(host)
+            self._pending -= 1
+            return url
+        return None
+
+    def wait_time(self):
+        """Returns how long until `pop` can return a URL that is only held back by its host's rate.
+
+        Returns:
+            float: Seconds to wait, or None if no queued URL becomes available just by waiting.
+        """
+        now = time.monotonic()
+        waits = []
+        for host in self._active:
+            state = self._hosts[host]
+            if state.in_flight < int(state.limit):
+                state.refill(now)
+                waits.append(max(0.0, (1.0 - state.tokens) / state.rate))
+        return min(waits) if waits else None
+
+    def allowed(self, url: str) -> bool:
+        """Checks robots.txt for a URL, fetching it if needed. Safe to call from fetch workers.
+
+        Args:
+            url (str): The URL to check.
+
+        Returns:
+            bool: True if the URL may be fetched.
+        """
+        return self.robots is None or self.robots.allowed(url)
+
+    def done(self, url: str, latency=None, status=None) -> bool:
+        """Records the outcome of a fetch returned by `pop` and frees its slot.
+
+        Args:
+            url (str): The fetched URL.
+            latency (float, optional): Seconds the request took, or None if no request was
+                sent (e.g. disallowed by robots.txt). Defaults to None.
+            status (int, optional): HTTP status of the response, or None if the request
+                failed. Defaults to None.
+
+        Returns:
+            bool: True if the URL was throttled and queued again, so it is not done yet.
+        """
+        requeues = self._requeues.pop(url, 0)
+        state = self._host(urlparse(url).netloc)
+        state.in_flight -= 1
+        if not state.delay_checked and self.robots is not None:
+            delay = self.robots.crawl_delay(url)
+            if self.robots.peek(url) is not None:
+                state.delay_checked = True
+            if delay:
+                state.max_rate = state.rate = min(state.max_rate, 1.0 / delay)
+                state.burst = state.tokens = 1.0
+        if latency is None:
+            state.tokens = min(state.burst, state.tokens + 1.0)
+            return False
+
+        now = time.monotonic()
+        state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+        if status is None or status in THROTTLE_STATUSES:
+            state.decrease(now, rate=True)
+            if status is not None and requeues < self.max_requeues:
+                self._requeues[url] = requeues + 1
+                self.push(url)
+                return True
+            return False
+        state.base_latency = state.latency if state.base_latency is None else min(state.base_latency, state.latency)
+        if state.latency > self.latency_factor * state.base_latency + MIN_SLOWDOWN:
+            state.decrease(now, rate=False)
+        else:
+            state.limit = min(float(self.max_per_host), state.limit + 1.0 / state.limit)
+            state.rate = min(state.max_rate, state.rate + state.max_rate / 8)
+        return False
@@ -0,0 +1,45 @@
+import pytest
+from content_store import ContentStore
+
+TEXT = "The duck-billed platypus — caf\xe9 " * 50
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "content.sqlite")
+
+
+def test_round_trip_and_missing_page(path):
+    store = ContentStore(path)
+    store.put("http://a.org/1", TEXT)
+    store.commit()
+    assert store.get("http://a.org/1") == TEXT
+    assert store.get("http://a.org/missing") is None
+    store.close()
+
+
+def test_same_text_under_two_urls_and_replacement(path):
+    store = ContentStore(path)
+    store.put("http://a.org/1", TEXT)
+    store.put("http://a.org/2", TEXT)
+    store.put("http://a.org/1", "new text")
+    store.commit()
+    assert store.get("http://a.org/1") == "new text"
+    assert store.get("http://a.org/2") == TEXT
+    store.close()
+
+
+def test_only_committed_pages_survive_reopening(path):
+    store = ContentStore(path)
+    store.put("http://a.org/1", TEXT)
+    store.commit()
+    store.put("http://a.org/2", TEXT)
+    store.rollback()
+    store.put("http://a.org/3", TEXT)
+    store.close()
+
+    store = ContentStore(path, readonly=True)
+    assert store.get("http://a.org/1") == TEXT
+    assert store.get("http://a.org/2") is None
+    assert store.get("http://a.org/3") is None
+    store.close()
@@ -0,0 +1,92 @@
+import time
+import pytest
+from crawl_state import Frontier, SQLiteFrontier, VisitedSet
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def frontier(request, tmp_path):
+    if request.param == "memory":
+        yield Frontier()
+    else:
+        frontier = SQLiteFrontier(str(tmp_path / "state.sqlite"))
+        yield frontier
+        frontier.close()
+
+
+def drain(frontier) -> list:
+    urls = []
+    while len(frontier):
+        urls.append(frontier.pop())
+    return urls
+
+
+def test_urls_are_popped_best_first(frontier):
+    frontier.extend(["http://a/deep1", "http://a/deep2"], depth=3)
+    frontier.extend(["http://a/near1", "http://a/near2"], depth=1)
+    frontier.append("http://a/sitemap", depth=5, hint=0.8)
+    # Another in-link puts deep2 ahead of deep1
+    frontier.append("http://a/deep2", depth=4)
+    assert drain(frontier) == ["http://a/sitemap", "http://a/near1", "http://a/near2",
+                               "http://a/deep2", "http://a/deep1"]
+    with pytest.raises(IndexError):
+        frontier.pop()
+
+
+def test_queued_urls_are_not_added_twice(frontier):
+    frontier.extend(["http://a/1", "http://a/2", "http://a/1"])
+    assert len(frontier) == 2
+    frontier.append("http://a/2", depth=0, hint=0.5)
+    assert frontier.pop() == "http://a/2"
+    frontier.append("http://a/2")
+    assert len(frontier) == 1
+    assert frontier.depth("http://a/2") == 0
+
+
+def test_depth_keeps_the_shortest_path(frontier):
+    frontier.append("http://a/1", depth=4)
+    frontier.append("http://a/1", depth=2)
+    frontier.append("http://a/1", depth=3)
+    assert frontier.depth("http://a/1") == 2
+    assert frontier.depth("http://a/unknown") == 0
+
+
+def test_sqlite_frontier_restores_unfinished_urls(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    frontier = SQLiteFrontier(path)
+    frontier.extend(["http://a/1", "http://a/2", "http://a/3"])
+    done, crashed = frontier.pop(), frontier.pop()
+    frontier.task_done(done)
+    frontier.close()
+
+    frontier = SQLiteFrontier(path)
+    assert len(frontier) == 1
+    assert frontier.restore() == [crashed]
+    assert len(frontier) == 2
+    assert sorted(drain(frontier)) == sorted({"http://a/1", "http://a/2", "http://a/3"} - {done})
+    frontier.close()
+
+
+def test_sqlite_frontier_length_does_not_scan_the_table(tmp_path):
+    frontier = SQLiteFrontier(str(tmp_path / "state.sqlite"))
+    urls = [f"http://a/{i}" for i in range(20000)]
+    start = time.perf_counter()
+    frontier.extend(urls)
+    frontier.extend(urls[:100])
+    assert len(drain(frontier)) == len(urls)
+    assert not frontier
+    # Counting the queue on every pop takes over ten seconds for this many URLs
+    assert time.perf_counter() - start < 5
+    frontier.close()
+
+
+def test_visited_set(tmp_path):
+    visited = VisitedSet(str(tmp_path / "state.sqlite"), capacity=1000)
+    urls = [f"http://a/{i}" for i in range(500)]
+    for url in urls:
+        visited.add(url)
+    assert all(url in visited for url in urls)
+    assert len(visited) == 500
+    assert sum(f"http://b/{i}" in visited for i in range(500)) == 0
+    visited.discard(urls[0])
+    assert urls[0] not in visited
+    visited.close()
@@ -0,0 +1,93 @@
+import random
+import pytest
+from dedup import NearDuplicateDetector, canonicalize_url, canonicalize_urls, simhash
+
+WORDS = "platypus duck billed mammal water river australia venom egg fur swim burrow night food".split()
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM:80/a/b.html?utm_source=x&b=2&a=1#frag", "http://example.com/a/b.html?a=1&b=2"),
+    ("https://example.com", "https://example.com/"),
+    ("https://example.com:443/p?print=1", "https://example.com/p"),
+    ("https://example.com:8443/p;jsessionid=abc?sid=1&q=a%20b", "https://example.com:8443/p?q=a%20b"),
+    ("http://User:Pw@Example.com/x", "http://User:Pw@example.com/x"),
+    ("http://[::1]:8080/x", "http://[::1]:8080/x"),
+    ("http://[2001:DB8::1]/x", "http://[2001:db8::1]/x"),
+    ("http://[::1]:80/x", "http://[::1]/x"),
+    ("http://example.com:/x", "http://example.com/x"),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+@pytest.mark.parametrize("url", [
+    "HTTP://Example.COM:80/a/b.html?utm_source=x&b=2&a=1#frag",
+    "http://[::1]:8080/x?b=1&a=",
+    "https://u@example.com:8443/p;jsessionid=abc?q=a+b&q=c",
+    "http://example.com/%7Euser/?x=%2F",
+])
+def test_canonicalize_url_is_idempotent(url):
+    canonical = canonicalize_url(url)
+    assert canonicalize_url(canonical) == canonical
+
+
+@pytest.mark.parametrize("url", ["http://host:abc/", "http://[::1/x", "http://host:８０/"])
+def test_malformed_urls_raise_value_error(url):
+    with pytest.raises(ValueError):
+        canonicalize_url(url)
+
+
+def test_canonicalize_urls_skips_only_malformed_urls():
+    urls = ["http://a.org/1", "http://host:abc/", "http://A.org/2#x"]
+    assert canonicalize_urls(urls) == ["http://a.org/1", "http://a.org/2"]
+
+
+def text(seed: int, words: int = 400) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def test_simhash_is_close_for_near_identical_texts():
+    original = text(1)
+    assert simhash(original) == simhash(original)
+    assert (simhash(original) ^ simhash(original + " updated 2024")).bit_count() <= 3
+    assert (simhash(original) ^ simhash(text(2))).bit_count() > 10
+    assert simhash("") is None
+    assert simhash("  ,;  ") is None
+
+
+def test_detector_suppresses_near_duplicates():
+    detector = NearDuplicateDetector()
+    original = text(1)
+    assert detector.check("http://a.org/1", original) is None
+    assert detector.check("http://a.org/2", original + " page 2") == "http://a.org/1"
+    assert detector.check("http://a.org/3", text(2)) is None
+    # A page is never a duplicate of its own earlier version
+    assert detector.check("http://a.org/1", original + " edited") is None
+    assert detector.check("http://a.org/4", "") is None
+    assert detector.suppressed == 1
+    assert len(detector) == 2
+
+
+def test_detector_finds_every_fingerprint_within_the_distance():
+    detector = NearDuplicateDetector(max_distance=3)
+    rng = random.Random(0)
+    base = rng.getrandbits(64)
+    detector.add("base", base)
+    for _ in range(200):
+        flipped = base
+        for bit in rng.sample(range(64), 3):
+            flipped ^= 1 << bit
+        assert detector.find(flipped) == "base"
+    assert detector.find(base ^ 0b1111) is None
+
+
+def test_detector_discard():
+    detector = NearDuplicateDetector()
+    detector.add("a", 12345)
+    detector.add("a", 54321)
+    assert detector.find(12345) is None
+    assert detector.find(54321) == "a"
+    detector.discard("a")
+    detector.discard("a")
+    assert detector.find(54321) is None and len(detector) == 0
@@ -0,0 +1,186 @@
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import distributed_crawl
+from distributed_crawl import Coordinator, CoordinatorManager, PartitionedCrawler, main, run_worker, serve
+from helpers import WhooshHelper, shard_of, shard_path
+
+PAGES_PER_HOST = 4
+
+
+def test_crawl_ends_only_when_all_idle_and_nothing_in_transit():
+    coordinator = Coordinator(2)
+    coordinator.send(1, (["http://b.org/"], 1, 0.0))
+    assert not coordinator.idle(0)
+    assert coordinator.receive(1) == [(["http://b.org/"], 1, 0.0)]
+    assert not coordinator.idle(0)
+    coordinator.send(0, (["http://a.org/"], 1, 0.0))
+    assert not coordinator.idle(1)
+    assert coordinator.receive(0)
+    assert not coordinator.idle(1)
+    assert coordinator.idle(0)
+
+
+def test_silent_workers():
+    coordinator = Coordinator(3)
+    time.sleep(0.05)
+    coordinator.heartbeat(0)
+    coordinator.report(1, {})
+    assert coordinator.silent(0.02) == [2]
+    assert coordinator.silent(10.0) == []
+
+
+def test_serve_gives_up_on_dead_workers():
+    started = time.monotonic()
+    reports = serve(2, ("127.0.0.1", 0), b"key", timeout=0.3)
+    assert reports == {}
+    assert time.monotonic() - started < 5.0
+    assert distributed_crawl._coordinator.idle(0)
+
+
+def test_serve_aborts_the_crawl_for_the_live_workers(monkeypatch):
+    monkeypatch.setattr(distributed_crawl, "HEARTBEAT_INTERVAL", 0.05)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(serve(2, ("127.0.0.1", 0), b"key", timeout=0.5)))
+    monkeypatch.setattr(CoordinatorManager, "get_server", _recording_get_server(result))
+    thread.start()
+    while "address" not in result:
+        time.sleep(0.01)
+    manager = CoordinatorManager(address=result.pop("address"), authkey=b"key")
+    manager.connect()
+    stop = threading.Event()
+    threading.Thread(target=distributed_crawl._send_heartbeats, args=(manager, 0, stop), daemon=True).start()
+    coordinator = manager.coordinator()
+    # Worker 1 never shows up: worker 0 is told the crawl is over and reports
+    while not coordinator.idle(0):
+        time.sleep(0.05)
+    coordinator.report(0, {"documents": 1})
+    stop.set()
+    thread.join(timeout=5.0)
+    assert result == {0: {"documents": 1}}
+
+
+def _recording_get_server(result):
+    get_server = CoordinatorManager.get_server
+
+    def recording(self):
+        server = get_server(self)
+        result["address"] = server.address
+        return server
+    return recording
+
+
+def test_connect_requires_an_authkey(capsys):
+    with pytest.raises(SystemExit):
+        main(["--connect", "127.0.0.1:5050"])
+    assert "--authkey" in capsys.readouterr().err
+
+
+def test_serve_needs_an_authkey():
+    with pytest.raises(ValueError):
+        serve(1, ("127.0.0.1", 0), b"")
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Serves pages `/0` to `/PAGES_PER_HOST - 1` that link to the same pages on all `hosts`."""
+    hosts = []
+    endless = False
+
+    def do_GET(self):
+        name = self.path.strip("/")
+        if not name.isdigit() or (not self.endless and int(name) >= PAGES_PER_HOST):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.endless:
+            links = [f"/{int(name) + 1}"]
+        else:
+            links = [f"{host}/{(int(name) + 1) % PAGES_PER_HOST}" for host in self.hosts]
+        body = (f"<html><head><title>Page {name}</title></head><body><p>platypus page {name}</p>"
+                + "".join(f'<a href="{link}">next</a>' for link in links) + "</body></html>").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_site(handler):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+
+@pytest.fixture
+def site():
+    """Local hosts, started until every one of 3 workers owns at least one of them."""
+    servers = []
+    SiteHandler.hosts = []
+    while len({shard_of(host, 3, by_host=True) for host in SiteHandler.hosts}) < 3 or len(servers) < 4:
+        httpd, host = start_site(SiteHandler)
+        servers.append(httpd)
+        SiteHandler.hosts.append(host)
+    yield SiteHandler.hosts
+    for httpd in servers:
+        httpd.shutdown()
+
+
+def test_every_page_is_indexed_once_across_the_shards(site, tmp_path, monkeypatch):
+    num_workers = 3
+    index_dir = str(tmp_path / "shards")
+    result = {}
+    monkeypatch.setattr(CoordinatorManager, "get_server", _recording_get_server(result))
+    thread = threading.Thread(target=lambda: result.update(serve(num_workers, ("127.0.0.1", 0), b"key")))
+    thread.start()
+    while "address" not in result:
+        time.sleep(0.01)
+    address = result.pop("address")
+    kwargs = {"workers": 2, "respect_robots": False, "use_sitemaps": False, "rate_per_host": 100.0,
+              "skip_near_duplicates": False}
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=run_worker, args=(i, num_workers, address, b"key", site[0] + "/0",
+                                                    "http://127.0.0.1:", index_dir, None, kwargs))
+               for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+    thread.join(timeout=10)
+    assert [worker.exitcode for worker in workers] == [0] * num_workers
+
+    indexed = []
+    for i in range(num_workers):
+        shard = WhooshHelper(shard_path(index_dir, i), readonly=True, cache_size=0)
+        with shard.index.searcher() as searcher:
+            urls = [fields["url"] for fields in searcher.all_stored_fields()]
+        assert all(shard_of(url, num_workers, by_host=True) == i for url in urls)
+        indexed += urls
+    expected = [f"{host}/{page}" for host in site for page in range(PAGES_PER_HOST)]
+    assert sorted(indexed) == sorted(expected)
+    assert sum(report["documents"] for report in result.values()) == len(expected)
+
+
+def test_abort_stops_a_busy_worker(tmp_path):
+    class EndlessHandler(SiteHandler):
+        endless = True
+
+    httpd, host = start_site(EndlessHandler)
+    coordinator = Coordinator(1)
+    crawler = PartitionedCrawler(0, 1, coordinator, host + "/0", host + "/",
+                                 WhooshHelper(str(tmp_path / "shard"), cache_size=0),
+                                 respect_robots=False, use_sitemaps=False, rate_per_host=100.0)
+    thread = threading.Thread(target=crawler.crawl, daemon=True)
+    thread.start()
+    time.sleep(0.5)
+    coordinator.abort()
+    # Without the abort the crawl would follow the links forever
+    thread.join(timeout=5.0)
+    httpd.shutdown()
+    assert not thread.is_alive()
+    assert crawler.whoosh_helper.doc_count() > 0
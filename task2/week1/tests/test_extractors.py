@@ -0,0 +1,83 @@
+import pytest
+from extractors import EXTRACTORS, decode_html, extract_main_content, extract_page, get_extractor, lxml
+
+ARTICLE = ("The platypus is a semiaquatic, egg-laying mammal endemic to eastern Australia, "
+           "including Tasmania, and one of only five extant species of monotremes.")
+PAGE = f"""<html><head><title>Platypus</title><script>var x = 1;</script></head><body>
+<nav><a href="/">Home</a> <a href="/animals">Animals</a> <a href="/about">About</a></nav>
+<div class="links"><a href="/a">Echidna</a> | <a href="/b">Wombat</a> | <a href="/c">Koala</a> | <a href="/d">Emu</a></div>
+<h1>Platypus</h1>
+<p>{ARTICLE}</p>
+<footer>Copyright 2024 Example Zoo. All rights reserved.</footer>
+</body></html>""".encode()
+
+FAST_EXTRACTORS = [name for name in ("lxml", "htmlparser") if name != "lxml" or lxml is not None]
+
+
+def test_extract_main_content_keeps_content_and_its_heading():
+    blocks = [("Home Animals About", 18), ("Platypus", 0), (ARTICLE, 0),
+              ("Echidna | Wombat | Koala | Emu and more friends of the platypus here", 26),
+              ("Copyright 2024", 0)]
+    assert extract_main_content(blocks) == f"Platypus\n{ARTICLE}"
+
+
+def test_extract_main_content_drops_link_heavy_blocks():
+    links = " ".join(f"link{i}" for i in range(20))
+    assert extract_main_content([(links, len(links)), (ARTICLE, 0)]) == ARTICLE
+
+
+def test_short_pages_are_never_emptied():
+    blocks = [("Home", 4), ("Hello world", 0)]
+    assert extract_main_content(blocks) == "Home\nHello world"
+
+
+@pytest.mark.parametrize("name", FAST_EXTRACTORS)
+def test_main_content_extraction_drops_boilerplate(name):
+    page = EXTRACTORS[name](main_content=True).extract(PAGE, "http://zoo.org/platypus.html")
+    assert page.title == "Platypus"
+    assert ARTICLE in page.text
+    for boilerplate in ("Home", "Wombat", "Copyright", "var x"):
+        assert boilerplate not in page.text
+    # Links are still followed, whether or not their block is indexed
+    assert "http://zoo.org/b" in page.links
+
+    full = EXTRACTORS[name](main_content=False).extract(PAGE, "http://zoo.org/platypus.html")
+    assert "Wombat" in full.text and "Copyright" in full.text and ARTICLE in full.text
+
+
+SIMPLE = """<html><head><meta charset="iso-8859-1"><title> Caf\xe9  menu </title>
+<style>p { color: red }</style></head><body>
+<p>Fresh <b>croissants</b> every morning.</p><script>document.write("hidden")</script>
+<a href="drinks.html">Drinks</a> <a href="/about#team">About</a> <a href="http://other.org/x">Other</a>
+<a>No link</a></body></html>""".encode("latin-1")
+
+
+@pytest.mark.parametrize("name", list(EXTRACTORS))
+def test_extractors_agree_on_title_text_and_links(name):
+    if name == "lxml" and lxml is None:
+        pytest.skip("lxml is not installed")
+    page = EXTRACTORS[name]().extract(SIMPLE, "http://cafe.org/menu/index.html")
+    assert page.title.split() == ["Caf\xe9", "menu"]
+    words = page.text.split()
+    assert "croissants" in words and "Drinks" in words
+    assert "hidden" not in page.text and "color" not in page.text
+    assert set(page.links) >= {"http://cafe.org/menu/drinks.html", "http://other.org/x"}
+    assert any(link.startswith("http://cafe.org/about") for link in page.links)
+
+
+def test_decode_html_uses_the_declared_encoding():
+    assert "Caf\xe9" in decode_html(SIMPLE)
+    assert "Caf\xe9" in decode_html("Caf\xe9".encode("cp1252"), "cp1252")
+    assert decode_html(b"caf\xc3\xa9", "no-such-encoding") == "caf\xe9"
+
+
+def test_extract_page_keeps_links_under_the_prefix():
+    url, title, text, links = extract_page(get_extractor(), "http://cafe.org/menu/index.html", SIMPLE,
+                                           prefix="http://cafe.org/")
+    assert url == "http://cafe.org/menu/index.html"
+    assert all(link.startswith("http://cafe.org/") for link in links) and links
+
+
+def test_unknown_extractor():
+    with pytest.raises(ValueError):
+        get_extractor("regex")
@@ -0,0 +1,62 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from http_client import HttpClient, PageSkipped
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(self.path)
+        status = int(self.path.strip("/").split("/")[0])
+        body = b"<html><body>" + b"x" * (2000 if self.path.endswith("/big") else 10) + b"</body></html>"
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html" if not self.path.endswith("/pdf") else "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Retry-After", "3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def client():
+    with HttpClient(retries=2, backoff_factor=0.01, backoff_max=0.1, max_page_size=1000) as client:
+        Handler.requests.clear()
+        yield client
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttling_responses_are_returned_at_once(server, client, status):
+    started = time.monotonic()
+    assert client.get(f"{server}/{status}").status_code == status
+    assert time.monotonic() - started < 1.0
+    assert len(Handler.requests) == 1
+
+
+def test_server_errors_are_retried_with_a_capped_retry_after(server, client):
+    started = time.monotonic()
+    assert client.get(f"{server}/500").status_code == 500
+    assert len(Handler.requests) == 3
+    # Retry-After asks for an hour; backoff_max caps each wait
+    assert time.monotonic() - started < 2.0
+
+
+def test_fetch_html_skips_bad_pages(server, client):
+    assert client.fetch_html(f"{server}/200/page").content.startswith(b"<html>")
+    for path, status in (("404", 404), ("200/pdf", 200), ("200/big", 200)):
+        with pytest.raises(PageSkipped) as info:
+            client.fetch_html(f"{server}/{path}")
+        assert info.value.status_code == status
@@ -0,0 +1,99 @@
+import random
+from array import array
+import pytest
+from crawler import Crawler
+from index_snapshot import IndexSnapshot
+from postings import (decode_deltas, decode_varints, encode_deltas, encode_varints, filter_phrase, gallop,
+                      intersect, intersect_all, phrase_match)
+
+
+def sorted_ids(rng, count, universe=10_000):
+    return array('I', sorted(rng.sample(range(universe), count)))
+
+
+@pytest.mark.parametrize("values", [[], [0], [127, 128, 255, 16383, 16384, 2**32 - 1], list(range(0, 100000, 997))])
+def test_varints_round_trip(values):
+    assert list(decode_varints(encode_varints(values))) == values
+    assert list(decode_deltas(encode_deltas(values))) == values
+
+
+def test_varints_are_compact():
+    assert encode_varints([0, 127]) == b"\x00\x7f"
+    assert encode_varints([300]) == b"\xac\x02"
+    assert len(encode_deltas(range(1000, 2000))) == 1000 + 1
+
+
+def test_gallop_finds_the_first_id_not_below_the_target():
+    rng = random.Random(0)
+    postings = sorted_ids(rng, 500)
+    for target in rng.sample(range(-1, 10_001), 300):
+        for lo in (0, 100, 499):
+            expected = next((i for i in range(lo, len(postings)) if postings[i] >= target), len(postings))
+            assert gallop(postings, target, lo) == expected
+
+
+def test_intersections_match_set_intersection():
+    rng = random.Random(1)
+    lists = [sorted_ids(rng, n) for n in (40, 3000, 800)]
+    expected = sorted(set(lists[0]) & set(lists[1]) & set(lists[2]))
+    assert list(intersect(lists[0], lists[1])) == sorted(set(lists[0]) & set(lists[1]))
+    assert list(intersect_all(lists)) == expected
+    assert list(intersect_all([])) == []
+    assert list(intersect_all([lists[0], array('I')])) == []
+
+
+def test_phrase_match_with_slop():
+    assert phrase_match([[0, 7], [1], [2]])
+    assert not phrase_match([[0], [2], [3]])
+    assert phrase_match([[0], [2], [3]], slop=1)
+    assert not phrase_match([[5], [1]], slop=3)
+
+
+def test_filter_phrase_decodes_only_candidate_runs():
+    # Documents 0..2: "duck billed platypus", "billed duck platypus", "duck x billed"
+    terms = {
+        "duck": (array('I', [0, 1, 2]), [[0], [1], [0]]),
+        "billed": (array('I', [0, 1, 2]), [[1], [0], [2]]),
+    }
+    encoded = []
+    for postings, runs in terms.values():
+        offsets, blob = array('I'), bytearray()
+        for run in runs:
+            offsets.append(len(blob))
+            blob += encode_deltas(run)
+        encoded.append((postings, offsets, bytes(blob)))
+    assert list(filter_phrase(array('I', [0, 1, 2]), encoded)) == [0]
+    assert list(filter_phrase(array('I', [0, 1, 2]), encoded, slop=1)) == [0, 2]
+
+
+@pytest.fixture
+def crawler():
+    crawler = Crawler("http://zoo.org/", "http://zoo.org/")
+    crawler.index_page("http://zoo.org/1", "The duck billed platypus swims.")
+    crawler.index_page("http://zoo.org/2", "A duck and a platypus, billed as friends.")
+    crawler.index_page("http://zoo.org/3", "Platypus venom. The platypus is a mammal.")
+    return crawler
+
+
+def test_crawler_search(crawler):
+    assert crawler.search(["platypus"]) == ["http://zoo.org/1", "http://zoo.org/2", "http://zoo.org/3"]
+    assert crawler.search(["duck", "billed"]) == ["http://zoo.org/1", "http://zoo.org/2"]
+    assert crawler.search(["duck billed platypus"]) == ["http://zoo.org/1"]
+    assert crawler.search(["duck platypus"], slop=2) == ["http://zoo.org/1", "http://zoo.org/2"]
+    assert crawler.search(["okapi"]) == []
+    ranked = crawler.search_ranked(["platypus"])
+    assert ranked[0][0] == "http://zoo.org/3"
+
+
+def test_snapshot_answers_like_the_crawler(crawler, tmp_path):
+    path = str(tmp_path / "index.snap")
+    crawler.save_snapshot(path)
+    snapshot = IndexSnapshot(path)
+    try:
+        for query in (["platypus"], ["duck", "billed"], ["duck billed platypus"], ["okapi"]):
+            assert snapshot.search(query) == crawler.search(query)
+        assert snapshot.search(["duck platypus"], slop=2) == crawler.search(["duck platypus"], slop=2)
+        assert [url for url, _ in snapshot.search_ranked(["duck", "platypus"])] == \
+            [url for url, _ in crawler.search_ranked(["duck", "platypus"])]
+    finally:
+        snapshot.close()
@@ -0,0 +1,111 @@
+import time
+import pytest
+from scheduler import HostScheduler
+from whoosh_flask_crawler import Crawler
+
+HOSTS = [f"http://host{i}.test" for i in range(8)]
+
+
+def test_hosts_are_served_round_robin():
+    scheduler = HostScheduler(rate=100.0, burst=100.0)
+    for i in range(3):
+        for host in HOSTS[:2]:
+            scheduler.push(f"{host}/{i}")
+    first = scheduler.pop()
+    second = scheduler.pop()
+    assert {first, second} == {"http://host0.test/0", "http://host1.test/0"}
+    # Both hosts are at their initial in-flight limit of one
+    assert scheduler.pop() is None
+    scheduler.done(first, latency=0.01, status=200)
+    assert scheduler.pop() == first[:-1] + "1"
+    assert len(scheduler) == 3
+
+
+def test_token_bucket_limits_the_rate():
+    scheduler = HostScheduler(rate=10.0, burst=1.0)
+    scheduler.push(HOSTS[0] + "/a")
+    scheduler.push(HOSTS[0] + "/b")
+    url = scheduler.pop()
+    scheduler.done(url, latency=0.01, status=200)
+    assert scheduler.pop() is None
+    assert 0.0 < scheduler.wait_time() <= 0.1
+    time.sleep(scheduler.wait_time())
+    assert scheduler.pop() == HOSTS[0] + "/b"
+    assert scheduler.wait_time() is None
+
+
+def test_in_flight_limit_grows_and_throttling_slows_the_host_down():
+    scheduler = HostScheduler(rate=1000.0, burst=1000.0, max_per_host=4)
+    for i in range(100):
+        scheduler.push(f"{HOSTS[0]}/{i}")
+    for _ in range(20):
+        scheduler.done(scheduler.pop(), latency=0.01, status=200)
+    state = scheduler._hosts["host0.test"]
+    assert int(state.limit) == 4
+    scheduler.done(scheduler.pop(), latency=0.01, status=429)
+    assert int(state.limit) == 2
+    assert state.rate == 500.0
+
+
+class FakeCrawler(Crawler):
+    """Crawler whose fetches take a fixed time and whose pages are only recorded."""
+
+    def __init__(self, parse_workers=0):
+        super().__init__(HOSTS[0] + "/", "http://", None, workers=2, parse_workers=parse_workers,
+                         rate_per_host=1000.0, respect_robots=False, use_sitemaps=False,
+                         main_content=False)
+        self.enqueue([host + "/" for host in HOSTS[1:]])
+        self.handled = []
+        self.wait_calls = 0
+        wait_time = self.scheduler.wait_time
+
+        def counted_wait_time():
+            self.wait_calls += 1
+            return wait_time()
+        self.scheduler.wait_time = counted_wait_time
+
+    def _fetch_scheduled(self, url, parse=True):
+        time.sleep(0.05)
+        return None, 200, 0.05
+
+    def handle_page(self, url, page):
+        self.handled.append(url)
+
+
+@pytest.mark.parametrize("mode", ["_crawl_concurrent", "_crawl_pipeline"])
+def test_crawl_loop_blocks_while_the_pool_is_full(mode):
+    crawler = FakeCrawler(parse_workers=1 if mode == "_crawl_pipeline" else 0)
+    getattr(crawler, mode)()
+    assert sorted(crawler.handled) == sorted(host + "/" for host in HOSTS)
+    # Every host has tokens left, so polling the scheduler with a full pool would spin
+    assert crawler.wait_calls < 20
+
+
+def test_throttled_urls_are_queued_again_a_bounded_number_of_times():
+    scheduler = HostScheduler(rate=1000.0, burst=1000.0, max_requeues=2)
+    scheduler.push(HOSTS[0] + "/a")
+    for _ in range(2):
+        url = scheduler.pop()
+        assert scheduler.done(url, latency=0.01, status=429)
+        assert len(scheduler) == 1
+    url = scheduler.pop()
+    assert not scheduler.done(url, latency=0.01, status=503)
+    assert len(scheduler) == 0
+    # A URL that gets through starts over
+    scheduler.push(HOSTS[0] + "/b")
+    assert scheduler.done(scheduler.pop(), latency=0.01, status=429)
+    assert not scheduler.done(scheduler.pop(), latency=0.01, status=200)
+    assert not scheduler._requeues
+
+
+def test_crawler_does_not_handle_throttled_pages_until_they_get_through():
+    crawler = FakeCrawler()
+    statuses = {}
+
+    def fetch(url, parse=True):
+        statuses[url] = statuses.get(url, 0) + 1
+        return None, (429 if statuses[url] == 1 else 200), 0.01
+    crawler._fetch_scheduled = fetch
+    crawler._crawl_concurrent()
+    assert sorted(crawler.handled) == sorted(host + "/" for host in HOSTS)
+    assert set(statuses.values()) == {2}
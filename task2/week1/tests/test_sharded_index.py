@@ -0,0 +1,129 @@
+import random
+import pytest
+from helpers import ShardedWhooshHelper, WhooshHelper, read_shard_layout, shard_of, shard_path, write_shard_layout
+
+WORDS = "platypus duck billed mammal water river australia venom egg fur swim burrow".split()
+
+
+def make_docs(count: int = 40) -> list:
+    rng = random.Random(0)
+    docs = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 60))]
+        docs.append((f"http://example.org/page{i}.html", f"Page {i}", " ".join(words)))
+    return docs
+
+
+@pytest.fixture
+def docs():
+    return make_docs()
+
+
+def test_shard_of_is_stable_and_in_range():
+    shards = [shard_of(f"http://example.org/{i}", 4) for i in range(200)]
+    assert all(0 <= shard < 4 for shard in shards)
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [shard_of(f"http://example.org/{i}", 4) for i in range(200)]
+
+
+def test_shard_of_by_host_keeps_a_host_together():
+    assert len({shard_of(f"http://Example.org/{i}", 4, by_host=True) for i in range(50)}) == 1
+    assert {shard_of(f"http://host{i}.org/", 4, by_host=True) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_documents_are_stored_in_their_shard(tmp_path, docs):
+    helper = ShardedWhooshHelper(str(tmp_path / "ix"), 4, store_content=False)
+    helper.add_documents(docs)
+    assert helper.doc_count() == len(docs)
+    for i, shard in enumerate(helper.shards):
+        with shard.index.searcher() as searcher:
+            urls = [fields["url"] for fields in searcher.all_stored_fields()]
+        assert urls and all(shard_of(url, 4) == i for url in urls)
+
+
+def test_hits_are_rendered_by_the_shard_that_owns_them(tmp_path, docs, monkeypatch):
+    helper = ShardedWhooshHelper(str(tmp_path / "ix"), 4, store_content=False)
+    helper.add_documents(docs)
+    rendered = []
+    for i, shard in enumerate(helper.shards):
+        render = shard._render_hit
+
+        def record(result, i=i, render=render):
+            rendered.append((i, result["url"]))
+            return render(result)
+
+        monkeypatch.setattr(shard, "_render_hit", record)
+        monkeypatch.setattr(shard, "fetch_page_content", lambda url: pytest.fail(f"fetched {url}"))
+
+    info, hits = helper.search_results("platypus", pagelen=20)
+    hits = list(hits)
+    assert len(hits) == min(info["total"], 20) > 10
+    assert len({shard for shard, _ in rendered}) > 1
+    assert all(shard_of(url, 4) == shard for shard, url in rendered)
+    assert all("<b>platypus</b>" in hit["description"] for hit in hits)
+
+
+def test_merged_ranking_matches_a_single_index(tmp_path, docs):
+    single = WhooshHelper(str(tmp_path / "single"), cache_size=0)
+    single.add_documents(docs)
+    sharded = ShardedWhooshHelper(str(tmp_path / "sharded"), 4, cache_size=0)
+    sharded.add_documents(docs)
+    for query in ("platypus", "duck venom", "river"):
+        with single.index.searcher() as searcher:
+            results = searcher.search(single.parser.parse(query), limit=None)
+            scores = {hit["url"]: round(hit.score, 6) for hit in results}
+            expected = [round(hit.score, 6) for hit in results]
+        for page in (1, 2):
+            info, hits = sharded.search_results(query, page=page, pagelen=5)
+            assert info["total"] == len(expected)
+            # Equal scores may come in any order, so the pages are compared by score
+            assert [scores[hit["url"]] for hit in hits] == expected[(page - 1) * 5:page * 5]
+
+
+def test_page_past_the_end_has_no_hits(tmp_path, docs):
+    sharded = ShardedWhooshHelper(str(tmp_path / "sharded"), 4, cache_size=0)
+    sharded.add_documents(docs)
+    info, hits = sharded.search_results("platypus", page=100, pagelen=5)
+    assert info["page"] == 100 and info["total"] > 0
+    assert list(hits) == []
+
+
+def test_sharded_batch_writer_commits_all_shards_together(tmp_path, docs):
+    sharded = ShardedWhooshHelper(str(tmp_path / "sharded"), 4, cache_size=0)
+    commits = []
+    with pytest.raises(RuntimeError):
+        with sharded.batch_writer(batch_size=10, on_commit=lambda: commits.append(sharded.doc_count())) as writer:
+            for url, title, content in docs[:25]:
+                writer.add_document(url, title, content)
+            assert commits == [10, 20] and writer.pending == 5
+            raise RuntimeError("crawl failed")
+    # The documents added before the error are committed on the way out
+    assert commits == [10, 20, 25]
+
+
+def test_shard_count_cannot_change(tmp_path, docs):
+    ShardedWhooshHelper(str(tmp_path / "ix"), 4).add_documents(docs)
+    with pytest.raises(ValueError):
+        ShardedWhooshHelper(str(tmp_path / "ix"), 3)
+    assert len(ShardedWhooshHelper(str(tmp_path / "ix")).shards) == 4
+
+
+def test_routing_follows_the_layout_of_the_index(tmp_path, docs):
+    index_dir = str(tmp_path / "ix")
+    # Shards written by distributed_crawl.py workers, one host each
+    write_shard_layout(index_dir, 2, by_host=True)
+    for i in range(2):
+        WhooshHelper(shard_path(index_dir, i), cache_size=0)
+    helper = ShardedWhooshHelper(index_dir)
+    assert helper.by_host
+    helper.add_documents(docs)
+    host_shard = shard_of(docs[0][0], 2, by_host=True)
+    assert helper.shards[host_shard].doc_count() == len(docs)
+    assert ShardedWhooshHelper(index_dir, readonly=True).by_host
+    with pytest.raises(ValueError):
+        ShardedWhooshHelper(index_dir, by_host=False)
+
+
+def test_new_index_records_its_layout(tmp_path, docs):
+    ShardedWhooshHelper(str(tmp_path / "ix"), 3)
+    assert read_shard_layout(str(tmp_path / "ix")) == {"shards": 3, "by_host": False}
@@ -0,0 +1,153 @@
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from crawl_state import PageMetadataStore
+from helpers import WhooshHelper, read_build_stats
+from http_client import HttpClient
+from whoosh_flask_crawler import Crawler, Download, Page
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+PAGES = {
+    "/": b'<html><head><title>Home</title></head><body><p>platypus home</p>'
+         b'<a href="/etag">etag</a> <a href="/static">static</a></body></html>',
+    "/etag": b"<html><head><title>Etag</title></head><body><p>platypus with validators</p></body></html>",
+    "/static": b"<html><head><title>Static</title></head><body><p>platypus without validators</p></body></html>",
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append((self.path, self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")))
+        if self.path not in PAGES:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        validators = self.path != "/static"
+        if validators and self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        body = PAGES[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if validators:
+            self.send_header("ETag", ETAG)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def crawler_factory(server, tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=0)
+    metadata = PageMetadataStore(str(tmp_path / "state.sqlite"))
+    client = HttpClient(retries=0)
+    Handler.requests.clear()
+
+    def factory():
+        return Crawler(server + "/", server + "/", helper, metadata=metadata, http_client=client,
+                       respect_robots=False, use_sitemaps=False, skip_near_duplicates=False)
+    yield factory
+    metadata.close()
+    client.close()
+
+
+def remember(crawler, url, download, links):
+    crawler.metadata.put(url, download.etag, download.last_modified, download.content_hash, links)
+
+
+def test_conditional_get_and_304(server, crawler_factory):
+    crawler = crawler_factory()
+    url = server + "/etag"
+    download, status = crawler.download_page(url)
+    assert status == 200 and isinstance(download, Download)
+    assert (download.etag, download.last_modified) == (ETAG, LAST_MODIFIED)
+    assert Handler.requests[-1] == ("/etag", None, None)
+
+    remember(crawler, url, download, [server + "/static"])
+    page, status = crawler.download_page(url)
+    assert Handler.requests[-1] == ("/etag", ETAG, LAST_MODIFIED)
+    assert status == 304
+    assert page == Page(None, None, [server + "/static"], ETAG, LAST_MODIFIED, download.content_hash)
+
+
+def test_unchanged_body_is_not_parsed_again(server, crawler_factory):
+    crawler = crawler_factory()
+    url = server + "/static"
+    download, status = crawler.download_page(url)
+    assert isinstance(download, Download)
+
+    remember(crawler, url, download, [])
+    page, status = crawler.download_page(url)
+    # Without validators the request is unconditional, but the body hash still matches
+    assert Handler.requests[-1] == ("/static", None, None)
+    assert status == 200
+    assert page == Page(None, None, [], None, None, download.content_hash)
+
+    crawler.metadata.put(url, None, None, "stale", [])
+    changed, status = crawler.download_page(url)
+    assert isinstance(changed, Download) and changed.content == PAGES["/static"]
+
+
+def test_recrawl_only_revalidates(server, crawler_factory):
+    crawler = crawler_factory()
+    crawler.crawl()
+    assert crawler.whoosh_helper.doc_count() == 3
+    # The setting the pages were extracted with is recorded for searches
+    assert read_build_stats(crawler.whoosh_helper.index_dir) == {"main_content": True}
+    first = sorted(path for path, _, _ in Handler.requests)
+    Handler.requests.clear()
+
+    # The home page answers 304, so its links come from the metadata store
+    crawler = crawler_factory()
+    crawler.crawl()
+    assert sorted(path for path, _, _ in Handler.requests) == first
+    assert all(etag == ETAG for path, etag, _ in Handler.requests if path != "/static")
+    assert crawler.whoosh_helper.doc_count() == 3
+    assert len(crawler.whoosh_helper.search("platypus")) == 3
+
+
+def test_variants_of_visited_pages_are_not_queued_again(tmp_path):
+    crawler = Crawler("http://a.org/", "http://a.org/", WhooshHelper(str(tmp_path / "indexdir"), cache_size=0),
+                      respect_robots=False, use_sitemaps=False)
+    crawler._fill_scheduler()
+    assert crawler.scheduler.pop() == "http://a.org/"
+    links = ["HTTP://a.org:80/?utm_source=x#top", "http://a.org/b?utm_source=x"]
+    crawler.handle_page("http://a.org/", Page("Home", None, links, None, None, None))
+    crawler.enqueue(["http://A.org/b#frag"])
+    assert len(crawler.agenda) == 1
+    assert crawler.agenda.pop() == "http://a.org/b"
+
+
+class DyingExtractor:
+    """Extractor whose parse process dies, like one killed for using too much memory."""
+
+    def extract(self, content, base_url, encoding=None):
+        os._exit(1)
+
+
+def test_pipeline_stops_when_a_parse_process_dies(server, crawler_factory):
+    crawler = crawler_factory()
+    crawler.parse_workers = 1
+    crawler.extractor = DyingExtractor()
+    with pytest.raises(BrokenProcessPool):
+        crawler.crawl()
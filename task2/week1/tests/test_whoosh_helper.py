@@ -0,0 +1,275 @@
+import json
+import os
+import time
+import pytest
+from whoosh import query
+from helpers import FlaskAppHelper, ResultCache, WhooshHelper, publish_index, write_build_stats
+from whoosh_flask_crawler import Crawler
+
+
+def build(path, store_content=True, urls=("http://a.org/1", "http://a.org/2")):
+    helper = WhooshHelper(path, store_content=store_content, cache_size=0)
+    with helper.batch_writer() as writer:
+        for url in urls:
+            writer.add_document(url=url, title=url, content=f"platypus page {url}")
+    return helper
+
+
+def test_mismatching_index_directory_is_reset(tmp_path):
+    path = str(tmp_path / "indexdir")
+    build(path, store_content=True)
+    helper = WhooshHelper(path, store_content=False, cache_size=0)
+    assert helper.doc_count() == 0
+    assert not helper.schema["content"].stored
+
+
+def test_published_index_is_never_reset(tmp_path):
+    index_dir = str(tmp_path / "indexdir")
+    build_dir = index_dir + ".20240101000000"
+    build(build_dir, store_content=True)
+    publish_index(build_dir, index_dir)
+    with pytest.raises(ValueError, match="--rebuild"):
+        WhooshHelper(index_dir, store_content=False, cache_size=0)
+    assert WhooshHelper(index_dir, readonly=True, cache_size=0).doc_count() == 2
+    # A matching configuration updates the published build in place
+    assert WhooshHelper(index_dir, store_content=True, cache_size=0).doc_count() == 2
+
+
+def test_directory_without_an_index_gets_one(tmp_path):
+    path = tmp_path / "indexdir"
+    path.mkdir()
+    (path / "notes.txt").write_text("not an index")
+    helper = WhooshHelper(str(path), cache_size=0)
+    assert helper.doc_count() == 0
+    assert not os.path.exists(path / "notes.txt")
+
+
+class FakeResponse:
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+    encoding = "utf-8"
+    content = (b"<html><body><nav><a href='/'>Home</a> <a href='/zoo'>Zoo</a></nav>"
+               b"<p>The platypus is a semiaquatic, egg-laying mammal endemic to eastern Australia.</p>"
+               b"<footer>Copyright 2024</footer></body></html>")
+
+
+@pytest.mark.parametrize("main_content", [True, False])
+def test_fetched_pages_are_extracted_as_they_were_indexed(tmp_path, monkeypatch, main_content):
+    path = str(tmp_path / "indexdir")
+    build(path, store_content=False)
+    write_build_stats(path, main_content=main_content)
+    helper = WhooshHelper(path, readonly=True, cache_size=0)
+    assert helper.main_content is main_content
+    monkeypatch.setattr(helper.http, "fetch_html", lambda url: FakeResponse())
+    text = helper.fetch_page_content("http://a.org/1")
+    assert "semiaquatic" in text
+    assert ("Copyright" in text) is not main_content
+
+
+def test_main_content_without_build_stats(tmp_path):
+    path = str(tmp_path / "indexdir")
+    # A new index is built with the crawler's default, an old one with documents holds whole pages
+    assert build(path).main_content is True
+    assert WhooshHelper(path, cache_size=0).main_content is False
+    assert WhooshHelper(path, main_content=True, cache_size=0).main_content is True
+
+
+def test_crawler_indexes_the_way_the_index_says(tmp_path):
+    path = str(tmp_path / "indexdir")
+    helper = WhooshHelper(path, cache_size=0)
+    crawler = Crawler("http://a.org/", "http://a.org/", helper, respect_robots=False, use_sitemaps=False)
+    assert crawler.extractor.main_content is helper.main_content is True
+    write_build_stats(path, main_content=False)
+    crawler = Crawler("http://a.org/", "http://a.org/", WhooshHelper(path, cache_size=0),
+                      respect_robots=False, use_sitemaps=False)
+    assert crawler.extractor.main_content is False
+
+
+def test_searchers_are_reused_and_released(tmp_path):
+    helper = build(str(tmp_path / "indexdir"))
+    assert len(helper.search("platypus")) == 2
+    assert len(helper._searchers) == 1
+    searcher = helper._searchers._idle[0]
+    helper.search("platypus")
+    assert helper._searchers._idle == [searcher]
+
+    # An iterator that is dropped, started or not, gives its searcher back
+    _, hits = helper.search_results("page")
+    assert len(helper._searchers) == 0
+    next(hits)
+    del hits
+    assert len(helper._searchers) == 1
+    helper.search_results("page")
+    assert len(helper._searchers) == 1
+
+
+def test_pooled_searcher_sees_new_commits(tmp_path):
+    helper = build(str(tmp_path / "indexdir"))
+    helper.search("platypus")
+    helper.add_document("http://a.org/3", "Three", "platypus three")
+    assert len(helper.search("platypus")) == 3
+
+
+def test_pool_keeps_a_bounded_number_of_searchers(tmp_path):
+    helper = build(str(tmp_path / "indexdir"))
+    helper._searchers.size = 2
+    searchers = [helper.acquire_searcher() for _ in range(4)]
+    assert len(set(map(id, searchers))) == 4
+    for searcher in searchers:
+        helper.release_searcher(searcher)
+    assert len(helper._searchers) == 2
+    assert sum(searcher.is_closed for searcher in searchers) == 2
+    helper.close()
+    assert all(searcher.is_closed for searcher in searchers)
+
+
+def test_searchers_of_a_replaced_build_are_closed(tmp_path):
+    index_dir = str(tmp_path / "indexdir")
+    build(index_dir + ".1")
+    publish_index(index_dir + ".1", index_dir)
+    helper = WhooshHelper(index_dir, readonly=True, cache_size=0)
+    old = helper.acquire_searcher()
+    helper.release_searcher(helper.acquire_searcher())
+    build(index_dir + ".2", urls=["http://b.org/1"])
+    publish_index(index_dir + ".2", index_dir)
+    assert [hit["url"] for hit in helper.search("platypus")] == ["http://b.org/1"]
+    helper.release_searcher(old)
+    assert old.is_closed
+    assert len(helper._searchers) == 1
+
+
+def test_reindexing_a_url_replaces_its_document(tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=0)
+    helper.add_document("http://a.org/1", "Old", "platypus old")
+    helper.add_document("http://a.org/1", "New", "platypus new")
+    with helper.batch_writer() as writer:
+        writer.add_document("http://a.org/2", "Old", "platypus old")
+        writer.add_document("http://a.org/2", "New", "platypus new")
+    with helper.batch_writer() as writer:
+        writer.add_document("http://a.org/2", "Newer", "platypus newer")
+    assert helper.doc_count() == 2
+    assert sorted(hit["title"] for hit in helper.search("platypus")) == ["New", "Newer"]
+    assert helper.search("old") == []
+
+
+def test_duplicate_urls_are_collapsed_into_one_hit(tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=0)
+    # An index written without the upsert, e.g. by an older version of the crawler
+    writer = helper.index.writer()
+    writer.add_document(url="http://a.org/1", title="One", content="platypus one")
+    writer.add_document(url="http://a.org/1", title="One", content="platypus one again")
+    writer.commit()
+    assert helper.doc_count() == 2
+    _, hits = helper.search_results("platypus")
+    assert [hit["url"] for hit in hits] == ["http://a.org/1"]
+
+
+def test_batch_writer_commits_full_batches(tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=0)
+    commits = []
+    with helper.batch_writer(batch_size=3, on_commit=lambda: commits.append(helper.doc_count())) as writer:
+        for i in range(4):
+            writer.add_document(f"http://a.org/{i}", "Page", "platypus")
+        assert commits == [3] and writer.pending == 1
+    assert commits == [3, 4]
+
+
+def test_batch_writer_commits_after_the_interval(tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=0)
+    with helper.batch_writer(commit_interval=0.05) as writer:
+        writer.add_document("http://a.org/1", "Page", "platypus")
+        assert helper.doc_count() == 0
+        time.sleep(0.1)
+        writer.add_document("http://a.org/2", "Page", "platypus")
+        assert helper.doc_count() == 2 and writer.pending == 0
+
+
+def test_batch_writer_keeps_the_documents_added_before_an_error(tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=0)
+    commits = []
+    with pytest.raises(RuntimeError):
+        with helper.batch_writer(on_commit=lambda: commits.append(True)) as writer:
+            writer.add_document("http://a.org/1", "Page", "platypus")
+            raise RuntimeError("crawl failed")
+    assert helper.doc_count() == 1 and commits == [True]
+
+
+def test_result_cache_is_an_lru_with_ttl():
+    cache = ResultCache(max_size=2, ttl=60.0)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"
+    cache.put("c", 1, "C")
+    # "b" was the least recently used
+    assert cache.get("b", 1) is None
+    assert cache.get("c", 1) == "C"
+    cache.ttl = 0.0
+    time.sleep(0.01)
+    assert cache.get("a", 1) is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_result_cache_drops_everything_on_a_new_generation():
+    cache = ResultCache()
+    cache.put("a", 1, "A")
+    assert cache.get("a", 2) is None
+    assert cache.get("a", 1) is None
+
+
+def test_search_results_are_cached_until_the_next_commit(tmp_path):
+    helper = WhooshHelper(str(tmp_path / "indexdir"), cache_size=16)
+    helper.add_document("http://a.org/1", "One", "platypus one")
+    assert len(helper.search("platypus")) == 1
+    assert len(helper.search("  platypus ")) == 1
+    assert helper.cache.stats()["hits"] == 1
+    helper.add_document("http://a.org/2", "Two", "platypus two")
+    assert len(helper.search("platypus")) == 2
+
+
+@pytest.fixture
+def api(tmp_path):
+    helper = build(str(tmp_path / "indexdir"), urls=("http://a.org/1", "http://a.org/2", "http://a.org/3"))
+    return helper, FlaskAppHelper(helper).app.test_client()
+
+
+def ndjson(response) -> list:
+    assert response.mimetype == "application/x-ndjson"
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n")
+    return [json.loads(line) for line in body.split("\n")[:-1]]
+
+
+def test_api_search_streams_one_json_object_per_line(api):
+    _, client = api
+    info, *hits = ndjson(client.get("/api/search?q=platypus&pagelen=2"))
+    assert info == {"query": "platypus", "page": 1, "pagelen": 2, "pagecount": 2, "total": 3}
+    assert len(hits) == 2 and all(hit["url"].startswith("http://a.org/") for hit in hits)
+    info, *rest = ndjson(client.get("/api/search?q=platypus&pagelen=2&page=2"))
+    assert info["page"] == 2
+    assert {hit["url"] for hit in hits + rest} == {"http://a.org/1", "http://a.org/2", "http://a.org/3"}
+
+
+def test_api_search_has_no_hits_past_the_last_page(api):
+    _, client = api
+    info, *hits = ndjson(client.get("/api/search?q=platypus&pagelen=2&page=3"))
+    assert info["page"] == 3 and info["pagecount"] == 2 and info["total"] == 3
+    assert hits == []
+
+
+@pytest.mark.parametrize("args", ["page=0", "page=-1", "page=abc", "page=", "pagelen=0", "pagelen=101",
+                                  "pagelen=2.5"])
+def test_api_search_rejects_bad_paging(api, args):
+    _, client = api
+    response = client.get(f"/api/search?q=platypus&{args}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_api_search_rejects_malformed_queries(api, monkeypatch):
+    helper, client = api
+    # Whoosh keeps going past a syntax error and marks the broken part of the query instead
+    broken = query.And([query.Term("content", "platypus"), query.error_query("bad syntax")])
+    monkeypatch.setattr(helper.parser, "parse", lambda text: broken)
+    response = client.get("/api/search?q=platypus")
+    assert response.status_code == 400
+    assert "bad syntax" in response.get_json()["error"]
+    assert client.get("/search?q=platypus").status_code == 400
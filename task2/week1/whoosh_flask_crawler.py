@@ -1,9 +1,26 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from helpers import FlaskAppHelper, WhooshHelper
-import re
 from urllib.parse import urlparse
+from helpers import FlaskAppHelper, WhooshHelper, write_build_stats
+import time
+import gzip
+import hashlib
+import multiprocessing
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from crawl_state import PageMetadataStore, Frontier
+from http_client import HttpClient, PageSkipped, get_client
+from scheduler import HostScheduler, RobotsCache
+from extractors import get_extractor, extract_page
+from dedup import NearDuplicateDetector, canonicalize_urls
+
+
+# Result of fetching a page. `text` is None when the page is unchanged since the
+# last crawl and does not need to be reindexed; `links` is always filled in.
+Page = namedtuple("Page", ["title", "text", "links", "etag", "last_modified", "content_hash"])
+# A new or changed page that has been downloaded but not parsed yet.
+Download = namedtuple("Download", ["content", "encoding", "etag", "last_modified", "content_hash"])
 
 
 class Crawler:
@@ -12,108 +29,560 @@ class Crawler:
     Attributes:
         start_url (str): The URL to begin crawling from.
         prefix (str): Base URL prefix to restrict crawling to a specific domain.
-        agenda (list): List of URLs to visit.
-        visited_urls (set): Set of already visited URLs.
+        agenda (Frontier): Frontier of URLs to visit, in memory or on disk.
+        visited_urls (set): Set of already visited URLs, or a `VisitedSet`.
         whoosh_helper (WhooshHelper): Instance of the WhooshHelper for managing the index.
+        workers (int): Number of concurrent fetch workers.
+        parse_workers (int): Number of processes parsing pages, or 0 to parse on the fetch workers.
+        index_procs (int): Number of processes of the index writer.
+        scheduler (HostScheduler): Per-host queues, rate limits and robots.txt checks.
+        extractor (object): Extracts title, text and links from downloaded pages.
+        batch_size (int): Number of pages committed to the index at once.
+        writer (BatchWriter): Batch writer used while a crawl is running.
+        metadata (PageMetadataStore): Per-URL metadata for incremental recrawls, if any.
+        http (HttpClient): Pooled HTTP client used for all fetches.
+        dedup (NearDuplicateDetector): Near-duplicate table of the indexed pages, or None to index every page.
     """
 
-    def __init__(self, start_url: str, prefix: str, whoosh_helper: WhooshHelper):
+    def __init__(self, start_url: str, prefix: str, whoosh_helper: WhooshHelper,
+                 workers: int = 1, max_per_host: int = 4, batch_size: int = 500,
+                 metadata: PageMetadataStore = None, agenda=None, visited_urls=None,
+                 http_client: HttpClient = None, rate_per_host: float = 4.0,
+                 respect_robots: bool = True, scheduler: HostScheduler = None, use_sitemaps: bool = True,
+                 extractor=None, parse_workers: int = 0, index_procs: int = 1,
+                 skip_near_duplicates: bool = True, main_content: bool = None):
         """Initializes the crawler with a start URL, prefix, and WhooshHelper.
 
         Args:
             start_url (str): The URL to begin crawling from.
             prefix (str): The base URL prefix to restrict crawling to a specific domain.
             whoosh_helper (WhooshHelper): Instance of the WhooshHelper for managing the index.
+            workers (int, optional): Number of concurrent fetch workers. Defaults to 1 (sequential crawl).
+            max_per_host (int, optional): Maximum number of in-flight requests per host. The actual
+                limit adapts to how the host responds. Defaults to 4.
+            batch_size (int, optional): Number of pages committed to the index at once. Defaults to 500.
+            metadata (PageMetadataStore, optional): Store for incremental recrawls. Defaults to None
+                (every page is fetched and indexed unconditionally).
+            agenda (Frontier, optional): Frontier to crawl from, e.g. a `SQLiteFrontier` to make the
+                crawl resumable. Defaults to an in-memory frontier.
+            visited_urls (set, optional): Visited-URL set, e.g. a `VisitedSet`. Defaults to an in-memory set.
+            http_client (HttpClient, optional): Client to fetch pages with. Its `pool_maxsize` should be
+                at least `workers`. Defaults to the shared client from `get_client`.
+            rate_per_host (float, optional): Maximum requests per second per host. Defaults to 4.0.
+            respect_robots (bool, optional): Honor robots.txt rules and crawl delays. Defaults to True.
+            scheduler (HostScheduler, optional): Scheduler to use instead of one built from
+                `max_per_host`, `rate_per_host` and `respect_robots`. Defaults to None.
+            use_sitemaps (bool, optional): Seed a new crawl with the URLs of the site's sitemaps, which
+                are crawled first, in the order of their sitemap priority. Defaults to True.
+            extractor (object, optional): Page extractor, or the name of one (see `extractors.get_extractor`).
+                Defaults to the fastest one available.
+            parse_workers (int, optional): Number of processes to parse pages in, which turns the crawl
+                into a fetch -> parse -> index pipeline. Defaults to 0 (pages are parsed on the fetch workers).
+            index_procs (int, optional): Number of processes the index writer analyzes documents
+                with. Defaults to 1.
+            skip_near_duplicates (bool, optional): Do not index pages whose text is nearly the same
+                as that of a page indexed before in this crawl. Defaults to True.
+            main_content (bool, optional): Index only the main content of a page, without navigation,
+                footers and other boilerplate (see `extractors.extract_main_content`). Defaults to None,
+                which uses the setting of `whoosh_helper`, i.e. of the index. Only used if `extractor`
+                is not an extractor object.
         """
         self.start_url = start_url
         self.prefix = prefix
-        self.agenda = [start_url]
-        self.visited_urls = set()
+        self.agenda = agenda if agenda is not None else Frontier()
+        self.visited_urls = visited_urls if visited_urls is not None else set()
         self.whoosh_helper = whoosh_helper
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.index_procs = index_procs
+        self.batch_size = batch_size
+        self.writer = None
+        self.metadata = metadata
+        self.http = http_client if http_client is not None else get_client()
+        if scheduler is None:
+            robots = RobotsCache(self.http) if respect_robots else None
+            scheduler = HostScheduler(rate=rate_per_host, burst=rate_per_host,
+                                      max_per_host=max_per_host, robots=robots)
+        self.scheduler = scheduler
+        if extractor is None or isinstance(extractor, str):
+            if main_content is None:
+                main_content = whoosh_helper.main_content
+            extractor = get_extractor(extractor, main_content=main_content)
+        self.extractor = extractor
+        self.dedup = NearDuplicateDetector() if skip_near_duplicates else None
+        self._uncommitted = []
+        self._seed_sitemaps = False
+        self._stopped = False
+
+        # Pages that were in flight when a previous crawl stopped must be fetched again.
+        for url in self.agenda.restore():
+            self.visited_urls.discard(url)
+        if len(self.agenda):
+            print(f"Resuming crawl with {len(self.agenda)} queued URLs")
+        else:
+            self.visited_urls.clear()
+            self.enqueue([start_url])
+            self._seed_sitemaps = use_sitemaps
 
     def crawl(self) -> None:
         """Crawls HTML pages starting from the start URL and indexes their content.
 
+        Pages are fetched one at a time unless the crawler was created with more
+        than one worker, in which case they are fetched concurrently, or with
+        parse workers, in which case the fetch -> parse -> index pipeline is
+        used. Either way, the scheduler decides when each host may be fetched
+        from. Indexed pages are committed in batches of `batch_size`.
+
+        With a metadata store, pages are fetched with conditional requests and
+        only new or changed pages are reindexed.
+
+        A page is only marked as done in the frontier and in the metadata store
+        once the batch containing it is committed, so an interrupted crawl can be
+        resumed with a new Crawler on the same persistent frontier. `stop` ends
+        the crawl early in the same way.
+
+        Returns:
+            None
+        """
+        self._stopped = False
+        main_content = getattr(self.extractor, "main_content", None)
+        if main_content is not None:
+            # Recorded so that searches extract fetched pages the way they were indexed
+            write_build_stats(self.whoosh_helper.index_dir, main_content=main_content)
+        if self.metadata is not None and self.whoosh_helper.doc_count() == 0:
+            # The index was created from scratch, so nothing can be skipped.
+            self.metadata.clear()
+        if self._seed_sitemaps:
+            self._seed_sitemaps = False
+            self.seed_from_sitemaps()
+
+        with self.whoosh_helper.batch_writer(batch_size=self.batch_size, procs=self.index_procs,
+                                             on_commit=self._on_commit) as writer:
+            self.writer = writer
+            try:
+                if self.parse_workers > 0:
+                    self._crawl_pipeline()
+                elif self.workers > 1:
+                    self._crawl_concurrent()
+                else:
+                    self._crawl_sequential()
+            except KeyboardInterrupt:
+                writer.commit()
+                print("Crawl paused")
+                raise
+            finally:
+                self.writer = None
+        if self.dedup is not None:
+            print(f"Suppressed {self.dedup.suppressed} near-duplicate pages")
+
+    def stop(self) -> None:
+        """Makes a running crawl return without starting new fetches.
+
+        Fetches that are already in flight are finished, but their pages are not
+        handled, so a resumed crawl fetches them again.
+
+        Returns:
+            None
+        """
+        self._stopped = True
+
+    def _on_commit(self) -> None:
+        """Marks the pages handled since the previous commit as done.
+
         Returns:
             None
         """
-        while self.agenda:
-            url = self.agenda.pop()
+        for url, page in self._uncommitted:
+            if page is not None and self.metadata is not None:
+                self.metadata.put(url, page.etag, page.last_modified, page.content_hash, page.links)
+            self.agenda.task_done(url)
+        self._uncommitted = []
+
+    def seed_from_sitemaps(self, max_sitemaps: int = 20) -> int:
+        """Adds the URLs listed in the site's sitemaps to the frontier.
+
+        The sitemaps are taken from the `Sitemap` lines of robots.txt, or
+        `/sitemap.xml` if there are none. Sitemap indexes are followed. Each URL
+        gets its sitemap `<priority>` (0.5 if missing) as a hint, so sitemap
+        URLs are crawled before URLs only found through links.
+
+        Args:
+            max_sitemaps (int, optional): Maximum number of sitemap files to fetch. Defaults to 20.
+
+        Returns:
+            int: Number of URLs added.
+        """
+        parts = urlparse(self.start_url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        pending = None
+        if self.scheduler.robots is not None:
+            pending = self.scheduler.robots.get(self.start_url).site_maps()
+        pending = list(pending or [root + "/sitemap.xml"])
+        fetched = 0
+        added = 0
+        while pending and fetched < max_sitemaps:
+            sitemap_url = pending.pop(0)
+            fetched += 1
+            try:
+                r = self.http.get(sitemap_url)
+                if r.status_code != 200:
+                    continue
+                urls, sitemaps = parse_sitemap(r.content)
+            except Exception as e:
+                print(f"Could not read sitemap {sitemap_url}: {e}")
+                continue
+            pending.extend(sitemaps)
+            for url, priority in urls:
+                if url.startswith(self.prefix):
+                    self.enqueue([url], depth=1, hint=priority)
+                    added += 1
+        if added:
+            print(f"Added {added} URLs from sitemaps")
+        return added
+
+    def enqueue(self, urls: list, depth: int = 0, hint: float = 0.0) -> None:
+        """Adds newly discovered URLs to the frontier, in their canonical form.
+
+        Variants of a URL that only differ in e.g. tracking parameters or the
+        order of query parameters become one frontier entry and are fetched once.
+        URLs are checked against the visited set after canonicalization, so a
+        variant of a visited page is not queued again; the frontier itself keeps
+        a queued URL only once. Malformed URLs are left out.
+
+        Args:
+            urls (list): The discovered URLs.
+            depth (int, optional): Number of links between the start page and the URLs. Defaults to 0.
+            hint (float, optional): Priority hint from a sitemap. Defaults to 0.0.
+
+        Returns:
+            None
+        """
+        self.agenda.extend([url for url in canonicalize_urls(urls) if url not in self.visited_urls],
+                           depth=depth, hint=hint)
+
+    def _fill_scheduler(self, max_pending: int = 10000) -> None:
+        """Moves unvisited URLs from the frontier into the scheduler's host queues.
+
+        Args:
+            max_pending (int, optional): Stop once the scheduler holds this many URLs. Defaults to 10000.
+
+        Returns:
+            None
+        """
+        while len(self.scheduler) < max_pending:
+            try:
+                url = self.agenda.pop()
+            except IndexError:
+                break
             if url in self.visited_urls:
                 continue
-            print(f"Get {url}")
             self.visited_urls.add(url)
+            self.scheduler.push(url)
 
-            try:
-                r = requests.get(url)
-                if r.status_code != 200 or "text/html" not in r.headers.get("Content-Type", ""):
-                    print(f"Skipping {url} - Not an HTML page or bad response.")
+    def _crawl_sequential(self) -> None:
+        """Crawls one page at a time.
+
+        Returns:
+            None
+        """
+        while True:
+            self._fill_scheduler()
+            if self._stopped:
+                break
+            url = self.scheduler.pop()
+            if url is None:
+                if not len(self.scheduler):
+                    break
+                time.sleep(self.scheduler.wait_time())
+                continue
+            page, status, latency = self._fetch_scheduled(url)
+            if not self.scheduler.done(url, latency, status):
+                self.handle_page(url, page)
+
+    def _crawl_concurrent(self) -> None:
+        """Crawls with a thread pool of fetch workers.
+
+        Only the network round-trips run on the workers. The frontier, the visited
+        set, the scheduler and the index are owned by the calling thread, so
+        indexing goes through the same code path as the sequential crawl. Workers
+        are handed whatever URLs the scheduler releases, so while one host is
+        rate-limited the others keep the pool busy.
+
+        Returns:
+            None
+        """
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                self._fill_scheduler()
+                if self._stopped:
+                    break
+                while len(in_flight) < self.workers:
+                    url = self.scheduler.pop()
+                    if url is None:
+                        break
+                    in_flight[pool.submit(self._fetch_scheduled, url)] = url
+
+                if not in_flight:
+                    if not len(self.scheduler):
+                        break
+                    time.sleep(self.scheduler.wait_time())
                     continue
 
-                soup = BeautifulSoup(r.content, 'html.parser')
-                title = soup.title.string if soup.title else "No Title"
-                text = soup.get_text()
+                # Wake up when a fetch finishes or when a rate-limited host may be fetched again.
+                # With the pool full no fetch can start anyway, so only a finished fetch matters.
+                timeout = None if len(in_flight) >= self.workers else self.scheduler.wait_time()
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    page, status, latency = future.result()
+                    # A throttled URL is fetched again later
+                    if not self.scheduler.done(url, latency, status):
+                        self.handle_page(url, page)
 
-                self.index_page(url, title, text)
-                self.extract_links(soup, url)
+    def _crawl_pipeline(self, queue_size: int = None) -> None:
+        """Crawls in three stages: fetch on threads, parse in processes, index on the calling thread.
 
-            except requests.exceptions.RequestException as e:
-                print(f"Network error while processing {url}: {e}")
-            except Exception as e:
-                print(f"Unexpected error while processing {url}: {e}")
+        Fetch workers only download; new and changed pages go to a process pool
+        that extracts them, and only compact `(url, title, text, links)` tuples
+        come back to be indexed. The stages are joined by bounded queues: no new
+        fetches are started while `queue_size` pages are waiting to be parsed,
+        so a slow parse or index stage throttles the downloads instead of piling
+        up page bodies in memory.
 
-    def index_page(self, url: str, title: str, text: str) -> None:
-        """Indexes the page using the Whoosh helper.
+        Args:
+            queue_size (int, optional): Maximum number of downloaded pages waiting for or being
+                parsed. Defaults to twice the number of parse workers.
+
+        Returns:
+            None
+
+        Raises:
+            BrokenProcessPool: If a parse process died, e.g. killed for using too much memory.
+        """
+        queue_size = queue_size or 2 * self.parse_workers
+        fetching = {}
+        parsing = {}
+        # Parse workers are spawned rather than forked, as forking a process that
+        # already runs fetch threads can deadlock on locks those threads hold.
+        spawn = multiprocessing.get_context("spawn")
+        with ThreadPoolExecutor(max_workers=self.workers) as fetch_pool, \
+                ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=spawn) as parse_pool:
+            while True:
+                self._fill_scheduler()
+                if self._stopped:
+                    break
+                while len(fetching) < self.workers and len(fetching) + len(parsing) < queue_size:
+                    url = self.scheduler.pop()
+                    if url is None:
+                        break
+                    fetching[fetch_pool.submit(self._fetch_scheduled, url, False)] = url
+
+                if not fetching and not parsing:
+                    if not len(self.scheduler):
+                        break
+                    time.sleep(self.scheduler.wait_time())
+                    continue
+
+                # As in `_crawl_concurrent`, the scheduler only matters while a fetch could be started
+                full = len(fetching) >= self.workers or len(fetching) + len(parsing) >= queue_size
+                timeout = None if full else self.scheduler.wait_time()
+                done, _ = wait([*fetching, *parsing], timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        url = fetching.pop(future)
+                        result, status, latency = future.result()
+                        if self.scheduler.done(url, latency, status):
+                            continue
+                        if isinstance(result, Download):
+                            parsing[parse_pool.submit(extract_page, self.extractor, url, result.content,
+                                                      result.encoding, self.prefix)] = (url, result)
+                        else:
+                            self.handle_page(url, result)
+                    else:
+                        url, download = parsing.pop(future)
+                        try:
+                            page = self._page(download, future.result())
+                        except BrokenProcessPool:
+                            # Every later parse would fail as well, so the crawl stops here
+                            raise
+                        except Exception as e:
+                            print(f"Unexpected error while parsing {url}: {e}")
+                            page = None
+                        self.handle_page(url, page)
+
+    def _fetch_scheduled(self, url: str, parse: bool = True):
+        """Checks robots.txt and fetches a page released by the scheduler. Runs on the fetch workers.
 
         Args:
             url (str): The URL of the page.
-            title (str): The title of the page.
-            text (str): The text content of the page.
+            parse (bool, optional): Parse the page here, or leave that to the caller. Defaults to True.
+
+        Returns:
+            tuple: The result of `fetch_page` (or of `download_page` if `parse` is False), the HTTP
+                status (None if the request failed), and the request's duration in seconds (None
+                if no request was sent).
+        """
+        if not self.scheduler.allowed(url):
+            print(f"Skipping {url} - Disallowed by robots.txt")
+            return None, None, None
+        started = time.monotonic()
+        result, status = self.fetch_page(url) if parse else self.download_page(url)
+        return result, status, time.monotonic() - started
+
+    @staticmethod
+    def _page(download: Download, parsed: tuple) -> Page:
+        """Combines a download and its `(url, title, text, links)` extraction into a Page."""
+        _, title, text, links = parsed
+        return Page(title or "No Title", text, links, download.etag, download.last_modified, download.content_hash)
+
+    def fetch_page(self, url: str):
+        """Downloads and parses a single page.
+
+        This is the part of the crawl that runs on the fetch workers, so it must
+        not touch the frontier, the visited set or the index.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            tuple: The fetched page, or None if the page was skipped, and the HTTP status
+                of the response, or None if the request failed.
+        """
+        download, status = self.download_page(url)
+        if not isinstance(download, Download):
+            return download, status
+        try:
+            return self._page(download, extract_page(self.extractor, url, download.content,
+                                                     download.encoding, self.prefix)), status
+        except Exception as e:
+            print(f"Unexpected error while processing {url}: {e}")
+            return None, status
+
+    def download_page(self, url: str):
+        """Downloads a single page without parsing it.
+
+        If the page was crawled before, a conditional GET is sent, and a 304
+        response or an unchanged body is returned as a Page with the stored links.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            tuple: A Page if the page is unchanged, a Download if it is new or changed, or None
+                if it was skipped; and the HTTP status of the response, or None if the request failed.
+        """
+        print(f"Get {url}")
+        status = None
+        try:
+            meta = self.metadata.get(url) if self.metadata is not None else None
+            headers = {}
+            if meta is not None:
+                if meta["etag"]:
+                    headers["If-None-Match"] = meta["etag"]
+                if meta["last_modified"]:
+                    headers["If-Modified-Since"] = meta["last_modified"]
+
+            r = self.http.fetch_html(url, headers=headers)
+            status = r.status_code
+            if r.status_code == 304:
+                if meta is None:
+                    print(f"Skipping {url} - Unexpected 304 response.")
+                    return None, status
+                print(f"Unchanged {url}")
+                return Page(None, None, meta["links"], r.headers.get("ETag", meta["etag"]),
+                            r.headers.get("Last-Modified", meta["last_modified"]), meta["content_hash"]), status
+
+            etag = r.headers.get("ETag")
+            last_modified = r.headers.get("Last-Modified")
+            content_hash = hashlib.sha1(r.content).hexdigest()
+            if meta is not None and meta["content_hash"] == content_hash:
+                print(f"Unchanged {url}")
+                return Page(None, None, meta["links"], etag, last_modified, content_hash), status
+
+            encoding = r.encoding if "charset" in r.headers.get("Content-Type", "").lower() else None
+            return Download(r.content, encoding, etag, last_modified, content_hash), status
+
+        except PageSkipped as e:
+            print(f"Skipping {url} - {e}")
+            status = e.status_code
+        except requests.exceptions.RequestException as e:
+            print(f"Network error while processing {url}: {e}")
+        except Exception as e:
+            print(f"Unexpected error while processing {url}: {e}")
+        return None, status
+
+    def handle_page(self, url: str, page) -> None:
+        """Indexes a fetched page and queues its links.
+
+        A near-duplicate of a page indexed before is not indexed, but its links
+        are still followed. The page's metadata is recorded when the batch
+        containing it is committed.
+
+        Args:
+            url (str): The URL of the page.
+            page (Page): The page returned by `fetch_page`, or None if the page was skipped.
 
         Returns:
             None
         """
-        self.whoosh_helper.add_document(url=url, title=title, content=text)
+        if page is not None:
+            try:
+                self.enqueue(page.links, depth=self.agenda.depth(url) + 1)
+                if page.text is not None:
+                    original = self.dedup.check(url, page.text) if self.dedup is not None else None
+                    if original is None:
+                        self.index_page(url, page.title, page.text)
+                    else:
+                        print(f"Skipping {url} - Near-duplicate of {original}")
+            except Exception as e:
+                print(f"Unexpected error while processing {url}: {e}")
+        self._uncommitted.append((url, page))
 
-    def extract_links(self, soup: BeautifulSoup, base_url: str) -> None:
-        """Extracts internal links from a page and adds them to the agenda for crawling.
+    def index_page(self, url: str, title: str, text: str) -> None:
+        """Indexes the page using the Whoosh helper.
+
+        Uses the crawl's batch writer while a crawl is running.
 
         Args:
-            soup (BeautifulSoup): BeautifulSoup object of the page's HTML content.
-            base_url (str): The base URL of the current page.
+            url (str): The URL of the page.
+            title (str): The title of the page.
+            text (str): The text content of the page.
 
         Returns:
             None
         """
-        for link in soup.find_all("a", href=True):
-            full_url = urljoin(base_url, link["href"])
-            if full_url.startswith(self.prefix) and full_url not in self.visited_urls:
-                self.agenda.append(full_url)
+        target = self.writer or self.whoosh_helper
+        target.add_document(url=url, title=title, content=text)
+
                 
-def extract_main_content(soup: BeautifulSoup) -> str:
-    """Extracts the main content from the page using heuristics.
+def parse_sitemap(data: bytes):
+    """Parses a sitemap or sitemap index, optionally gzip-compressed.
 
     Args:
-        soup (BeautifulSoup): Parsed HTML content of the page.
+        data (bytes): The sitemap file.
 
     Returns:
-        str: The main content text.
+        tuple: A list of `(url, priority)` pairs and a list of the URLs of nested sitemaps.
     """
-    # Remove unwanted tags like script, style, nav, and footer
-    for tag in soup(['script', 'style', 'nav', 'footer']):
-        tag.decompose()
-
-    # Collect text from <p> and <div> tags
-    content_blocks = []
-    for tag in soup.find_all(['p', 'div']):
-        text = tag.get_text(strip=True)
-        # Ignore very short or non-alphanumeric-heavy blocks
-        if len(text) > 30 and sum(c.isalnum() for c in text) / len(text) > 0.5:
-            content_blocks.append(text)
-    
-    return " ".join(content_blocks)
-
-
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    urls = []
+    sitemaps = []
+    for element in ET.fromstring(data):
+        tag = element.tag.rsplit("}", 1)[-1]
+        fields = {child.tag.rsplit("}", 1)[-1]: (child.text or "").strip() for child in element}
+        if not fields.get("loc"):
+            continue
+        if tag == "sitemap":
+            sitemaps.append(fields["loc"])
+        elif tag == "url":
+            try:
+                priority = min(max(float(fields.get("priority", 0.5)), 0.0), 1.0)
+            except ValueError:
+                priority = 0.5
+            urls.append((fields["loc"], priority))
+    return urls, sitemaps
 
 
 if __name__ == "__main__":
@@ -124,7 +593,7 @@ if __name__ == "__main__":
     whoosh_helper = WhooshHelper(store_content=False)
 
     # Initialize Crawler
-    crawler = Crawler(start_url, prefix, whoosh_helper)
+    crawler = Crawler(start_url, prefix, whoosh_helper, workers=8)
     crawler.crawl()
 
     # Run Flask app